@@ -1,32 +1,31 @@
-from langchain_openai import ChatOpenAI
-import pandas as pd
 import json
+import os
+from Src_code.run_context import DEFAULT_CONTEXT
+from Src_code.llm_gateway import stream, stream_many
+from Src_code.statistics_engine import compute_profile, summarize_profile
 
-def generate_ai_insights(df):
-    """
-    Uses OpenAI LLM to produce 20–30 deep insights from any dataset.
-    Works dynamically based on dataset columns .
-    """
-    # Identify numeric and categorical columns
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    categorical_cols = df.select_dtypes(exclude='number').columns.tolist()
-
-    # Create structured dataset summary
-    dataset_summary = {
-        "rows": len(df),
-        "columns": len(df.columns),
-        "numeric_columns": numeric_cols,
-        "categorical_columns": categorical_cols,
-    }
-
-    # Convert the summary to a JSON string safely (outside the f-string)
-    dataset_json = json.dumps(dataset_summary, indent=2)
-
-    # Build the LLM prompt
-    prompt = f"""
+# Insights are written here while they are still being generated
+PARTIAL_INSIGHTS_FILE = "insights.txt.partial"
+
+# Model that writes the insights
+INSIGHTS_MODEL = "gpt-4o"
+
+# Sections of the report, each requested as its own prompt when `themed` is on
+INSIGHT_THEMES = [
+    ("Sales and Profit Trends", "overall sales and profit levels, their distributions, trends and outliers"),
+    ("Customer Behavior", "customer segments, ordering patterns and how they relate to sales and profit"),
+    ("Regional or Category Insights", "performance differences between regions, categories and other groups"),
+    ("Discount and Pricing Patterns", "how discounts and prices relate to sales volume and profitability"),
+    ("Operational or Shipping Observations", "shipping modes, quantities, data quality and other operational signals"),
+]
+
+
+def _full_prompt(dataset_json):
+    return f"""
 You are an expert Data Science and Business Intelligence Analyst.
 
-The user has provided a dataset with the following summary:
+The user has provided a dataset. Its statistical profile (per-column moments and quartiles,
+null rates, top categories with their share of rows, and profit/sales totals by group) is:
 {dataset_json}
 
 Your task:
@@ -48,7 +47,8 @@ Your task:
       . Patterns that may influence performance 
 
 Each insight should:
-- Reference real patterns implied by the dataset structure (e.g., relationships, differences, anomalies).
+- Cite the concrete figures from the profile above; do not invent numbers that are not in it.
+- Be one or two sentences long.
 - Read like a business consultant’s summary — crisp, confident, and actionable.
 - Be at least **20 separate insights** (but merge related points naturally for flow).
 
@@ -59,14 +59,82 @@ Summarize 3–5 key actions the business could take based on these findings.
 """
 
 
-    # Initialize the model
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.7)
+def _theme_prompt(dataset_json, theme, focus):
+    return f"""
+You are an expert Data Science and Business Intelligence Analyst.
+
+The user has provided a dataset. Its statistical profile (per-column moments and quartiles,
+null rates, top categories with their share of rows, and profit/sales totals by group) is:
+{dataset_json}
+
+Theme: {theme}
+
+Your task:
+- Write **4–6 meaningful, data-driven insights** about {focus}.
+- If the profile has no columns for this theme, say so in one sentence and note the closest related pattern instead.
+- Use concise bullet points in **natural business language**; no heading, numbering or placeholders like "$X" or "Region B".
+- Cite the concrete figures from the profile above; do not invent numbers that are not in it.
+- Each insight should be one or two sentences, crisp, confident, and actionable.
+"""
+
+
+def _recommendations_prompt(dataset_json):
+    return f"""
+You are an expert Data Science and Business Intelligence Analyst.
+
+The user has provided a dataset. Its statistical profile (per-column moments and quartiles,
+null rates, top categories with their share of rows, and profit/sales totals by group) is:
+{dataset_json}
+
+Theme: Strategic Recommendations
+
+Your task:
+- Summarize **3–5 key actions** the business could take, each grounded in specific figures from the profile.
+- Use concise bullet points in natural business language; no heading or numbering.
+"""
+
+
+def generate_ai_insights(df, ctx=None, profile_summary=None, themed=True):
+    """
+    Uses OpenAI LLM to produce 20–30 deep insights from any dataset.
+    Works dynamically based on dataset columns .
+    The prompt is grounded in a precomputed statistical profile (`profile_summary` from
+    statistics_engine.summarize_profile; computed here when not given).
+    With `themed`, each section of INSIGHT_THEMES (plus the recommendations) is its own prompt,
+    all issued concurrently and merged in order; otherwise one prompt asks for everything.
+    The result is saved to insights.txt in the run's results folder (`ctx`, a RunContext),
+    streaming into insights.txt.partial while it is generated.
+    """
+    ctx = ctx or DEFAULT_CONTEXT
+
+    # Moments, quantiles, null rates, top categories and profit/sales by group
+    if profile_summary is None:
+        profile_summary = summarize_profile(compute_profile(df))
+
+    # Compact JSON keeps the prompt short (convert outside the f-string)
+    dataset_json = json.dumps(profile_summary, separators=(",", ":"), default=str)
 
-    # Generate insights
-    response = llm.invoke(prompt)
+    if themed:
+        # Sections stream concurrently; the first is shown live while the others buffer
+        titles = [theme for theme, _ in INSIGHT_THEMES] + ["Strategic Recommendations"]
+        prompts = [_theme_prompt(dataset_json, theme, focus) for theme, focus in INSIGHT_THEMES]
+        prompts.append(_recommendations_prompt(dataset_json))
+        sections = [(f"**{title}**\n", chunks)
+                    for title, chunks in zip(titles, stream_many(prompts, model=INSIGHTS_MODEL, temperature=0.7))]
+    else:
+        sections = [("", stream(_full_prompt(dataset_json), model=INSIGHTS_MODEL, temperature=0.7))]
 
-    # Save output
-    with open("Results/insights.txt", "w", encoding="utf-8") as f:
-        f.write(response.content)
+    # Generate insights (cached by model, temperature and prompt through the shared gateway).
+    # Tokens are streamed to insights.txt.partial as they arrive, so readers can show them live;
+    # the finished text then replaces insights.txt in one step.
+    insights_path = ctx.results_path("insights.txt")
+    partial_path = ctx.results_path(PARTIAL_INSIGHTS_FILE)
+    with open(partial_path, "w", encoding="utf-8") as f:
+        for i, (heading, chunks) in enumerate(sections):
+            f.write(("\n\n" if i else "") + heading)
+            for chunk in chunks:
+                f.write(chunk)
+                f.flush()
+    os.replace(partial_path, insights_path)
 
-    print("✅ 20–30 detailed insights generated and saved to Results/insights.txt.")
+    print(f"✅ 20–30 detailed insights generated and saved to {insights_path}.")
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import pandas as pd
+
+from Src_code.dataset_cache import CACHE_DIR
+
+# Rendered PNGs, content-addressed by chart spec + fingerprint of the data they plot
+CHART_CACHE_DIR = os.path.join(CACHE_DIR, "charts")
+
+# Least recently used charts are evicted beyond this total size
+MAX_CHART_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def column_fingerprint(series):
+    """Content hash of one column (values, dtype and name)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{series.name}\x00{series.dtype}".encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def normalize_spec(spec):
+    """Canonical form of a chart spec: lower-cased type, stripped strings, sorted keys."""
+    normalized = {}
+    for key, value in spec.items():
+        if isinstance(value, str):
+            value = value.strip()
+            if key == "type":
+                value = value.lower()
+        normalized[str(key)] = value
+    return normalized
+
+
+def chart_key(spec, data_fingerprints, style=None):
+    """Cache key of a chart: its normalized spec, the fingerprints of its data and the style settings."""
+    payload = json.dumps(
+        {"spec": normalize_spec(spec), "data": list(data_fingerprints), "style": style or {}},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(CHART_CACHE_DIR, f"{key}.png")
+
+
+def fetch_chart(key: str, out_path: str):
+    """Copy a cached chart to `out_path`. Returns True on a hit."""
+    path = _cache_path(key)
+    try:
+        shutil.copyfile(path, out_path)
+        os.utime(path)
+    except OSError:
+        return False
+    return True
+
+
+def store_chart(key: str, path: str, max_bytes: int = MAX_CHART_CACHE_BYTES):
+    """Add a rendered chart to the cache, then evict least recently used charts beyond `max_bytes`."""
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{_cache_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, _cache_path(key))
+    except OSError as e:
+        print(f"⚠️ Could not cache chart {os.path.basename(path)}: {e}")
+        return
+    evict_chart_cache(max_bytes)
+
+
+def evict_chart_cache(max_bytes: int = MAX_CHART_CACHE_BYTES):
+    entries = []
+    for name in os.listdir(CHART_CACHE_DIR):
+        if not name.endswith(".png"):
+            continue
+        try:
+            stat = os.stat(os.path.join(CHART_CACHE_DIR, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(CHART_CACHE_DIR, name))
+            total -= size
+        except OSError:
+            pass
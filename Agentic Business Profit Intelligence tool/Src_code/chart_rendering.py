@@ -0,0 +1,414 @@
+import hashlib
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from Src_code.chart_cache import chart_key, column_fingerprint, fetch_chart, store_chart
+from Src_code.dataset_cache import feather, write_frame
+from Src_code.instrumentation import log_event
+
+# Below this many rows, charts render in-process; pool start-up and data hand-off would cost more
+PARALLEL_MIN_ROWS = 20_000
+
+# Worker processes for rendering (None: one per core, capped at the number of charts)
+MAX_RENDER_WORKERS = None
+
+# Row caps that bound render cost whatever the input size (override per call via `limits`)
+ROW_LIMITS = {
+    "scatter_points": 20_000,   # scatter: uniform sample of this many points ...
+    "hexbin_rows": 500_000,     # ... or 2-D hexagonal binning (density) above this many rows
+    "line_points": 2_000,       # line: x is binned into at most this many points (mean of y per bin)
+    "box_groups": 20,           # box: most frequent groups shown
+    "box_fliers": 200,          # box: outliers drawn per group (sampled)
+    "kde_rows": 50_000,         # hist: KDE curve estimated on a sample of this many values
+    "heatmap_rows": 200_000,    # heatmap: correlations computed on a sample of this many rows
+    "heatmap_features": 12,     # heatmap: most correlated features kept (wide one-hot data)
+    "matrix_categories": 15,    # confusion matrix: most frequent values kept per axis
+}
+
+CHART_DPI = 300
+
+# Heatmap cells are annotated with their value up to this many features
+HEATMAP_ANNOTATE_FEATURES = 12
+
+# Changes to the drawing code invalidate cached charts
+with open(__file__, "rb") as _source:
+    _RENDERER_VERSION = hashlib.blake2b(_source.read(), digest_size=8).hexdigest()
+
+# pyplot keeps global state, so concurrent in-process renders take turns
+_PYPLOT_LOCK = threading.Lock()
+
+_pool = None
+_pool_workers = 0
+_pool_finalizer = None
+_pool_lock = threading.Lock()
+
+
+# ============================
+# Drawing (runs in a worker process, or in-process under the pyplot lock)
+# ============================
+
+def _apply_style():
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Universal aesthetic improvements
+    sns.set_theme(style="whitegrid", palette="Set2")
+    plt.rcParams.update({
+        "axes.titlesize": 13,
+        "axes.labelsize": 11,
+        "xtick.labelsize": 9,
+        "ytick.labelsize": 9,
+        "figure.figsize": (8, 5)
+    })
+
+
+def _init_worker():
+    """Headless backend and shared style, set once per worker process."""
+    import matplotlib
+    matplotlib.use("Agg")
+    _apply_style()
+
+
+def chart_columns(vis, columns, numeric_cols, categorical_cols):
+    """The columns a chart spec reads; only these are handed to the renderer."""
+    if not isinstance(vis, dict):
+        return []
+    chart_type = str(vis.get("type", "")).lower()
+    if chart_type == "heatmap":
+        return list(numeric_cols)
+    if chart_type == "confusion_matrix":
+        return list(categorical_cols[:2])
+    return [c for c in dict.fromkeys([vis.get("x"), vis.get("y")]) if c in columns]
+
+
+# ============================
+# Data reduction (aggregate or sample before anything reaches matplotlib)
+# ============================
+
+def _sample_rows(data, n, seed=0):
+    return data if len(data) <= n else data.sample(n=n, random_state=seed)
+
+
+def _top_correlated(corr, k):
+    """
+    Keep the k features most correlated with the target (profit, else sales), or with the other
+    features when there is none. Constant columns (all-NaN correlations) are dropped first.
+    """
+    corr = corr.dropna(how="all").dropna(axis=1, how="all")
+    if len(corr) <= k:
+        return corr
+    names = {str(c).lower(): c for c in corr.columns}
+    target = names.get("profit", names.get("sales"))
+    if target is not None:
+        strength = corr[target].abs()
+    else:
+        strength = (corr.abs().sum() - 1) / (len(corr) - 1)
+    keep = strength.nlargest(k).index
+    return corr.loc[keep, keep]
+
+
+def _bar_frame(df, x, y):
+    """Mean of y for the 10 most frequent x values: one row per bar."""
+    top_vals = df[x].value_counts().nlargest(10).index
+    subset = df[df[x].isin(top_vals)]
+    means = subset.groupby(subset[x].astype(object), sort=False)[y].mean()
+    return means.reindex(top_vals.astype(object)).rename_axis(x).reset_index()
+
+
+def _line_frame(df, x, y, max_points):
+    """Mean of y per x value, with x binned into at most `max_points` bins when it has more distinct values."""
+    data = df[[x, y]].dropna()
+    if data[x].nunique() <= max_points or not (
+            pd.api.types.is_numeric_dtype(data[x]) or pd.api.types.is_datetime64_any_dtype(data[x])):
+        return data.groupby(x, observed=True, sort=True)[y].mean().reset_index()
+
+    is_datetime = pd.api.types.is_datetime64_any_dtype(data[x])
+    position = data[x].astype("int64") if is_datetime else data[x].astype("float64")
+    bins = pd.cut(position, bins=max_points, labels=False)
+    binned = pd.DataFrame({x: position, y: data[y]}).groupby(bins).mean()
+    if is_datetime:
+        binned[x] = pd.to_datetime(binned[x].round().astype("int64"))
+    return binned.reset_index(drop=True)
+
+
+def _box_stats(df, x, y, max_groups, max_fliers):
+    """Five-number summaries per group (exact, on every row) with a bounded sample of outliers."""
+    from matplotlib.cbook import boxplot_stats
+
+    top_vals = df[x].value_counts().nlargest(max_groups).index
+    data = df.loc[df[x].isin(top_vals), [x, y]].dropna()
+    groups = {key: values for key, values in data.groupby(data[x].astype(object), sort=False)[y]}
+
+    stats = []
+    rng = np.random.default_rng(0)
+    for value in top_vals:
+        if value not in groups:
+            continue
+        entry = boxplot_stats(groups[value].to_numpy(dtype="float64"), labels=[str(value)])[0]
+        if len(entry["fliers"]) > max_fliers:
+            entry["fliers"] = rng.choice(entry["fliers"], size=max_fliers, replace=False)
+        stats.append(entry)
+    return stats
+
+
+def _scaled_kde(values, bins, sample_size):
+    """KDE of a sample of `values`, scaled to histogram counts. Returns (grid, curve) or None."""
+    from scipy.stats import gaussian_kde
+
+    sample = values if len(values) <= sample_size else \
+        np.random.default_rng(0).choice(values, size=sample_size, replace=False)
+    if len(sample) < 2 or np.ptp(sample) == 0:
+        return None
+    grid = np.linspace(values.min(), values.max(), 200)
+    bin_width = (values.max() - values.min()) / bins
+    return grid, gaussian_kde(sample)(grid) * len(values) * bin_width
+
+
+def render_chart(df, vis, i, categorical_cols, out_path, limits=None):
+    """
+    Draw one chart spec and save it to `out_path`. Returns a status line.
+    Data is aggregated or sampled first (caps in `limits`, defaulting to ROW_LIMITS),
+    so the cost of drawing does not grow with the number of rows.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    try:
+        chart_type = vis["type"].lower()
+        title = vis.get("title", f"AI Chart {i}")
+        x = vis.get("x")
+        y = vis.get("y")
+        limits = dict(ROW_LIMITS, **(limits or {}))
+
+        plt.figure()
+
+        # BAR CHART (pre-aggregated: one row per bar)
+        if chart_type == "bar" and x in df.columns and y in df.columns:
+            sns.barplot(x=x, y=y, data=_bar_frame(df, x, y), errorbar=None)
+            plt.xticks(rotation=45, ha="right")
+
+        # SCATTER (uniform sample, or density bins for very large inputs)
+        elif chart_type == "scatter" and x in df.columns and y in df.columns:
+            if len(df) > limits["hexbin_rows"]:
+                data = df[[x, y]].dropna()
+                plt.hexbin(data[x], data[y], gridsize=60, bins="log", cmap="viridis", mincnt=1)
+                plt.colorbar(label="log10(count)")
+                plt.xlabel(x)
+                plt.ylabel(y)
+            else:
+                sns.scatterplot(x=x, y=y, data=_sample_rows(df[[x, y]], limits["scatter_points"]), alpha=0.7)
+
+        # LINE CHART (mean of y per x, x binned when it has too many points; no bootstrapped CI)
+        elif chart_type == "line" and x in df.columns and y in df.columns:
+            sns.lineplot(x=x, y=y, data=_line_frame(df, x, y, limits["line_points"]), errorbar=None)
+
+        # HISTOGRAM (counts on every value, KDE on a sample)
+        elif chart_type == "hist" and x in df.columns:
+            if len(df) <= limits["kde_rows"] or not pd.api.types.is_numeric_dtype(df[x]):
+                sns.histplot(df[x], bins=20, kde=True)
+            else:
+                ax = sns.histplot(df[x], bins=20)
+                values = df[x].dropna().to_numpy(dtype="float64")
+                kde = _scaled_kde(values, 20, limits["kde_rows"])
+                if kde is not None:
+                    ax.plot(*kde, color=sns.color_palette()[0])
+
+        # BOX PLOT (statistics per group, drawn with bxp)
+        elif chart_type == "box" and x in df.columns and y in df.columns:
+            stats = _box_stats(df, x, y, limits["box_groups"], limits["box_fliers"])
+            ax = plt.gca()
+            colors = sns.color_palette(n_colors=max(len(stats), 1))
+            boxes = ax.bxp(stats, patch_artist=True)
+            for patch, color in zip(boxes["boxes"], colors):
+                patch.set_facecolor(color)
+            ax.set_xlabel(x)
+            ax.set_ylabel(y)
+
+        # HEATMAP (correlations on a row sample, limited to the most correlated features)
+        elif chart_type == "heatmap":
+            corr = _sample_rows(df.select_dtypes(include="number"), limits["heatmap_rows"]).corr()
+            corr = _top_correlated(corr, limits["heatmap_features"])
+            sns.heatmap(corr, annot=len(corr) <= HEATMAP_ANNOTATE_FEATURES, cmap="coolwarm", fmt=".2f")
+
+        # PIE CHART
+        elif chart_type == "pie" and x in df.columns:
+            data_counts = df[x].value_counts().nlargest(6)
+            plt.pie(data_counts, labels=data_counts.index, autopct="%1.1f%%", startangle=90)
+            plt.axis("equal")
+
+        # CONFUSION MATRIX (NEW FEATURE)
+        elif chart_type == "confusion_matrix":
+            # Automatically pick two categorical columns if not specified
+            if len(categorical_cols) >= 2:
+                cat1, cat2 = categorical_cols[:2]
+                top1 = df[cat1].value_counts().nlargest(limits["matrix_categories"]).index
+                top2 = df[cat2].value_counts().nlargest(limits["matrix_categories"]).index
+                kept = df[cat1].isin(top1) & df[cat2].isin(top2)
+                conf_data = pd.crosstab(df.loc[kept, cat1].astype(object), df.loc[kept, cat2].astype(object))
+                sns.heatmap(conf_data, annot=True, cmap="Blues", fmt="d")
+                title = f"Confusion Matrix: {cat1} vs {cat2}"
+            else:
+                plt.close()
+                return "⚠️ Not enough categorical columns for confusion matrix."
+
+        else:
+            plt.close()
+            return f"⚠️ Unsupported or invalid config: {vis}"
+
+        plt.title(title)
+        plt.tight_layout()
+        plt.savefig(out_path, dpi=CHART_DPI)
+        plt.close()
+        return f"✅ Saved: {os.path.basename(out_path)}"
+
+    except Exception as e:
+        plt.close("all")
+        return f"❌ Failed to create {vis.get('title', f'Chart {i}')}: {e}"
+
+
+def _timed_render(df, vis, i, categorical_cols, out_path, limits=None):
+    start = time.perf_counter()
+    message = render_chart(df, vis, i, categorical_cols, out_path, limits)
+    return message, time.perf_counter() - start
+
+
+def _render_from_arrow(data_path, columns, vis, i, categorical_cols, out_path, limits=None):
+    """Worker entry point: memory-map only the chart's columns from the shared Arrow file."""
+    start = time.perf_counter()
+    table = feather.read_table(data_path, columns=columns, memory_map=True)
+    message = render_chart(table.to_pandas(), vis, i, categorical_cols, out_path, limits)
+    return message, time.perf_counter() - start
+
+
+# ============================
+# Scheduling
+# ============================
+
+def _get_pool(workers):
+    """One long-lived pool per process (spawned workers, safe to start from threads)."""
+    global _pool, _pool_workers, _pool_finalizer
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            if _pool_finalizer is None:
+                # A process that is itself a multiprocessing worker (job queue, batch runs) joins its
+                # children on exit before concurrent.futures shuts pools down; stop the pool first,
+                # ahead of the finalizers (priority 10) that close the pool's own queues
+                _pool_finalizer = multiprocessing.util.Finalize(None, _shutdown_pool, exitpriority=20)
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _shutdown_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+def _finish(job, message, seconds=None):
+    print(message)
+    i, vis, key, out_path = job[0], job[1], job[4], job[3]
+    log_event("section", "Render chart", chart=i, type=vis.get("type") if isinstance(vis, dict) else None,
+              seconds=round(seconds, 4) if seconds is not None else None, ok=message.startswith("✅"))
+    if key and message.startswith("✅"):
+        store_chart(key, out_path)
+
+
+def _render_in_process(df, jobs, categorical_cols, limits):
+    with _PYPLOT_LOCK:
+        _apply_style()
+        for job in jobs:
+            i, vis, columns, out_path, key = job
+            _finish(job, *_timed_render(df, vis, i, categorical_cols, out_path, limits))
+
+
+def _reset_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+def render_charts(df, vis_plan, ctx, categorical_cols=(), max_workers=None, min_parallel_rows=None,
+                  limits=None):
+    """
+    Render every chart of a plan to ctx.vis_path("ai_visual_<i>.png").
+    Large frames are rendered in parallel by a process pool: the columns the plan needs are
+    written once to an uncompressed Arrow file that each worker memory-maps, reading only the
+    columns of its own chart. Status lines are printed as charts finish.
+    Charts whose spec and column data match a previous render are copied from the chart cache.
+    `limits` overrides entries of ROW_LIMITS (the per-chart row caps).
+    """
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    categorical_cols = list(categorical_cols)
+    style = {"limits": dict(ROW_LIMITS, **(limits or {})), "dpi": CHART_DPI, "renderer": _RENDERER_VERSION}
+    fingerprints = {}
+
+    def _key(i, vis, columns):
+        if not isinstance(vis, dict):
+            return None
+        for col in columns:
+            if col not in fingerprints:
+                fingerprints[col] = column_fingerprint(df[col])
+        spec = dict(vis, title=vis.get("title", f"AI Chart {i}"), columns=columns)
+        return chart_key(spec, [fingerprints[c] for c in columns], style)
+
+    jobs = []
+    for i, vis in enumerate(vis_plan, start=1):
+        columns = chart_columns(vis, df.columns, numeric_cols, categorical_cols)
+        out_path = ctx.vis_path(f"ai_visual_{i}.png")
+        key = _key(i, vis, columns)
+        # Same spec over the same data: serve the cached PNG without touching matplotlib
+        if key and fetch_chart(key, out_path):
+            print(f"⚡ Cached: {os.path.basename(out_path)}")
+            continue
+        jobs.append((i, vis, columns, out_path, key))
+    if not jobs:
+        return
+
+    workers = min(len(jobs), max_workers or MAX_RENDER_WORKERS or os.cpu_count() or 1)
+    min_rows = PARALLEL_MIN_ROWS if min_parallel_rows is None else min_parallel_rows
+    if len(df) < min_rows or workers == 0 or feather is None:
+        _render_in_process(df, jobs, categorical_cols, limits)
+        return
+
+    needed = list(dict.fromkeys(c for job in jobs for c in job[2]))
+    data_path = write_frame(df[needed], ctx.processed_path("chart_data.arrow"))
+    if data_path is None:
+        _render_in_process(df, jobs, categorical_cols, limits)
+        return
+
+    pending = dict(enumerate(jobs))
+    try:
+        pool = _get_pool(workers)
+        futures = {
+            pool.submit(_render_from_arrow, data_path, columns, vis, i, categorical_cols, out_path, limits): n
+            for n, (i, vis, columns, out_path, key) in pending.items()
+        }
+        for future in as_completed(futures):
+            message, seconds = future.result()
+            _finish(pending.pop(futures[future]), message, seconds)
+    except BrokenProcessPool as e:
+        # A worker died (e.g. out of memory): start a fresh pool next time, finish here
+        print(f"⚠️ Chart worker pool failed ({e}); rendering remaining charts in-process.")
+        _reset_pool()
+        _render_in_process(df, list(pending.values()), categorical_cols, limits)
+    finally:
+        try:
+            os.remove(data_path)
+        except OSError:
+            pass
@@ -0,0 +1,41 @@
+import re
+from functools import lru_cache
+
+# Tokens marking a derived ratio rather than the measure itself (e.g. "profit margin", "sales %")
+RATIO_TOKENS = {"margin", "ratio", "pct", "percent", "rate", "share"}
+
+# Words recognised inside concatenated names ("salesamount", "netprofit", "totalsales", "orderdate"):
+# a token is split only when it is made up entirely of these, so "wholesale" stays one token
+COMPOUND_WORDS = {
+    "profit", "sales", "sale", "revenue", "turnover", "net", "income", "earnings", "order", "date", "day",
+    "total", "gross", "amount", "amt", "value", "sum", "avg", "usd", "unit",
+} | RATIO_TOKENS
+
+
+@lru_cache(maxsize=None)
+def _split_compound(token):
+    """Split a token into COMPOUND_WORDS (longest first word first), or return None if it has no such split."""
+    if token in COMPOUND_WORDS:
+        return (token,)
+    for end in range(len(token) - 1, 0, -1):
+        if token[:end] in COMPOUND_WORDS:
+            rest = _split_compound(token[end:])
+            if rest is not None:
+                return (token[:end],) + rest
+    return None
+
+
+def name_tokens(name):
+    """
+    Lowercase alphanumeric tokens of a column name ("Order Date" -> {"order", "date"}), plus the
+    words of concatenated tokens ("SalesAmount" -> {"salesamount", "sales", "amount"}).
+    """
+    tokens = set(re.split(r"[^a-z0-9]+", str(name).lower())) - {""}
+    for token in list(tokens):
+        tokens.update(_split_compound(token) or ())
+    return tokens
+
+
+def is_ratio(name):
+    """Whether a column name describes a ratio or percentage rather than an additive measure."""
+    return bool(name_tokens(name) & RATIO_TOKENS) or "%" in str(name)
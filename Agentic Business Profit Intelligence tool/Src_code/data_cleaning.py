@@ -1,35 +1,218 @@
 import os
+import sqlite3
+import time
+import numpy as np
 import pandas as pd
+from Src_code.column_names import is_ratio, name_tokens
+from Src_code.dataset_cache import write_cached_array, write_cached_frame, write_frame
+from Src_code.instrumentation import log_event
+from Src_code.run_context import DEFAULT_CONTEXT
+from Src_code.statistics_engine import profile_chunks, summarize_profile
 
-def clean_data(df, dataset_name="dataset"):
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# Formats tried (after pandas' own guess) when inferring how a date column is written
+DATE_FORMATS = ["%m/%d/%Y", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%m-%d-%Y", "%d.%m.%Y",
+                "%Y-%m-%d %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%y", "%d/%m/%y"]
+
+# Distinct values sampled to infer a date format, and the share of them it must parse
+DATE_SAMPLE_SIZE = 500
+DATE_FORMAT_MIN_MATCH = 0.99
+
+# Name tokens per business role: (tokens that must all appear, score); the best scoring column wins,
+# ties go to the leftmost column. Matching whole tokens (and the known words of concatenated ones, see
+# column_names) finds "salesamount" or "netprofit" but keeps "wholesale price" from passing as sales.
+ROLE_PATTERNS = {
+    "profit": [(("profit",), 3), (("net", "income"), 2), (("earnings",), 1)],
+    "sales": [(("sales",), 3), (("sale",), 2), (("revenue",), 2), (("turnover",), 1)],
+    "order_date": [(("order", "date"), 3), (("order", "day"), 1)],
+}
+
+# 0/1 columns sharing a name prefix ("month__3", "event_christmas", ...) form a one-hot block when
+# there are at least this many; blocks with exactly one 1 in every row are folded into one categorical
+# (unrelated flags such as is_x, is_y, is_z rarely pass that test), other blocks at most this dense
+# are kept as compact 0/1 indicator columns for sparse model input
+ONE_HOT_MIN_COLUMNS = 3
+INDICATOR_MAX_DENSITY = 0.1
+
+
+def _normalize_columns(df):
+    """Strip, remove non-breaking spaces and lowercase column names."""
+    df.columns = df.columns.str.strip().str.replace('\xa0', '', regex=True).str.lower()
+
+
+def _score_column(name, role):
+    tokens = name_tokens(name)
+    if role != "order_date" and is_ratio(name):
+        return 0
+    return max((score for required, score in ROLE_PATTERNS[role] if set(required) <= tokens), default=0)
+
+
+def _detect_business_columns(columns, dtypes=None):
     """
-    Cleans and standardizes the dataset for further analysis or AI processing.
-    Compatible with any dataset used in the Prefect pipeline.
+    Detect common business columns (flexible for any dataset) by scoring each column name per role.
+    With `dtypes` (column -> dtype), profit and sales candidates must be numeric.
     """
+    detected = []
+    for role in ("profit", "sales", "order_date"):
+        best, best_score = None, 0
+        for col in columns:
+            if col in detected:
+                continue
+            if dtypes is not None and role != "order_date" and not pd.api.types.is_numeric_dtype(dtypes[col]):
+                continue
+            score = _score_column(col, role)
+            if score > best_score:
+                best, best_score = col, score
+        detected.append(best)
 
-    print("🧹 Cleaning data...")
+    profit_col, sales_col, order_date_col = detected
+    return profit_col, sales_col, order_date_col
 
-    # Normalize column names
-    df.columns = df.columns.str.strip().str.replace('\xa0', '', regex=True).str.lower()
 
-    # Basic cleaning
-    df.drop_duplicates(inplace=True)
-    df.dropna(how="all", inplace=True)
+def infer_date_format(values, sample_size: int = DATE_SAMPLE_SIZE):
+    """
+    Infer the strftime format of a column of date strings from a sample of its distinct values,
+    so the whole column can be parsed vectorized. Returns None when no single format fits.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = pd.Series(values.cat.categories)
+    if not (pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype)):
+        return None
+    sample = values.dropna().drop_duplicates()
+    sample = sample.sample(n=min(sample_size, len(sample)), random_state=0).astype(str)
+    if sample.empty:
+        return None
+
+    guessed = guess_datetime_format(sample.iloc[0])
+    best, best_share = None, 0.0
+    for fmt in dict.fromkeys(([guessed] if guessed else []) + DATE_FORMATS):
+        share = pd.to_datetime(sample, format=fmt, errors="coerce").notna().mean()
+        if share > best_share:
+            best, best_share = fmt, share
+        if share == 1.0:
+            break
+    return best if best_share >= DATE_FORMAT_MIN_MATCH else None
 
-    # Detect common business columns (flexible for any dataset)
-    profit_col = None
-    sales_col = None
-    order_date_col = None
 
+def _one_hot_prefix(name):
+    for sep in ("__", "_"):
+        if sep in name.strip(sep):
+            prefix, _, label = name.rpartition(sep)
+            return prefix, label
+    return None, None
+
+
+def _is_binary(values):
+    if not pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+        return False
+    return bool(values.isin((0, 1)).all())
+
+
+def detect_one_hot_blocks(df, exclude=()):
+    """
+    Find blocks of 0/1 columns named `<prefix>__<level>` (or `<prefix>_<level>`).
+    Returns (one_hot, indicators): `one_hot` maps a new column name to the block's columns and levels
+    when every row has exactly one 1; `indicators` lists the columns of sparse blocks that do not.
+    """
+    blocks = {}
     for col in df.columns:
-        if "profit" in col:
-            profit_col = col
-        elif "sale" in col:
-            sales_col = col
-        elif "order date" in col or "orderdate" in col:
-            order_date_col = col
-
-    # Add derived features when possible
+        if col in exclude:
+            continue
+        prefix, label = _one_hot_prefix(col)
+        if prefix:
+            blocks.setdefault(prefix, []).append((col, label))
+
+    one_hot, indicators = {}, []
+    for prefix, members in blocks.items():
+        if len(members) < ONE_HOT_MIN_COLUMNS:
+            continue
+        members = [(col, label) for col, label in members if _is_binary(df[col])]
+        if len(members) < ONE_HOT_MIN_COLUMNS:
+            continue
+        columns = [col for col, _ in members]
+        hot = df[columns].to_numpy(dtype=np.uint8).sum(axis=1)
+        if len(hot) and hot.min() == 1 and hot.max() == 1:
+            name = prefix if prefix not in df.columns else f"{prefix}_category"
+            one_hot[name] = {"columns": columns, "levels": [label for _, label in members]}
+        elif len(hot) and hot.sum() <= INDICATOR_MAX_DENSITY * len(hot) * len(columns):
+            indicators.extend(columns)
+    return one_hot, indicators
+
+
+def build_schema(df):
+    """
+    Schema descriptor of a frame with normalized column names: its columns and dtypes, the detected
+    business columns, the order date format and the one-hot blocks to fold. Built once per dataset,
+    then reused for every chunk and attached to the cleaned frame as `df.attrs["schema"]` so later
+    stages skip re-detection.
+    """
+    profit_col, sales_col, order_date_col = _detect_business_columns(df.columns, df.dtypes)
+    one_hot, indicators = detect_one_hot_blocks(df, exclude={profit_col, sales_col, order_date_col})
+    return {
+        "columns": list(df.columns),
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        "profit": profit_col,
+        "sales": sales_col,
+        "order_date": order_date_col,
+        "date_format": infer_date_format(df[order_date_col]) if order_date_col else None,
+        "one_hot": one_hot,
+        "indicators": indicators,
+    }
+
+
+def _fold_one_hot(df, schema):
+    """
+    Replace each one-hot block with one categorical column (in place of the block's first column)
+    and store sparse indicator blocks as uint8. Rows of later chunks or appended data without exactly
+    one 1 in a block get a missing value there. Returns the new frame.
+    """
+    one_hot, indicators = schema.get("one_hot") or {}, schema.get("indicators") or []
+    if not one_hot and not indicators:
+        return df
+
+    folded, replaced = {}, {}
+    for name, block in one_hot.items():
+        columns = [col for col in block["columns"] if col in df.columns]
+        if len(columns) != len(block["columns"]):
+            continue
+        values = df[columns].to_numpy(dtype=np.uint8)
+        # Level i where column i is the row's only 1, missing (-1) otherwise
+        single = values.sum(axis=1) == 1
+        codes = np.where(single, values.argmax(axis=1), -1)
+        if not single.all():
+            print(f"⚠️ {int((~single).sum())} rows without exactly one '{name}' indicator; left missing.")
+        folded[name] = pd.Categorical.from_codes(codes, categories=block["levels"])
+        replaced[columns[0]] = name
+        replaced.update((col, None) for col in columns[1:])
+
+    out = {}
+    for col in df.columns:
+        if col not in replaced:
+            out[col] = df[col].astype(np.uint8) if col in indicators else df[col]
+        elif replaced[col] is not None:
+            out[replaced[col]] = pd.Series(folded[replaced[col]], index=df.index)
+    result = pd.DataFrame(out, index=df.index)
+    result.attrs = df.attrs
+    return result
+
+
+def _parse_dates(dates, date_format=None):
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        # Parse each distinct date once and expand through the category codes
+        parsed = pd.to_datetime(dates.cat.categories, format=date_format, errors="coerce")
+        # Missing dates have code -1, which must become NaT rather than the last category's date
+        return pd.Series(parsed.take(dates.cat.codes.to_numpy(), allow_fill=True, fill_value=pd.NaT),
+                         index=dates.index)
+    return pd.to_datetime(dates, format=date_format, errors="coerce")
+
+
+def _add_derived_features(df, schema):
+    """Add derived features when possible."""
+    profit_col, sales_col, order_date_col = schema["profit"], schema["sales"], schema["order_date"]
     if profit_col and sales_col:
         try:
             df["profit_margin"] = (df[profit_col] / df[sales_col]) * 100
@@ -38,18 +221,245 @@ def clean_data(df, dataset_name="dataset"):
 
     if order_date_col:
         try:
-            df[order_date_col] = pd.to_datetime(df[order_date_col], errors="coerce")
+            df[order_date_col] = _parse_dates(df[order_date_col], schema["date_format"])
             df["order_month"] = df[order_date_col].dt.month
             df["order_year"] = df[order_date_col].dt.year
         except Exception:
             print("⚠️ Could not parse order dates properly.")
 
-    # Ensure processed data folder exists
-    os.makedirs("Data/Processed", exist_ok=True)
 
-    # Save cleaned dataset dynamically
-    cleaned_path = f"Data/Processed/cleaned_{dataset_name}.csv"
-    df.to_csv(cleaned_path, index=False)
+def _empty_rows(df):
+    """Mask of all-null rows, narrowing the candidates column by column (usually empty after the first)."""
+    if df.shape[1] == 0:
+        return np.ones(len(df), dtype=bool)
+    empty = df.iloc[:, 0].isna().to_numpy()
+    for j in range(1, df.shape[1]):
+        candidates = np.flatnonzero(empty)
+        if len(candidates) == 0:
+            break
+        empty[candidates] = df.iloc[candidates, j].isna().to_numpy()
+    return empty
+
+
+def _open_hash_store():
+    """
+    Store of the row hashes seen so far while cleaning chunks: a temporary SQLite database on
+    disk (deleted when closed), so memory stays bounded by SQLite's page cache, not the file size.
+    """
+    conn = sqlite3.connect("")
+    conn.execute("CREATE TABLE seen (h INTEGER PRIMARY KEY) WITHOUT ROWID")
+    conn.execute("CREATE TEMP TABLE batch (pos INTEGER, h INTEGER)")
+    return conn
+
+
+def _unseen(store, values):
+    """Mask of the hashes in `values` (unique 64-bit row hashes) not in `store`; records them."""
+    # SQLite integers are signed: store the hashes' bit patterns as int64
+    signed = values.view(np.int64).tolist()
+    with store:
+        store.executemany("INSERT INTO batch VALUES (?, ?)", enumerate(signed))
+        seen = [pos for (pos,) in store.execute("SELECT pos FROM batch WHERE h IN (SELECT h FROM seen)")]
+        store.execute("INSERT OR IGNORE INTO seen SELECT h FROM batch")
+        store.execute("DELETE FROM batch")
+    mask = np.ones(len(values), dtype=bool)
+    mask[seen] = False
+    return mask
+
+
+def _drop_empty_and_duplicate_rows(df, seen=None, known_hashes=None):
+    """
+    Drop all-empty rows and repeated rows in one boolean mask, comparing 64-bit row hashes.
+    With `seen` (a hash store from `_open_hash_store`), rows seen in earlier chunks are dropped too
+    and the store is updated.
+    With `known_hashes` (a sorted array), rows already in a previously cleaned dataset are dropped.
+    Returns the remaining rows and their hashes.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    keep = ~hashes.duplicated().to_numpy() & ~_empty_rows(df)
+    values = hashes.to_numpy()
+    if seen is not None:
+        candidates = np.flatnonzero(keep)
+        keep[candidates] = _unseen(seen, values[candidates])
+    if known_hashes is not None and len(known_hashes):
+        positions = np.searchsorted(known_hashes, values).clip(max=len(known_hashes) - 1)
+        keep &= known_hashes[positions] != values
+    if keep.all():
+        return df, values
+    rows = np.flatnonzero(keep)
+    return df.take(rows), values[rows]
+
+
+def _cast_losslessly(values, dtype):
+    """`values` cast to `dtype`, or None when the cast fails or changes a number (overflow, truncation)."""
+    try:
+        cast = values.astype(dtype)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if pd.api.types.is_numeric_dtype(values.dtype) and pd.api.types.is_numeric_dtype(cast.dtype):
+        before = values.to_numpy(dtype="float64", na_value=np.nan)
+        after = cast.to_numpy(dtype="float64", na_value=np.nan)
+        if not np.array_equal(before, after, equal_nan=True):
+            return None
+    return cast
+
+
+def _align_dtypes(df, dtypes):
+    """
+    Cast columns to the dtypes recorded in a schema. Raises ValueError naming the columns whose
+    values do not fit (e.g. an appended 300 in a column downcast to int8).
+    """
+    misfits = []
+    for col, dtype in dtypes.items():
+        if col in df.columns and str(df[col].dtype) != dtype:
+            cast = _cast_losslessly(df[col], dtype)
+            if cast is None:
+                misfits.append(f"{col} ({df[col].dtype} -> {dtype})")
+            else:
+                df[col] = cast
+    if misfits:
+        raise ValueError(f"Values do not fit the stored column types: {', '.join(misfits)}")
+    return df
+
+
+def _report_timings(timings, rows=None):
+    for step, seconds in timings.items():
+        log_event("section", f"Clean Data: {step}", seconds=round(seconds, 4), rows=rows)
+    print("⏱️ Cleaning steps: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()))
+
+
+def clean_data(df, dataset_name="dataset", fingerprint=None, ctx=None, schema=None):
+    """
+    Cleans and standardizes the dataset for further analysis or AI processing.
+    Compatible with any dataset used in the Prefect pipeline.
+    The schema descriptor (`build_schema`) is computed unless given, and attached to the result
+    as `df.attrs["schema"]`; per-step timings are printed and kept in `df.attrs["clean_timings"]`.
+    When the raw file's `fingerprint` is given, the result is stored in the columnar dataset cache,
+    otherwise in the run's processed folder (`ctx`, a RunContext).
+    """
+    ctx = ctx or DEFAULT_CONTEXT
+
+    print("🧹 Cleaning data...")
+    timings = {}
+    start = time.perf_counter()
+
+    def step(name):
+        nonlocal start
+        now = time.perf_counter()
+        timings[name] = now - start
+        start = now
+
+    # Normalize column names
+    _normalize_columns(df)
+    step("normalize")
+
+    schema = schema or build_schema(df)
+    step("schema")
+
+    # Basic cleaning
+    df, row_hashes = _drop_empty_and_duplicate_rows(df)
+    step("dedup")
+
+    # Wide one-hot blocks back into categoricals
+    df = _fold_one_hot(df, schema)
+    step("fold")
+
+    _add_derived_features(df, schema)
+    step("derive")
 
+    df.attrs["schema"] = schema
+
+    # Save cleaned dataset as typed columns (Arrow), falling back to CSV.
+    # Its sorted row hashes are kept too, so rows appended later can be deduplicated against it.
+    if fingerprint:
+        cleaned_path = write_cached_frame(df, fingerprint, "clean")
+        write_cached_array(np.sort(row_hashes), fingerprint, "row_hashes")
+    else:
+        cleaned_path = write_frame(df, ctx.processed_path(f"cleaned_{dataset_name}.arrow"))
+
+    if not cleaned_path:
+        os.makedirs(ctx.processed_dir, exist_ok=True)
+        cleaned_path = ctx.processed_path(f"cleaned_{dataset_name}.csv")
+        df.to_csv(cleaned_path, index=False)
+    step("save")
+
+    df.attrs["clean_timings"] = {name: round(seconds, 4) for name, seconds in timings.items()}
+    _report_timings(timings, len(df))
     print(f"✅ Cleaned data saved to {cleaned_path}")
     return df
+
+
+def clean_appended(df, schema, known_hashes=None):
+    """
+    Clean rows appended to an already cleaned dataset, using that dataset's schema descriptor
+    (columns are cast to its dtypes, so row hashes and derived features match the base).
+    Rows repeating each other or a base row (`known_hashes`: the base's sorted row hashes) are dropped.
+    Returns the cleaned rows and their row hashes. Raises ValueError when the rows do not fit the
+    base's dtypes without changing values; the dataset then has to be cleaned in full.
+    """
+    _normalize_columns(df)
+    df = _align_dtypes(df, schema["dtypes"])
+    df, row_hashes = _drop_empty_and_duplicate_rows(df, known_hashes=known_hashes)
+    df = _fold_one_hot(df, schema)
+    _add_derived_features(df, schema)
+    df.attrs["schema"] = schema
+    return df, row_hashes
+
+
+def clean_chunks(chunks, dataset_name="dataset", ctx=None, dedup_across_chunks=True):
+    """
+    Streaming counterpart of `clean_data` for the chunks produced by `load_data(path, chunksize=...)`.
+    Yields cleaned chunks and appends them to the cleaned CSV, so only one chunk is held at a time.
+    Duplicates are removed across chunks by keeping the 64-bit row hashes seen so far in a temporary
+    on-disk store, so memory stays bounded by the chunk size; `dedup_across_chunks=False` only removes
+    duplicates within each chunk.
+    """
+
+    ctx = ctx or DEFAULT_CONTEXT
+
+    print("🧹 Cleaning data chunk by chunk...")
+
+    os.makedirs(ctx.processed_dir, exist_ok=True)
+    cleaned_path = ctx.processed_path(f"cleaned_{dataset_name}.csv")
+
+    seen = _open_hash_store() if dedup_across_chunks else None
+    schema = None
+    rows = 0
+
+    try:
+        for i, chunk in enumerate(chunks):
+            _normalize_columns(chunk)
+            if schema is None:
+                schema = build_schema(chunk)
+
+            # Drop empty rows and rows already seen in this or an earlier chunk
+            chunk, _ = _drop_empty_and_duplicate_rows(chunk, seen)
+
+            chunk = _fold_one_hot(chunk, schema)
+            _add_derived_features(chunk, schema)
+            chunk.attrs["schema"] = schema
+
+            chunk.to_csv(cleaned_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            rows += len(chunk)
+            yield chunk
+    finally:
+        if seen is not None:
+            seen.close()
+
+    print(f"✅ Cleaned {rows} rows saved to {cleaned_path}")
+
+
+def summarize_chunks(chunks):
+    """
+    Compute summary statistics (count, nulls, mean, std, quartiles, min, max) for numeric columns
+    by merging running per-chunk profiles, without concatenating the chunks.
+    """
+    columns = ["count", "nulls", "mean", "std", "min", "p25", "median", "p75", "max"]
+    profile = profile_chunks(chunks)
+    if profile is None:
+        return pd.DataFrame(columns=columns)
+
+    summary = summarize_profile(profile, digits=15)["numeric"]
+    table = pd.DataFrame.from_dict(summary, orient="index")
+    table["count"] = [profile["numeric"][c]["count"] for c in profile["numeric"]]
+    table["nulls"] = [profile["numeric"][c]["nulls"] for c in profile["numeric"]]
+    return table[columns]
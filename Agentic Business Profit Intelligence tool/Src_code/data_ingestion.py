@@ -1,14 +1,64 @@
+import codecs
 import pandas as pd
 
-def load_data(path: str):
+# Bytes read from the head of the file to decide on an encoding
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+
+# Default number of rows per chunk in streaming mode
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def sniff_encoding(path: str, sample_bytes: int = ENCODING_SAMPLE_BYTES):
+    """
+    Guess the file encoding from a sample of its first bytes.
+    Returns 'utf-8' when the sample decodes cleanly, otherwise 'latin1'.
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+
+    # Incremental decoder so a multi-byte character cut at the end of the sample is not an error
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        decoder.decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def iter_chunks(path: str, chunksize: int = DEFAULT_CHUNKSIZE, encoding: str = None):
+    """
+    Stream the dataset in bounded-size chunks.
+    The encoding is sniffed once up front, so the file is only read a single time.
+    """
+    encoding = encoding or sniff_encoding(path)
+    print(f"Streaming dataset from: {path} (encoding={encoding}, chunksize={chunksize})")
+
+    # Undecodable bytes past the sniffed sample are replaced instead of aborting a long stream
+    reader = pd.read_csv(path, encoding=encoding, encoding_errors="replace", chunksize=chunksize)
+    rows = 0
+    with reader:
+        for chunk in reader:
+            rows += len(chunk)
+            yield chunk
+
+    print(f"Streamed {rows} rows.")
+
+
+def load_data(path: str, chunksize: int = None):
     """
     Load dataset dynamically from the given path.
+    Pass `chunksize` to get a generator of DataFrame chunks instead of one frame.
     """
+    if chunksize:
+        return iter_chunks(path, chunksize)
+
     print(f"Loading dataset from: {path}")
+    encoding = sniff_encoding(path)
     try:
-        df = pd.read_csv(path, encoding='utf-8')
+        df = pd.read_csv(path, encoding=encoding)
     except UnicodeDecodeError:
+        # The sample looked like UTF-8 but a later byte did not
         df = pd.read_csv(path, encoding='latin1')
 
     print(f"Loaded {df.shape[0]} rows and {df.shape[1]} columns.")
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+
+import numpy as np
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the columnar cache is disabled without pyarrow
+    feather = None
+
+# Columnar cache of raw and cleaned frames, keyed by the raw file's content hash
+CACHE_DIR = "Data/Processed/cache"
+
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# Least recently used datasets (all files stored under one key) are evicted beyond this total size
+MAX_DATASET_CACHE_BYTES = 4 * 1024 ** 3
+
+# Files stored under a dataset key: "<32 hex digits>.<name>.<arrow|json|npy|pkl>"; the LLM cache,
+# snapshot index and the charts/tasks/profiles folders are managed by their own modules
+_KEYED_FILE = re.compile(r"^([0-9a-f]{32})\.[^/]+\.(arrow|json|npy|pkl)$")
+
+
+def dataset_fingerprint(path: str):
+    """
+    Content hash of a dataset file, read in fixed-size blocks.
+    Identical files give the same fingerprint regardless of name or location.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def bytes_fingerprint(data):
+    """Fingerprint of in-memory file content (e.g. an upload); equal to `dataset_fingerprint` of the saved file."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _touch(path: str):
+    """Mark a cache file as recently used."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_dataset_cache(max_bytes: int = MAX_DATASET_CACHE_BYTES, keep: str = None):
+    """
+    Delete the files of least recently used dataset keys until the cache fits in `max_bytes`.
+    A key's files (raw/clean frames, row hashes, profiles) are evicted together; `keep` is never evicted.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    keys = {}
+    for name in os.listdir(CACHE_DIR):
+        match = _KEYED_FILE.match(name)
+        if not match:
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:  # removed by a concurrent writer
+            continue
+        used, size, paths = keys.get(match.group(1), (0, 0, []))
+        keys[match.group(1)] = (max(used, stat.st_mtime), size + stat.st_size, paths + [path])
+
+    total = sum(size for _, size, _ in keys.values())
+    for key, (_, size, paths) in sorted(keys.items(), key=lambda item: item[1][0]):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+
+
+def cached_frame_path(fingerprint: str, stage: str):
+    """Location of the cached frame for a dataset fingerprint and pipeline stage ('raw', 'clean', ...)."""
+    return os.path.join(CACHE_DIR, f"{fingerprint}.{stage}.arrow")
+
+
+def write_frame(df, path: str):
+    """
+    Write a DataFrame as an uncompressed Arrow IPC (Feather v2) file so it can be memory-mapped on read.
+    Returns the path, or None when the frame cannot be stored columnar (e.g. mixed-type object columns).
+    """
+    if feather is None:
+        return None
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ Could not write columnar cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    return path
+
+
+def read_frame(path: str):
+    """Memory-map an Arrow IPC file back into a DataFrame. Returns None if it is missing or unreadable."""
+    if feather is None or not os.path.exists(path):
+        return None
+    try:
+        return feather.read_table(path, memory_map=True).to_pandas()
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable columnar cache {path}: {e}")
+        return None
+
+
+def read_cached_frame(fingerprint: str, stage: str):
+    """Return the cached frame for this dataset and stage, or None on a cache miss."""
+    df = read_frame(cached_frame_path(fingerprint, stage))
+    if df is not None:
+        _touch(cached_frame_path(fingerprint, stage))
+        print(f"⚡ Loaded cached {stage} data ({df.shape[0]} rows) for dataset {fingerprint[:12]}")
+    return df
+
+
+def write_cached_frame(df, fingerprint: str, stage: str):
+    """Store a frame in the columnar cache for this dataset and stage."""
+    path = write_frame(df, cached_frame_path(fingerprint, stage))
+    evict_dataset_cache(keep=fingerprint)
+    return path
+
+
+def cached_json_path(fingerprint: str, name: str):
+    return os.path.join(CACHE_DIR, f"{fingerprint}.{name}.json")
+
+
+def read_cached_json(fingerprint: str, name: str):
+    """Return a small JSON document cached alongside the dataset (e.g. its statistical profile), or None."""
+    path = cached_json_path(fingerprint, name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _touch(path)
+    return data
+
+
+def write_cached_json(data, fingerprint: str, name: str):
+    path = cached_json_path(fingerprint, name)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+    evict_dataset_cache(keep=fingerprint)
+    return path
+
+
+def cached_array_path(fingerprint: str, name: str):
+    return os.path.join(CACHE_DIR, f"{fingerprint}.{name}.npy")
+
+
+def read_cached_array(fingerprint: str, name: str):
+    """Memory-map a NumPy array cached alongside the dataset (e.g. its row hashes), or None."""
+    path = cached_array_path(fingerprint, name)
+    if not os.path.exists(path):
+        return None
+    try:
+        data = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    _touch(path)
+    return data
+
+
+def write_cached_array(data, fingerprint: str, name: str):
+    path = cached_array_path(fingerprint, name)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+    np.save(tmp_path, data)
+    os.replace(tmp_path, path)
+    evict_dataset_cache(keep=fingerprint)
+    return path
+
+
+def cached_object_path(fingerprint: str, name: str):
+    return os.path.join(CACHE_DIR, f"{fingerprint}.{name}.pkl")
+
+
+def read_cached_object(fingerprint: str, name: str):
+    """Return a pickled object cached alongside the dataset (e.g. a mergeable profile), or None."""
+    path = cached_object_path(fingerprint, name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except Exception:
+        return None
+    _touch(path)
+    return data
+
+
+def write_cached_object(data, fingerprint: str, name: str):
+    path = cached_object_path(fingerprint, name)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict_dataset_cache(keep=fingerprint)
+    return path
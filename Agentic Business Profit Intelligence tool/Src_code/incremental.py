@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from Src_code.data_cleaning import clean_appended
+from Src_code.data_ingestion import sniff_encoding
+from Src_code.dataset_cache import (CACHE_DIR, HASH_BLOCK_BYTES, read_cached_array, read_cached_frame,
+                                    read_cached_object, write_cached_array, write_cached_frame,
+                                    write_cached_object)
+from Src_code.statistics_engine import compute_profile, merge_profiles
+
+# Processed versions of dataset files (size, content fingerprint, cleaned-store key), used to
+# recognize a file that has only had rows appended since it was last processed
+SNAPSHOT_INDEX_PATH = os.path.join(CACHE_DIR, "snapshots.json")
+
+# Most recently recorded snapshots kept in the index
+MAX_SNAPSHOTS = 50
+
+
+def _load_snapshots():
+    if not os.path.exists(SNAPSHOT_INDEX_PATH):
+        return {}
+    try:
+        with open(SNAPSHOT_INDEX_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_snapshots(snapshots):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{SNAPSHOT_INDEX_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshots, f, indent=2)
+    os.replace(tmp_path, SNAPSHOT_INDEX_PATH)
+
+
+def record_snapshot(file_path: str, fingerprint: str, clean_key: str, rows: int):
+    """Remember that this file content (by fingerprint) has been cleaned into the store under `clean_key`."""
+    snapshots = _load_snapshots()
+    snapshots[clean_key] = {
+        "fingerprint": fingerprint,
+        "size": os.path.getsize(file_path),
+        "clean_key": clean_key,
+        "rows": rows,
+        "created": time.time(),
+    }
+    newest = sorted(snapshots.items(), key=lambda kv: kv[1]["created"], reverse=True)[:MAX_SNAPSHOTS]
+    _save_snapshots(dict(newest))
+
+
+def find_base_snapshot(file_path: str, clean_key_fn):
+    """
+    Find the largest recorded snapshot whose content is a prefix of this file, ending on a line break,
+    i.e. the file has only had rows appended since. `clean_key_fn(fingerprint)` gives the cleaned-store
+    key under the current code and settings, so snapshots cleaned differently are ignored.
+    Returns the snapshot dict, or None. Reads the file up to the largest candidate size, once.
+    """
+    size = os.path.getsize(file_path)
+    candidates = {
+        snapshot["size"]: snapshot for snapshot in _load_snapshots().values()
+        if snapshot["size"] < size and snapshot["clean_key"] == clean_key_fn(snapshot["fingerprint"])
+    }
+    if not candidates:
+        return None
+
+    # The same block-wise blake2b as dataset_fingerprint, checked at every candidate size
+    h = hashlib.blake2b(digest_size=16)
+    base, offset, last_byte = None, 0, b""
+    with open(file_path, "rb") as f:
+        for stop in sorted(candidates):
+            while offset < stop:
+                block = f.read(min(HASH_BLOCK_BYTES, stop - offset))
+                if not block:
+                    break
+                h.update(block)
+                offset += len(block)
+                last_byte = block[-1:]
+            if last_byte == b"\n" and h.copy().hexdigest() == candidates[stop]["fingerprint"]:
+                base = candidates[stop]
+    return base
+
+
+def read_appended_rows(file_path: str, offset: int):
+    """Parse only the rows after byte `offset` (a line boundary), using the file's header line."""
+    encoding = sniff_encoding(file_path)
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read()
+    return pd.read_csv(BytesIO(header + tail), encoding=encoding, encoding_errors="replace")
+
+
+def _append_rows(base, delta):
+    merged = pd.concat([base, delta], ignore_index=True)
+    # Categoricals with different categories concatenate to object; restore them
+    for col in base.columns:
+        if isinstance(base[col].dtype, pd.CategoricalDtype) and not isinstance(merged[col].dtype, pd.CategoricalDtype):
+            merged[col] = merged[col].astype("category")
+    return merged
+
+
+def update_clean_store(file_path: str, clean_key: str, snapshot):
+    """
+    Clean only the rows appended since `snapshot` and store base + new rows under `clean_key`,
+    together with the merged row hashes. Returns (merged frame, cleaned new rows), or None when the
+    snapshot's cleaned data is gone or the appended rows do not share its columns and dtypes.
+    """
+    base = read_cached_frame(snapshot["clean_key"], "clean")
+    known_hashes = read_cached_array(snapshot["clean_key"], "row_hashes")
+    schema = base.attrs.get("schema") if base is not None else None
+    if base is None or known_hashes is None or schema is None:
+        print("⚠️ Cleaned data of the previous snapshot is unavailable; processing the dataset in full.")
+        return None
+
+    delta = read_appended_rows(file_path, snapshot["size"])
+    try:
+        delta, delta_hashes = clean_appended(delta, schema, known_hashes)
+    except ValueError as e:
+        print(f"⚠️ {e}; processing the dataset in full.")
+        return None
+    if list(delta.columns) != list(base.columns):
+        print("⚠️ Appended rows do not match the previous columns; processing the dataset in full.")
+        return None
+
+    merged = _append_rows(base, delta)
+    merged.attrs["schema"] = schema
+    write_cached_frame(merged, clean_key, "clean")
+    write_cached_array(np.sort(np.concatenate([known_hashes, delta_hashes]), kind="stable"), clean_key, "row_hashes")
+    print(f"➕ Appended {len(delta)} new rows to {len(base)} previously cleaned rows")
+    return merged, delta
+
+
+def update_profile_state(base_key: str, key: str, delta):
+    """Merge the profile of the new rows into the base's running profile, if one was stored."""
+    base = read_cached_object(base_key, "profile_state")
+    if base is None:
+        return None
+    profile = merge_profiles(base, compute_profile(delta), seed=base["rows"])
+    write_cached_object(profile, key, "profile_state")
+    return profile
@@ -0,0 +1,328 @@
+import collections
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Structured log of one pipeline run, next to its other results
+RUN_LOG_FILE = "run_log.jsonl"
+
+# Optional profiler for a whole run: "cprofile" (calling thread only) or "sampling" (every thread)
+PROFILER_ENV_VAR = "ABPI_PROFILER"
+PROFILERS = ("cprofile", "sampling")
+
+# Sampling profiler interval in seconds, and how many functions the run log keeps from a profile
+SAMPLE_INTERVAL = 0.01
+PROFILE_TOP_N = 25
+
+# Innermost frames of threads that are only waiting (idle pool workers, the LLM event loop)
+IDLE_FRAMES = {"threading.py:wait", "threading.py:_wait_for_tstate_lock", "queue.py:get",
+               "selectors.py:select", "thread.py:_worker"}
+
+_run_log = contextvars.ContextVar("run_log", default=None)
+_section = contextvars.ContextVar("run_log_section", default=None)
+
+
+# ============================
+# Process memory
+# ============================
+
+def _status_mb(field):
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb():
+    """Current resident memory of the process in MB (None where /proc is unavailable)."""
+    return _status_mb("VmRSS")
+
+
+def peak_rss_mb():
+    """Peak resident memory of the process so far, in MB."""
+    peak = _status_mb("VmHWM")
+    if peak is None:
+        try:
+            import resource
+        except ImportError:  # Windows
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    return peak
+
+
+def _round_mb(value):
+    return round(value, 1) if value is not None else None
+
+
+# ============================
+# Run log
+# ============================
+
+class RunLog:
+    """Append-only JSON Lines log of one run; safe to write from several threads."""
+
+    def __init__(self, path, run_id=None, profiler=None):
+        self.path = path
+        self.run_id = run_id
+        self.profiler = profiler
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, **fields):
+        event = {"time": round(time.time(), 3), "run_id": self.run_id, "kind": kind, "name": name,
+                 "thread": threading.current_thread().name, **fields}
+        line = json.dumps(event, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def current_run_log():
+    return _run_log.get()
+
+
+def capture():
+    """The active run log and section, to carry into another thread or event loop (see `bound`)."""
+    return _run_log.get(), _section.get()
+
+
+@contextmanager
+def bound(captured):
+    """Make a `capture()`d run log and section active in the current thread or task."""
+    log_token, section_token = _run_log.set(captured[0]), _section.set(captured[1])
+    try:
+        yield
+    finally:
+        _section.reset(section_token)
+        _run_log.reset(log_token)
+
+
+def log_event(kind, name, **fields):
+    """Record an event in the active run log (no-op outside a run). Tags it with the enclosing section."""
+    log = _run_log.get()
+    if log is not None:
+        log.record(kind, name, section=_section.get(), **fields)
+
+
+@contextmanager
+def timed(name, kind="section", **fields):
+    """
+    Time a block and record its duration, memory and status in the active run log.
+    The yielded dict takes extra fields, e.g. `info["rows"] = len(df)`; rows/s is added when rows are known.
+    Memory is per process: RSS at the end, its change over the block, and the process peak so far.
+    """
+    info = dict(fields)
+    log = _run_log.get()
+    if log is None:
+        yield info
+        return
+
+    token = _section.set(name)
+    start_rss = rss_mb()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield info
+    except BaseException as e:
+        status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _section.reset(token)
+        end_rss = rss_mb()
+        if info.get("rows") and seconds > 0:
+            info["rows_per_second"] = round(info["rows"] / seconds, 1)
+        log_event(kind, name, seconds=round(seconds, 4), status=status, rss_mb=_round_mb(end_rss),
+                  rss_delta_mb=_round_mb(end_rss - start_rss) if end_rss is not None and start_rss is not None else None,
+                  peak_rss_mb=_round_mb(peak_rss_mb()), **info)
+
+
+def instrumented(name, kind="stage"):
+    """Decorator running a function inside `timed(name)`; rows are counted from the frame it returns or gets."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(name, kind) as info:
+                result = fn(*args, **kwargs)
+                frame = result if hasattr(result, "shape") else next((a for a in args if hasattr(a, "shape")), None)
+                if frame is not None:
+                    info["rows"] = int(frame.shape[0])
+                return result
+        return wrapper
+    return decorate
+
+
+def read_run_log(path):
+    """All events of a run log, oldest first ([] if it does not exist)."""
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:  # a line cut short by a crash
+                continue
+    return events
+
+
+# ============================
+# Profilers
+# ============================
+
+class SamplingProfiler:
+    """Samples the stacks of every thread at a fixed interval; cheap enough to leave on for a whole run."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack and stack[0] not in IDLE_FRAMES:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def top(self, n=PROFILE_TOP_N):
+        """Functions by samples spent in them (self) and below them (cumulative)."""
+        own, cumulative = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        return [{"function": fn, "cumulative_seconds": round(samples * self.interval, 3),
+                 "self_seconds": round(own[fn] * self.interval, 3)}
+                for fn, samples in cumulative.most_common(n)]
+
+    def write(self, path):
+        """Folded stacks (one "a;b;c count" line per stack), the input format of flame graph tools."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(profiler, output_dir):
+    """
+    Profile a block with "cprofile" (deterministic, calling thread only; stats in profile.prof)
+    or "sampling" (all threads; folded stacks in profile.folded), logging the top functions.
+    Does nothing when `profiler` is None.
+    """
+    if not profiler:
+        yield
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}'. Choose from {PROFILERS}.")
+
+    if profiler == "cprofile":
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            path = os.path.join(output_dir, "profile.prof")
+            prof.dump_stats(path)
+            stats = pstats.Stats(prof).sort_stats("cumulative")
+            top = [{"function": f"{os.path.basename(filename)}:{line}:{fn}", "calls": calls,
+                    "cumulative_seconds": round(cumtime, 3), "self_seconds": round(tottime, 3)}
+                   for (filename, line, fn), (_, calls, tottime, cumtime, _) in
+                   sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:PROFILE_TOP_N]]
+            log_event("profile", "cprofile", path=path, top=top)
+            print(f"🔬 cProfile stats saved to {path}")
+        return
+
+    sampler = SamplingProfiler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        path = os.path.join(output_dir, "profile.folded")
+        sampler.write(path)
+        log_event("profile", "sampling", path=path, interval=sampler.interval, top=sampler.top())
+        print(f"🔬 Sampled stacks saved to {path}")
+
+
+@contextmanager
+def recording(ctx, run_id=None, profiler=None, **fields):
+    """
+    Record a pipeline run into ctx.results_path(RUN_LOG_FILE): a "run" event with its total time
+    and status when the block ends, plus everything `timed`/`log_event` record inside it.
+    `profiler` (or ABPI_PROFILER) additionally profiles the block.
+    """
+    profiler = profiler or os.environ.get(PROFILER_ENV_VAR) or None
+    log = RunLog(ctx.results_path(RUN_LOG_FILE), run_id or ctx.run_id, profiler)
+    token = _run_log.set(log)
+    try:
+        with timed("Pipeline", kind="run", profiler=profiler, pid=os.getpid(), **fields):
+            with profiled(profiler, ctx.results_dir):
+                yield log
+    finally:
+        _run_log.reset(token)
+
+
+# ============================
+# Summaries
+# ============================
+
+def summarize_run(events):
+    """Per-stage, per-section and LLM totals of a run log, for the dashboard and the CLI."""
+    run = next((e for e in reversed(events) if e["kind"] == "run"), None)
+    stages = [e for e in events if e["kind"] == "stage"]
+
+    sections = collections.OrderedDict()
+    for e in events:
+        if e["kind"] == "section":
+            entry = sections.setdefault(e["name"], {"name": e["name"], "count": 0, "seconds": 0.0, "rows": 0})
+            entry["count"] += 1
+            entry["seconds"] += e.get("seconds") or 0.0
+            entry["rows"] += e.get("rows") or 0
+
+    llm_calls = [e for e in events if e["kind"] == "llm"]
+    llm = {
+        "calls": len(llm_calls),
+        "cached": sum(1 for e in llm_calls if e.get("cached")),
+        "seconds": round(sum(e.get("seconds") or 0.0 for e in llm_calls), 3),
+        "input_tokens": sum(e.get("input_tokens") or 0 for e in llm_calls),
+        "output_tokens": sum(e.get("output_tokens") or 0 for e in llm_calls),
+        "estimated_tokens": any(e.get("tokens_estimated") for e in llm_calls),
+        "retries": sum(max((e.get("attempts") or 1) - 1, 0) for e in llm_calls),
+    }
+    return {
+        "run": run,
+        "stages": stages,
+        "sections": sorted(sections.values(), key=lambda s: s["seconds"], reverse=True),
+        "llm": llm,
+        "cache_hits": [e["name"] for e in events if e["kind"] == "cache"],
+        "profile": next((e for e in events if e["kind"] == "profile"), None),
+    }
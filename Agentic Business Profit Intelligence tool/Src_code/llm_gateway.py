@@ -0,0 +1,541 @@
+import ast
+import asyncio
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from Src_code import instrumentation
+from Src_code.dataset_cache import CACHE_DIR
+
+# Disk-backed response cache shared by every LLM call site (and every process)
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_cache.sqlite")
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+MAX_CACHE_ENTRIES = 5000
+
+# Backend used when none is set explicitly: "openai" (default) or "stub" for offline runs
+BACKEND_ENV_VAR = "ABPI_LLM_BACKEND"
+# Seconds of simulated latency per stub call, to benchmark the pipeline with realistic waits
+STUB_LATENCY_ENV_VAR = "ABPI_LLM_STUB_LATENCY"
+
+# Deadline per attempt (for streams: the longest wait for the next chunk), retries after a
+# transient failure (timeouts, dropped connections, rate limits, 5xx) and the base of their
+# jittered exponential backoff
+DEFAULT_TIMEOUT_SECONDS = 120
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+
+# LLM requests in flight at once across every thread of the process
+MAX_CONCURRENT_CALLS = 8
+
+_backends = {}
+_stream_backends = {}
+_active_backend = None
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# All calls run on one background event loop, so the async HTTP pools and the semaphore are shared
+_loop = None
+_semaphore = None
+_loop_lock = threading.Lock()
+
+# Token counts reported by the backend for the call in progress (a dict per call, see `_record_usage`)
+_usage = contextvars.ContextVar("llm_usage", default=None)
+
+# Rough characters per token, for backends that do not report usage
+CHARS_PER_TOKEN = 4
+
+
+# ============================
+# Backends
+# ============================
+
+def register_backend(name: str, fn):
+    """
+    Register a backend: `fn(prompt, model, temperature) -> str`.
+    `fn` may be a coroutine function; plain functions run on a worker thread.
+    """
+    _backends[name] = fn
+
+
+def register_stream_backend(name: str, fn):
+    """
+    Register a streaming variant of a backend: `fn(prompt, model, temperature)` yields text chunks.
+    `fn` may be an async generator function; plain generators are iterated on a worker thread.
+    """
+    _stream_backends[name] = fn
+
+
+def set_llm_backend(name: str):
+    """Select the backend for subsequent calls in this process."""
+    global _active_backend
+    if name not in _backends:
+        raise ValueError(f"Unknown LLM backend '{name}'. Available: {sorted(_backends)}")
+    _active_backend = name
+
+
+def get_llm_backend():
+    return _active_backend or os.environ.get(BACKEND_ENV_VAR, "openai")
+
+
+def get_chat_client(model: str, temperature: float):
+    """Reuse one ChatOpenAI client (and its HTTP connection pool) per model/temperature."""
+    key = (model, temperature)
+    with _clients_lock:
+        if key not in _clients:
+            from langchain_openai import ChatOpenAI
+            # Deadlines and retries are handled by the gateway, so the client's own retries are off
+            _clients[key] = ChatOpenAI(model=model, temperature=temperature, stream_usage=True,
+                                       timeout=DEFAULT_TIMEOUT_SECONDS, max_retries=0)
+        return _clients[key]
+
+
+def _record_usage(metadata):
+    """Let a backend report the token counts of the call in progress (LangChain `usage_metadata`)."""
+    usage = _usage.get()
+    if usage is not None and metadata:
+        usage["input_tokens"] = usage.get("input_tokens", 0) + (metadata.get("input_tokens") or 0)
+        usage["output_tokens"] = usage.get("output_tokens", 0) + (metadata.get("output_tokens") or 0)
+
+
+async def _openai_backend(prompt, model, temperature):
+    message = await get_chat_client(model, temperature).ainvoke(prompt)
+    _record_usage(getattr(message, "usage_metadata", None))
+    return message.content
+
+
+async def _openai_stream_backend(prompt, model, temperature):
+    async for chunk in get_chat_client(model, temperature).astream(prompt):
+        _record_usage(getattr(chunk, "usage_metadata", None))
+        if chunk.content:
+            yield chunk.content
+
+
+def _parse_column_list(prompt, label):
+    match = re.search(rf"{label} columns:\s*(\[[^\]]*\])", prompt)
+    if not match:
+        return []
+    try:
+        return list(ast.literal_eval(match.group(1)))
+    except (ValueError, SyntaxError):
+        return []
+
+
+def _stub_visual_plan(prompt):
+    """A plausible visualization plan built from the schema listed in the prompt."""
+    numeric = _parse_column_list(prompt, "Numeric")
+    categorical = _parse_column_list(prompt, "Categorical")
+    # Prefer typical low-cardinality business dimensions over IDs and names
+    preferred = [c for c in categorical if c in ("region", "category", "segment", "ship mode", "gender", "weekday")]
+    dimension = (preferred or categorical or [None])[0]
+    plan = []
+    if dimension and numeric:
+        plan.append({"type": "bar", "x": dimension, "y": numeric[-1], "title": f"{numeric[-1]} by {dimension}"})
+        plan.append({"type": "box", "x": dimension, "y": numeric[0], "title": f"{numeric[0]} spread by {dimension}"})
+    if len(numeric) > 1:
+        plan.append({"type": "scatter", "x": numeric[0], "y": numeric[1], "title": f"{numeric[1]} vs {numeric[0]}"})
+    if numeric:
+        plan.append({"type": "hist", "x": numeric[0], "title": f"Distribution of {numeric[0]}"})
+    if len(numeric) > 2:
+        plan.append({"type": "heatmap", "title": "Correlation Heatmap"})
+    return json.dumps(plan[:5])
+
+
+def _stub_response(prompt, model):
+    if "Return ONLY valid JSON" in prompt:
+        return _stub_visual_plan(prompt)
+
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    theme = re.search(r"^Theme: (.+)$", prompt, re.MULTILINE)
+    if theme:
+        # One section of a themed insight request
+        return "\n".join(
+            f"- [{model} stub] {theme.group(1).strip()} observation {digest[j * 8:][:8]}: placeholder insight."
+            for j in range(4)
+        )
+    themes = ["Sales and Profit Trends", "Customer Behavior", "Regional or Category Insights",
+              "Discount and Pricing Patterns", "Operational or Shipping Observations"]
+    lines = []
+    for i, theme in enumerate(themes):
+        lines.append(f"**{theme}**")
+        for j in range(4):
+            token = digest[(i * 4 + j) % len(digest):][:8]
+            lines.append(f"- [{model} stub] Observation {token}: placeholder insight for offline runs.")
+        lines.append("")
+    lines.append("**Strategic Recommendations**")
+    lines.extend(f"- [{model} stub] Recommendation {k + 1}." for k in range(3))
+    return "\n".join(lines)
+
+
+def _stub_latency():
+    return float(os.environ.get(STUB_LATENCY_ENV_VAR, "0"))
+
+
+async def _stub_backend(prompt, model, temperature):
+    """
+    Deterministic offline backend: the same prompt always yields the same answer.
+    Sleeps for ABPI_LLM_STUB_LATENCY seconds to mimic network latency.
+    """
+    await asyncio.sleep(_stub_latency())
+    return _stub_response(prompt, model)
+
+
+async def _stub_stream_backend(prompt, model, temperature):
+    """The stub's answer line by line, with its latency spread over the lines."""
+    lines = _stub_response(prompt, model).splitlines(keepends=True)
+    for line in lines:
+        await asyncio.sleep(_stub_latency() / len(lines))
+        yield line
+
+
+register_backend("openai", _openai_backend)
+register_backend("stub", _stub_backend)
+register_stream_backend("openai", _openai_stream_backend)
+register_stream_backend("stub", _stub_stream_backend)
+
+
+# ============================
+# Response cache (SQLite, TTL + LRU)
+# ============================
+
+def _connect():
+    os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS llm_cache ("
+        " key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, last_used REAL)"
+    )
+    return conn
+
+
+def cache_key(backend: str, model: str, temperature: float, prompt: str):
+    payload = f"{backend}\x00{model}\x00{temperature}\x00{prompt}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key, ttl):
+    with closing(_connect()) as conn, conn:
+        row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response, created = row
+        if time.time() - created > ttl:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return response
+
+
+def _cache_put(key, model, response, max_entries):
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, model, response, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, model, response, now, now),
+        )
+        # Evict least recently used entries beyond the size cap
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        )
+
+
+def clear_llm_cache():
+    if os.path.exists(LLM_CACHE_PATH):
+        with closing(_connect()) as conn, conn:
+            conn.execute("DELETE FROM llm_cache")
+
+
+def _lookup(key, model, ttl):
+    try:
+        cached = _cache_get(key, ttl)
+    except sqlite3.Error as e:
+        print(f"⚠️ LLM cache unavailable: {e}")
+        return None
+    if cached is not None:
+        print(f"⚡ LLM cache hit ({model})")
+    return cached
+
+
+def _store(key, model, response, max_entries):
+    try:
+        _cache_put(key, model, response, max_entries)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not cache LLM response: {e}")
+
+
+# ============================
+# Async execution (deadlines, retries, concurrency limit)
+# ============================
+
+def _get_loop():
+    """Start the gateway's event loop on a daemon thread the first time it is needed."""
+    global _loop, _semaphore
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-gateway", daemon=True).start()
+        return _loop
+
+
+def _slot():
+    """The shared concurrency semaphore, created on the gateway loop (Python < 3.10 binds it there)."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+    return _semaphore
+
+
+async def _to_thread(fn, *args):
+    # asyncio.to_thread is Python 3.9+; the context copy keeps run logging and usage capture working
+    run = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(None, run)
+
+
+async def _bound(coro, captured):
+    # Calls made on the gateway loop log into the caller's run log
+    with instrumentation.bound(captured):
+        return await coro
+
+
+def _run(coro):
+    """Run a coroutine on the gateway loop and wait for its result from any thread."""
+    return asyncio.run_coroutine_threadsafe(_bound(coro, instrumentation.capture()), _get_loop()).result()
+
+
+def _is_retryable(error):
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in ("APITimeoutError", "APIConnectionError"):
+        return True
+    status = getattr(error, "status_code", None)
+    return status in (408, 409, 429) or (isinstance(status, int) and status >= 500)
+
+
+async def _backoff(attempt, error, model):
+    # Full jitter keeps concurrent callers from retrying in lockstep
+    delay = random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+    print(f"🔁 LLM call to {model} failed ({type(error).__name__}: {error}); retrying in {delay:.1f}s")
+    await asyncio.sleep(delay)
+
+
+def _get_backend(backend):
+    if backend not in _backends:
+        raise ValueError(f"Unknown LLM backend '{backend}'. Available: {sorted(_backends)}")
+    return _backends[backend]
+
+
+async def _call_backend(backend, prompt, model, temperature):
+    fn = _get_backend(backend)
+    if inspect.iscoroutinefunction(fn):
+        return await fn(prompt, model, temperature)
+    return await _to_thread(fn, prompt, model, temperature)
+
+
+async def _stream_backend(backend, prompt, model, temperature):
+    fn = _stream_backends.get(backend)
+    if fn is None:
+        yield await _call_backend(backend, prompt, model, temperature)
+    elif inspect.isasyncgenfunction(fn):
+        async for chunk in fn(prompt, model, temperature):
+            yield chunk
+    else:
+        chunks, end = fn(prompt, model, temperature), object()
+        while (chunk := await _to_thread(next, chunks, end)) is not end:
+            yield chunk
+
+
+def _estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _log_call(backend, model, prompt, response, start, attempts, usage, cached=False, status="ok", **fields):
+    """Record one LLM call in the active run log, estimating token counts the backend did not report."""
+    estimated = "input_tokens" not in usage
+    if estimated:
+        usage = {"input_tokens": _estimate_tokens(prompt),
+                 "output_tokens": _estimate_tokens(response) if response else 0}
+    instrumentation.log_event("llm", model, backend=backend, seconds=round(time.perf_counter() - start, 4),
+                              attempts=attempts, cached=cached, status=status, tokens_estimated=estimated,
+                              **usage, **fields)
+
+
+async def acomplete(prompt: str, model: str, temperature: float = 0.0, use_cache: bool = True,
+                    ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = MAX_CACHE_ENTRIES,
+                    timeout: float = DEFAULT_TIMEOUT_SECONDS, retries: int = MAX_RETRIES):
+    """
+    Async `complete`. Each attempt must finish within `timeout` seconds; transient failures are
+    retried up to `retries` times with jittered backoff. At most MAX_CONCURRENT_CALLS run at once.
+    Await it on the gateway loop (`complete`/`complete_many` take care of that).
+    """
+    backend = get_llm_backend()
+    _get_backend(backend)
+    key = cache_key(backend, model, temperature, prompt)
+    start = time.perf_counter()
+
+    if use_cache:
+        cached = await _to_thread(_lookup, key, model, ttl)
+        if cached is not None:
+            _log_call(backend, model, prompt, cached, start, 0, {}, cached=True)
+            return cached
+
+    usage = {}
+    token = _usage.set(usage)
+    try:
+        for attempt in range(retries + 1):
+            try:
+                # The slot is held per attempt, so backoff sleeps do not block other calls
+                async with _slot():
+                    response = await asyncio.wait_for(_call_backend(backend, prompt, model, temperature),
+                                                      timeout)
+                break
+            except Exception as e:
+                if attempt == retries or not _is_retryable(e):
+                    _log_call(backend, model, prompt, None, start, attempt + 1, usage,
+                              status=f"error: {type(e).__name__}")
+                    raise
+                await _backoff(attempt, e, model)
+    finally:
+        _usage.reset(token)
+    _log_call(backend, model, prompt, response, start, attempt + 1, usage)
+
+    if use_cache:
+        await _to_thread(_store, key, model, response, max_entries)
+    return response
+
+
+async def astream(prompt: str, model: str, temperature: float = 0.0, use_cache: bool = True,
+                  ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = MAX_CACHE_ENTRIES,
+                  timeout: float = DEFAULT_TIMEOUT_SECONDS, retries: int = MAX_RETRIES):
+    """
+    Async `stream`. `timeout` bounds the wait for each chunk; a failed stream is retried
+    only if it had not produced any text yet.
+    """
+    backend = get_llm_backend()
+    _get_backend(backend)
+    key = cache_key(backend, model, temperature, prompt)
+    start = time.perf_counter()
+
+    if use_cache:
+        cached = await _to_thread(_lookup, key, model, ttl)
+        if cached is not None:
+            _log_call(backend, model, prompt, cached, start, 0, {}, cached=True, streamed=True)
+            yield cached
+            return
+
+    usage, first_chunk = {}, None
+    token = _usage.set(usage)
+    try:
+        for attempt in range(retries + 1):
+            chunks = []
+            source = _stream_backend(backend, prompt, model, temperature)
+            try:
+                # The slot is held per attempt, so backoff sleeps do not block other calls
+                async with _slot():
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(source.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        if first_chunk is None:
+                            first_chunk = round(time.perf_counter() - start, 4)
+                        chunks.append(chunk)
+                        yield chunk
+                break
+            except Exception as e:
+                if chunks or attempt == retries or not _is_retryable(e):
+                    _log_call(backend, model, prompt, "".join(chunks), start, attempt + 1, usage,
+                              status=f"error: {type(e).__name__}", streamed=True,
+                              first_chunk_seconds=first_chunk)
+                    raise
+                await _backoff(attempt, e, model)
+            finally:
+                await source.aclose()
+    finally:
+        _usage.reset(token)
+    _log_call(backend, model, prompt, "".join(chunks), start, attempt + 1, usage, streamed=True,
+              first_chunk_seconds=first_chunk)
+
+    if use_cache:
+        await _to_thread(_store, key, model, "".join(chunks), max_entries)
+
+
+def _open_stream(prompt, model, **options):
+    """Start streaming on the gateway loop right away; the returned generator yields the chunks."""
+    chunks, end = queue.Queue(), object()
+    captured = instrumentation.capture()
+
+    async def pump():
+        try:
+            async for chunk in astream(prompt, model, **options):
+                chunks.put(chunk)
+        except Exception as e:
+            chunks.put(e)
+        else:
+            chunks.put(end)
+
+    future = asyncio.run_coroutine_threadsafe(_bound(pump(), captured), _get_loop())
+
+    def drain():
+        try:
+            while (item := chunks.get()) is not end:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    return drain()
+
+
+# ============================
+# Public entry point
+# ============================
+
+def complete(prompt: str, model: str, temperature: float = 0.0, use_cache: bool = True,
+             ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = MAX_CACHE_ENTRIES,
+             timeout: float = DEFAULT_TIMEOUT_SECONDS, retries: int = MAX_RETRIES):
+    """
+    Send a prompt to the active backend and return the response text.
+    Responses are cached on disk by (backend, model, temperature, prompt hash).
+    Safe to call from any thread; see `acomplete` for deadlines, retries and the concurrency limit.
+    """
+    return _run(acomplete(prompt, model, temperature, use_cache, ttl, max_entries, timeout, retries))
+
+
+def complete_many(prompts, model: str, temperature: float = 0.0, **options):
+    """`complete` for several prompts issued concurrently; responses come back in prompt order."""
+    async def gather():
+        return await asyncio.gather(*(acomplete(p, model, temperature, **options) for p in prompts))
+    return _run(gather())
+
+
+def stream(prompt: str, model: str, temperature: float = 0.0, use_cache: bool = True,
+           ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = MAX_CACHE_ENTRIES,
+           timeout: float = DEFAULT_TIMEOUT_SECONDS, retries: int = MAX_RETRIES):
+    """
+    Like `complete`, but yields the response in chunks as the backend produces them.
+    A cached response is yielded in one chunk; a completed stream is added to the cache.
+    Backends without a streaming variant yield their whole response once it arrives.
+    """
+    yield from _open_stream(prompt, model, temperature=temperature, use_cache=use_cache, ttl=ttl,
+                            max_entries=max_entries, timeout=timeout, retries=retries)
+
+
+def stream_many(prompts, model: str, temperature: float = 0.0, **options):
+    """
+    Start streaming several prompts concurrently. Returns one chunk generator per prompt, in order;
+    later streams keep buffering while earlier ones are being read.
+    """
+    return [_open_stream(p, model, temperature=temperature, **options) for p in prompts]
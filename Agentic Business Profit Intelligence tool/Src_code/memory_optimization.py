@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+
+def _memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def _is_lossless_float32(col):
+    """True if every value survives a float64 -> float32 -> float64 round trip."""
+    values = col.to_numpy(dtype="float64")
+    return np.array_equal(values.astype("float32").astype("float64"), values, equal_nan=True)
+
+
+def optimize_dtypes(df, max_unique_ratio: float = 0.5):
+    """
+    Shrink a freshly loaded dataset in place before cleaning:
+    - low-cardinality string columns become pandas categoricals
+    - integers are downcast to the smallest integer type that holds them
+    - floats are downcast to float32 (or to integers when they are whole numbers)
+      only when no value changes
+    Logs the memory footprint before and after.
+    """
+    before = _memory_mb(df)
+    n_rows = max(len(df), 1)
+
+    for col in df.columns:
+        series = df[col]
+
+        if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+
+        elif pd.api.types.is_float_dtype(series):
+            if series.notna().all() and (series % 1 == 0).all():
+                df[col] = pd.to_numeric(series, downcast="integer")
+            elif _is_lossless_float32(series):
+                df[col] = series.astype("float32")
+
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if series.nunique(dropna=True) / n_rows < max_unique_ratio:
+                df[col] = series.astype("category")
+
+    after = _memory_mb(df)
+    saved = (1 - after / before) * 100 if before else 0
+    print(f"🗜️ Memory optimized: {before:.2f} MB -> {after:.2f} MB ({saved:.0f}% smaller)")
+    return df
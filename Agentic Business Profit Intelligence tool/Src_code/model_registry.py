@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pandas as pd
+
+# Fitted models with their feature schema, keyed by the fingerprint of the data they were trained on
+REGISTRY_DIR = "Models"
+INDEX_PATH = os.path.join(REGISTRY_DIR, "index.sqlite")
+
+# Oldest (least recently used) models are removed beyond this count
+MAX_MODELS = 20
+
+# Registered datasets checked as possible prefixes of a grown dataset
+MAX_APPEND_CANDIDATES = 5
+
+
+def row_hashes(df):
+    """One 64-bit hash per row; the basis for exact and prefix (appended data) fingerprints."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def data_fingerprint(hashes, config_key: str):
+    """Fingerprint of a dataset (its row hashes) for one training configuration."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(config_key.encode("utf-8"))
+    h.update(hashes.tobytes())
+    return h.hexdigest()
+
+
+def config_key(target: str, backend: str, columns, settings=None):
+    """
+    Models are only reused or extended for the same target, backend, input columns and training
+    settings (`settings`, e.g. the row budget and time budget they were fitted under).
+    """
+    return json.dumps({"target": target, "backend": backend, "columns": list(map(str, columns)),
+                       "settings": settings or {}}, sort_keys=True, default=str)
+
+
+def _connect():
+    # SQLite serializes concurrent updates from job-queue and batch worker processes
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    conn = sqlite3.connect(INDEX_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS models ("
+        " fingerprint TEXT PRIMARY KEY, path TEXT, config_key TEXT, rows INTEGER, target TEXT,"
+        " backend TEXT, created REAL, last_used REAL)"
+    )
+    return conn
+
+
+def _load_payload(fingerprint, path):
+    import joblib
+
+    try:
+        payload = joblib.load(path)
+    except Exception as e:
+        print(f"⚠️ Could not load registered model {fingerprint[:12]}: {e}")
+        return None
+    with closing(_connect()) as conn, conn:
+        conn.execute("UPDATE models SET last_used = ? WHERE fingerprint = ?", (time.time(), fingerprint))
+    return payload
+
+
+def find_model(fingerprint: str):
+    """Return the stored payload (model, schema, metrics, importances) trained on exactly this data, or None."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT path FROM models WHERE fingerprint = ?", (fingerprint,)).fetchone()
+    if row is None or not os.path.exists(row[0]):
+        return None
+    return _load_payload(fingerprint, row[0])
+
+
+def find_base_model(hashes, key: str):
+    """
+    Look for a model trained on a prefix of these rows (same config), i.e. the dataset
+    has only had rows appended since. Returns (payload, n_base_rows) or (None, 0).
+    """
+    with closing(_connect()) as conn:
+        candidates = conn.execute(
+            "SELECT fingerprint, path, rows FROM models WHERE config_key = ? AND rows < ? ORDER BY rows DESC LIMIT ?",
+            (key, len(hashes), MAX_APPEND_CANDIDATES),
+        ).fetchall()
+
+    for fp, path, rows in candidates:
+        if os.path.exists(path) and data_fingerprint(hashes[:rows], key) == fp:
+            payload = _load_payload(fp, path)
+            if payload is not None:
+                return payload, rows
+    return None, 0
+
+
+def register_model(fingerprint: str, key: str, rows: int, model, schema, metrics, importances, holdout=None):
+    """
+    Serialize a fitted model with its feature schema and metrics under the data fingerprint.
+    `holdout` (sorted row hashes of the rows it was scored on) keeps those rows out of training
+    when the model is later continued on appended data.
+    """
+    import joblib
+
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    path = os.path.join(REGISTRY_DIR, f"{fingerprint}.joblib")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    joblib.dump({"model": model, "schema": schema, "metrics": metrics, "importances": importances,
+                 "holdout": holdout}, tmp_path)
+    os.replace(tmp_path, path)
+
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (fingerprint, path, key, rows, metrics.get("Target"), metrics.get("Backend"), now, now),
+        )
+        # Evict least recently used models
+        evicted = conn.execute(
+            "SELECT fingerprint, path FROM models ORDER BY last_used DESC LIMIT -1 OFFSET ?", (MAX_MODELS,)
+        ).fetchall()
+        conn.executemany("DELETE FROM models WHERE fingerprint = ?", [(fp,) for fp, _ in evicted])
+    for _, evicted_path in evicted:
+        if os.path.exists(evicted_path):
+            os.remove(evicted_path)
+
+    print(f"🗃️ Model registered as {fingerprint[:12]} ({rows} rows)")
+    return path
@@ -1,23 +1,263 @@
+import re
+import time
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder
-import matplotlib.pyplot as plt
 import os
 import json
+from Src_code.run_context import DEFAULT_CONTEXT
+from Src_code import model_registry
+from Src_code.chart_cache import chart_key, column_fingerprint, fetch_chart, store_chart
+from Src_code.instrumentation import timed
 
-def train_model(df):
+# Rows used for fitting; larger inputs are subsampled (stratified on the target) so training time stays flat
+DEFAULT_MAX_TRAIN_ROWS = 200_000
+
+# Categorical columns with more distinct values than this are hashed into a fixed number of buckets
+MAX_ORDINAL_CATEGORIES = 255
+HASH_BUCKETS = 64
+
+# Non-numeric columns where most values are unique (IDs, free text) carry no learnable signal
+MAX_UNIQUE_RATIO = 0.5
+
+# Trees (RandomForest) or boosting iterations (HistGradientBoosting) added per step under a time budget
+BUDGET_STEP = 20
+
+# Trees / boosting iterations added when continuing a registered model on appended data
+WARM_START_STEP = 20
+
+# Share of rows held out for scoring
+TEST_SIZE = 0.2
+
+BACKENDS = ("random_forest", "hist_gradient_boosting", "auto")
+
+# RandomForest is fitted on a sparse (CSR) matrix when the features are at least this wide and
+# at least this share of their values are zero (e.g. one-hot indicator blocks)
+SPARSE_MIN_FEATURES = 30
+SPARSE_MIN_ZERO_SHARE = 0.7
+
+_ID_WORD = re.compile(r"(^|[\s_\-])(id|key)$")
+_ID_SUFFIX = re.compile(r"^[a-z]{3,}(id|key)$")
+
+
+def _is_id_like(name: str):
+    """Row/order/customer/product identifiers: 'row id', 'order_id', 'customerkey', ..."""
+    return bool(_ID_WORD.search(name) or _ID_SUFFIX.match(name))
+
+
+def _stratified_subsample(df, target_col, max_rows, seed=42):
+    """Keep `max_rows` rows, preserving the distribution of the target across its deciles."""
+    from sklearn.model_selection import train_test_split
+
+    bins = pd.qcut(df[target_col].rank(method="first"), q=10, labels=False)
+    sample, _ = train_test_split(df, train_size=max_rows, stratify=bins, random_state=seed)
+    return sample
+
+
+def _fit_encoder(col, series, n_rows):
+    """Decide how a column becomes a numeric feature, from the training data."""
+    if _is_id_like(col):
+        return None
+    if pd.api.types.is_bool_dtype(series):
+        return ("bool",)
+    if pd.api.types.is_numeric_dtype(series):
+        return ("numeric", series.median())
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return ("datetime", series.min())
+
+    n_distinct = series.nunique(dropna=True)
+    if n_distinct / n_rows > MAX_UNIQUE_RATIO:
+        return None
+    if n_distinct <= MAX_ORDINAL_CATEGORIES:
+        return ("ordinal", list(pd.factorize(series)[1]))
+    return ("hashed",)
+
+
+def _apply_encoder(encoder, series):
+    kind = encoder[0]
+    if kind == "bool":
+        return series.astype("int8")
+    if kind == "numeric":
+        return series.fillna(encoder[1]) if series.isna().any() else series
+    if kind == "datetime":
+        # Days since the earliest training date, so trees can split on time
+        return (series - encoder[1]).dt.days.fillna(-1).astype("int32")
+    if kind == "ordinal":
+        # Codes follow the stored category order; unseen values become -1 (missing)
+        codes = pd.Categorical(series, categories=encoder[1]).codes
+        return pd.Series(codes.astype("int16"), index=series.index)
+    hashed = pd.util.hash_array(series.astype(str).to_numpy()) % HASH_BUCKETS
+    return pd.Series(hashed.astype("int16"), index=series.index)
+
+
+def _prepare_features(df, target_col, schema=None):
+    """
+    Turn every usable column into a numeric feature.
+    ID-like and mostly-unique columns are dropped; low-cardinality categoricals become
+    per-column ordinal codes and high-cardinality ones are hash-encoded into buckets.
+    Returns the feature frame and its schema (per-column encoders, dropped columns);
+    pass a stored `schema` to encode new data exactly like the data a model was trained on.
+    """
+    if schema is None:
+        n_rows = max(len(df), 1)
+        encoders = {}
+        dropped = []
+        for col in df.columns:
+            if col == target_col:
+                continue
+            encoder = _fit_encoder(col, df[col], n_rows)
+            if encoder is None:
+                dropped.append(col)
+            else:
+                encoders[col] = encoder
+        schema = {"target": target_col, "encoders": encoders, "dropped": dropped}
+
+    features = {col: _apply_encoder(encoder, df[col]) for col, encoder in schema["encoders"].items()}
+    return pd.DataFrame(features, index=df.index), schema
+
+
+def _ordinal_columns(schema):
+    return [col for col, encoder in schema["encoders"].items() if encoder[0] == "ordinal"]
+
+
+def _model_input(X, backend):
+    """
+    The feature matrix to fit on: a float32 CSR matrix for wide, mostly-zero features when the
+    backend accepts sparse input (RandomForest), otherwise the frame itself.
+    The matrix is built column by column from the non-zero entries, never from a dense copy.
+    """
+    if backend != "random_forest" or X.shape[1] < SPARSE_MIN_FEATURES or X.empty:
+        return X
+    rows = [np.flatnonzero(X[col].to_numpy()) for col in X.columns]
+    nnz = sum(len(r) for r in rows)
+    if nnz > (1 - SPARSE_MIN_ZERO_SHARE) * X.size:
+        return X
+    from scipy import sparse
+    print(f"🕸️ Fitting on a sparse matrix ({X.shape[1]} mostly-zero features).")
+    data = np.concatenate([X[col].to_numpy()[r].astype("float32") for col, r in zip(X.columns, rows)])
+    cols = np.repeat(np.arange(X.shape[1]), [len(r) for r in rows])
+    return sparse.csr_matrix((data, (np.concatenate(rows), cols)), shape=X.shape)
+
+
+def _build_model(backend, X, ordinal_cols, n_jobs):
+    # scikit-learn is imported when a model is actually fitted, not when the pipeline is loaded
+    from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+
+    if backend == "hist_gradient_boosting":
+        categorical = [c in ordinal_cols for c in X.columns]
+        return HistGradientBoostingRegressor(
+            random_state=42, categorical_features=categorical if any(categorical) else None
+        ), "max_iter"
+    return RandomForestRegressor(random_state=42, n_jobs=n_jobs), "n_estimators"
+
+
+def _fit_with_budget(model, size_param, X_train, y_train, time_budget):
+    """
+    Fit the model, growing it in steps (warm start) until its default size
+    or the time budget is reached, whichever comes first.
+    """
+    if not time_budget:
+        model.fit(X_train, y_train)
+        return model
+
+    target_size = getattr(model, size_param)
+    size = min(BUDGET_STEP, target_size)
+    model.set_params(warm_start=True, **{size_param: size})
+    if size_param == "max_iter":
+        model.set_params(early_stopping=False)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    while size < target_size:
+        elapsed = time.perf_counter() - start
+        # Stop if another step of the same average cost would overrun the budget
+        if elapsed + elapsed / size * BUDGET_STEP > time_budget:
+            print(f"⏱️ Time budget of {time_budget}s reached after {size} {size_param}.")
+            break
+        size = min(size + BUDGET_STEP, target_size)
+        model.set_params(**{size_param: size})
+        model.fit(X_train, y_train)
+    return model
+
+
+def _split_rows(positions, hashes, base=None, base_rows=0, seed=42):
+    """
+    Train and test row indices over the rows at `positions` (positions into `hashes`, the row hashes).
+    When continuing a registered model, its held-out rows stay held out and only the appended rows
+    are split, so the score never counts rows the existing trees were fitted on.
+    """
+    if base is None:
+        from sklearn.model_selection import train_test_split
+
+        return train_test_split(np.arange(len(positions)), test_size=TEST_SIZE, random_state=seed)
+    appended = positions >= base_rows
+    test = np.isin(hashes[positions], base["holdout"])
+    test |= appended & (np.random.default_rng(seed).random(len(positions)) < TEST_SIZE)
+    return np.flatnonzero(~test), np.flatnonzero(test)
+
+
+def _take_rows(data, rows):
+    return data.iloc[rows] if isinstance(data, (pd.DataFrame, pd.Series)) else data[rows]
+
+
+def _grow_model(model, n_jobs):
+    """Continue a registered model: warm start adds WARM_START_STEP trees / boosting iterations."""
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    if isinstance(model, HistGradientBoostingRegressor):
+        model.set_params(warm_start=True, early_stopping=False, max_iter=model.n_iter_ + WARM_START_STEP)
+        return model, "max_iter"
+    model.set_params(warm_start=True, n_jobs=n_jobs, n_estimators=len(model.estimators_) + WARM_START_STEP)
+    return model, "n_estimators"
+
+
+def _save_artifacts(importances, target_col, metrics, ctx):
+    # Save visualization (standalone Figure, no pyplot state, so it is safe while other stages plot)
+    os.makedirs(ctx.vis_dir, exist_ok=True)
+    top = importances.head(10)
+    chart_path = ctx.vis_path("feature_importance.png")
+    key = chart_key({"type": "feature_importance", "target": target_col},
+                    [column_fingerprint(top.rename("importance").reset_index(drop=True)),
+                     column_fingerprint(pd.Series(top.index.astype(str), name="feature"))])
+    if not fetch_chart(key, chart_path):
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(8, 5))
+        ax = fig.subplots()
+        top.plot(kind='bar', color='skyblue', edgecolor='black', ax=ax)
+        ax.set_title(f"Top Factors Influencing {target_col.capitalize()}")
+        ax.set_ylabel("Feature Importance")
+        fig.tight_layout()
+        fig.savefig(chart_path)
+        store_chart(key, chart_path)
+
+    # Save to JSON for dashboard or AI use
+    with open(ctx.results_path("model_metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=4)
+
+
+def train_model(df, ctx=None, backend="random_forest", max_rows=DEFAULT_MAX_TRAIN_ROWS,
+                time_budget=None, n_jobs=-1, use_registry=True):
     """
     Train a RandomForest model to predict 'Profit' (or closest numeric target)
     and generate a feature importance visualization for business insight.
+    Artifacts are written to the run's results folder (`ctx`, a RunContext).
+
+    `backend` is "random_forest", "hist_gradient_boosting" or "auto" (boosting on inputs
+    larger than `max_rows`). At most `max_rows` rows are used (stratified subsample),
+    fitting uses `n_jobs` cores and, with `time_budget` seconds, stops adding trees early.
+
+    With `use_registry`, fitted models are stored in the model registry under the data's
+    fingerprint: the same data loads its model instead of refitting, and data that only had
+    rows appended continues the registered model (warm start) instead of a full refit.
     """
+    ctx = ctx or DEFAULT_CONTEXT
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown training backend '{backend}'. Choose from {BACKENDS}.")
 
-    df = df.copy()
-    df.columns = df.columns.str.lower()
+    df = df.set_axis(df.columns.str.lower(), axis=1)
 
-    # Separate numeric and categorical columns
+    # Separate numeric columns
     numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    categorical_cols = df.select_dtypes(exclude='number').columns.tolist()
 
     # Identify the target variable
     target_col = None
@@ -30,49 +270,100 @@ def train_model(df):
         print("⚠️ No suitable numeric target found for model training.")
         return None, {}
 
-    # Encode categorical variables
-    le = LabelEncoder()
-    for c in categorical_cols:
-        df[c] = le.fit_transform(df[c].astype(str))
+    df = df[df[target_col].notna()]
+    # Row labels are positions, so sampled rows can be matched with their row hashes
+    df.index = pd.RangeIndex(len(df))
+    total_rows = len(df)
+    if backend == "auto":
+        backend = "hist_gradient_boosting" if total_rows > max_rows else "random_forest"
+
+    # Same data (and configuration) as a registered model: reuse it as is
+    base, base_rows = None, 0
+    if use_registry:
+        key = model_registry.config_key(target_col, backend, df.columns,
+                                        {"max_rows": max_rows, "time_budget": time_budget})
+        hashes = model_registry.row_hashes(df)
+        fingerprint = model_registry.data_fingerprint(hashes, key)
+        registered = model_registry.find_model(fingerprint)
+        if registered is not None:
+            metrics = dict(registered["metrics"], **{"Training Mode": "registry"})
+            _save_artifacts(registered["importances"], target_col, metrics, ctx)
+            print(f"⚡ Loaded registered model {fingerprint[:12]} for '{target_col}'. "
+                  f"R² Score: {metrics['R²']:.3f}")
+            return registered["model"], metrics
+        base, base_rows = model_registry.find_base_model(hashes, key)
+        if base is not None and base.get("holdout") is None:
+            # Registered before held-out rows were recorded: its test rows are unknown, so refit
+            print("ℹ️ The registered model for the earlier rows has no recorded holdout; refitting in full.")
+            base, base_rows = None, 0
+
+    if max_rows and total_rows > max_rows:
+        df = _stratified_subsample(df, target_col, max_rows)
+        print(f"✂️ Training on a stratified sample of {len(df)} of {total_rows} rows.")
 
-    # Prepare features and target
-    X = df.drop(columns=[target_col])
+    # Prepare features and target (encoded like the registered model's data when continuing it)
+    X, schema = _prepare_features(df, target_col, base["schema"] if base else None)
     y = df[target_col]
+    if schema["dropped"]:
+        print(f"🪪 Dropped ID-like / mostly-unique columns: {schema['dropped']}")
 
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Split data (appended rows only, when continuing a registered model)
+    positions = X.index.to_numpy()
+    train_idx, test_idx = _split_rows(positions, hashes if use_registry else None, base, base_rows)
+    if base and len(test_idx) < 2:
+        print("ℹ️ Too few unseen rows to score a continued model; refitting in full.")
+        base, base_rows = None, 0
+        X, schema = _prepare_features(df, target_col)
+        train_idx, test_idx = _split_rows(positions, hashes)
+    inputs = _model_input(X, backend)
+    X_train, X_test = _take_rows(inputs, train_idx), _take_rows(inputs, test_idx)
+    y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
 
     # Train the model
-    model = RandomForestRegressor(random_state=42)
-    model.fit(X_train, y_train)
+    start = time.perf_counter()
+    with timed("Fit model", rows=X_train.shape[0], backend=backend, mode="warm start" if base else "full"):
+        if base:
+            model, size_param = _grow_model(base["model"], n_jobs)
+            model.fit(X_train, y_train)
+            print(f"🌱 Data grew from {base_rows} to {total_rows} rows; "
+                  f"continued the registered model to {getattr(model, size_param)} {size_param}.")
+        else:
+            model, size_param = _build_model(backend, X, _ordinal_columns(schema), n_jobs)
+            _fit_with_budget(model, size_param, X_train, y_train, time_budget)
+    fit_seconds = time.perf_counter() - start
     score = model.score(X_test, y_test)
 
-    # Compute feature importances
-    importances = pd.Series(model.feature_importances_, index=X.columns).sort_values(ascending=False)
-
-    # Save visualization
-    os.makedirs("Results/visualization", exist_ok=True)
-    plt.figure(figsize=(8, 5))
-    importances.head(10).plot(kind='bar', color='skyblue', edgecolor='black')
-    plt.title(f"Top Factors Influencing {target_col.capitalize()}")
-    plt.ylabel("Feature Importance")
-    plt.tight_layout()
-    plt.savefig("Results/visualization/feature_importance.png")
-    plt.close()
+    # Compute feature importances (impurity-based for forests, permutation on a test sample for boosting)
+    if hasattr(model, "feature_importances_"):
+        importances = pd.Series(model.feature_importances_, index=X.columns)
+    else:
+        from sklearn.inspection import permutation_importance
+        sample = X_test.iloc[:5000]
+        result = permutation_importance(model, sample, y_test.loc[sample.index], n_repeats=3,
+                                        random_state=42, n_jobs=n_jobs)
+        importances = pd.Series(result.importances_mean, index=X.columns).clip(lower=0)
+    importances = importances.sort_values(ascending=False)
 
     # Save numeric summary
     top_features = importances.head(10).to_dict()
     metrics = {
         "Target": target_col,
         "R²": round(score, 3),
-        "Top Features": top_features
+        "Top Features": top_features,
+        "Backend": backend,
+        "Training Rows": X_train.shape[0],
+        "Fit Seconds": round(fit_seconds, 2),
+        "Training Mode": "warm start" if base else "full",
     }
+    if use_registry:
+        metrics["Model Id"] = fingerprint[:12]
+    _save_artifacts(importances, target_col, metrics, ctx)
 
-    # Save to JSON for dashboard or AI use
-    with open("Results/model_metrics.json", "w", encoding="utf-8") as f:
-        json.dump(metrics, f, indent=4)
+    if use_registry:
+        model_registry.register_model(fingerprint, key, total_rows, model, schema, metrics, importances,
+                                      holdout=np.sort(hashes[positions[test_idx]]))
 
     print(f"✅ Model trained to predict '{target_col}'. R² Score: {score:.3f}")
-    print("📊 Feature importance chart and metrics saved to Results/visualization and Results/model_metrics.json")
+    print(f"📊 Feature importance chart and metrics saved to {ctx.vis_dir} and {ctx.results_path('model_metrics.json')}")
 
     return model, metrics
@@ -0,0 +1,101 @@
+import os
+import threading
+
+from Src_code.dataset_cache import CACHE_DIR
+
+# Rendered ydata-profiling reports, keyed by dataset fingerprint, tier and sample size
+PROFILE_CACHE_DIR = os.path.join(CACHE_DIR, "profiles")
+
+# Rows profiled by default; larger datasets are sampled (0 or None profiles every row)
+DEFAULT_SAMPLE_ROWS = 50_000
+
+# "minimal" skips correlations, interactions and duplicates; "standard" is ydata's default; "explorative" adds text analysis
+TIERS = ("minimal", "standard", "explorative")
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def report_path(fingerprint: str, tier: str = "minimal", sample_rows: int = DEFAULT_SAMPLE_ROWS):
+    return os.path.join(PROFILE_CACHE_DIR, f"{fingerprint}.{tier}.{sample_rows or 'all'}.html")
+
+
+def build_profile_report(df, fingerprint: str, tier: str = "minimal", sample_rows: int = DEFAULT_SAMPLE_ROWS,
+                         progress=None):
+    """
+    Render a ydata-profiling report of `df` (sampled to `sample_rows` rows) and return its HTML path.
+    Reports are cached by dataset fingerprint, tier and sample size, so repeats are instant.
+    `progress(fraction, message)` is called as the report moves through its stages.
+    """
+    if tier not in TIERS:
+        raise ValueError(f"Unknown profiling tier '{tier}'. Choose from {TIERS}.")
+    progress = progress or (lambda fraction, message: None)
+
+    path = report_path(fingerprint, tier, sample_rows)
+    if os.path.exists(path):
+        progress(1.0, "Loaded cached report")
+        return path
+
+    from ydata_profiling import ProfileReport
+
+    progress(0.05, "Sampling rows")
+    sampled = sample_rows and len(df) > sample_rows
+    data = df.sample(n=sample_rows, random_state=0) if sampled else df
+    title = "Business Data Profiling Report"
+    if sampled:
+        title += f" (sample of {sample_rows:,} of {len(df):,} rows)"
+
+    profile = ProfileReport(data, title=title, progress_bar=False,
+                            minimal=tier == "minimal", explorative=tier == "explorative")
+
+    progress(0.1, "Computing statistics")
+    profile.get_description()
+    progress(0.7, "Rendering report")
+    html = profile.to_html()
+
+    progress(0.95, "Saving report")
+    os.makedirs(PROFILE_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp_path, path)
+    progress(1.0, "Done")
+    return path
+
+
+class ProfileJob:
+    """A profiling report built on a background thread; poll `progress`, `message`, `done`, `path`, `error`."""
+
+    def __init__(self, df, fingerprint, tier, sample_rows):
+        self.progress = 0.0
+        self.message = "Queued"
+        self.path = None
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(df, fingerprint, tier, sample_rows), name="profile-report", daemon=True
+        )
+        self._thread.start()
+
+    def _update(self, fraction, message):
+        self.progress, self.message = fraction, message
+
+    def _run(self, df, fingerprint, tier, sample_rows):
+        try:
+            self.path = build_profile_report(df, fingerprint, tier, sample_rows, progress=self._update)
+        except Exception as e:
+            self.error = e
+            self.message = f"Failed: {e}"
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+
+def start_profile_report(df, fingerprint: str, tier: str = "minimal", sample_rows: int = DEFAULT_SAMPLE_ROWS):
+    """Start (or join, if one is already running for the same report) a background profiling job."""
+    key = (fingerprint, tier, sample_rows)
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is None or (job.done and (job.error or not os.path.exists(job.path))):
+            job = _jobs[key] = ProfileJob(df, fingerprint, tier, sample_rows)
+        return job
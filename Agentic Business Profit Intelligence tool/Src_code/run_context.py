@@ -0,0 +1,128 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# Per-run workspaces live here: Runs/<run_id>/{raw,Processed,Results}
+WORKSPACE_ROOT = "Runs"
+
+# Workspaces untouched for this long are removed by the background collector
+DEFAULT_MAX_WORKSPACE_AGE = 6 * 60 * 60
+
+_HEARTBEAT_FILE = ".heartbeat"
+
+_gc_lock = threading.Lock()
+_gc_thread = None
+
+
+class RunContext:
+    """
+    Workspace and artifact paths for one pipeline run.
+    The default context keeps the legacy shared folders (Data/raw, Data/Processed, Results);
+    contexts from `create_run_context` get their own directories so concurrent runs never collide.
+    """
+
+    def __init__(self, run_id=None, raw_dir="Data/raw", processed_dir="Data/Processed",
+                 results_dir="Results", workspace=None):
+        self.run_id = run_id
+        self.raw_dir = raw_dir
+        self.processed_dir = processed_dir
+        self.results_dir = results_dir
+        self.workspace = workspace
+
+    @property
+    def vis_dir(self):
+        return os.path.join(self.results_dir, "visualization")
+
+    def raw_path(self, name: str):
+        return os.path.join(self.raw_dir, name)
+
+    def processed_path(self, name: str):
+        return os.path.join(self.processed_dir, name)
+
+    def results_path(self, name: str):
+        return os.path.join(self.results_dir, name)
+
+    def vis_path(self, name: str):
+        return os.path.join(self.vis_dir, name)
+
+    def prepare(self):
+        """Create the run's directories and refresh its heartbeat."""
+        for folder in (self.raw_dir, self.processed_dir, self.vis_dir):
+            os.makedirs(folder, exist_ok=True)
+        self.touch()
+        return self
+
+    def touch(self):
+        """Mark the workspace as in use so the garbage collector keeps it."""
+        if self.workspace:
+            os.makedirs(self.workspace, exist_ok=True)
+            with open(os.path.join(self.workspace, _HEARTBEAT_FILE), "w") as f:
+                f.write(str(time.time()))
+
+    def __repr__(self):
+        return f"RunContext(run_id={self.run_id!r}, results_dir={self.results_dir!r})"
+
+
+DEFAULT_CONTEXT = RunContext()
+
+
+def create_run_context(run_id: str = None, root: str = WORKSPACE_ROOT):
+    """Create an isolated workspace for one analysis run (e.g. one dashboard session)."""
+    run_id = run_id or uuid.uuid4().hex[:12]
+    workspace = os.path.join(root, run_id)
+    ctx = RunContext(
+        run_id=run_id,
+        raw_dir=os.path.join(workspace, "raw"),
+        processed_dir=os.path.join(workspace, "Processed"),
+        results_dir=os.path.join(workspace, "Results"),
+        workspace=workspace,
+    )
+    return ctx.prepare()
+
+
+def collect_stale_workspaces(max_age: float = DEFAULT_MAX_WORKSPACE_AGE, root: str = WORKSPACE_ROOT):
+    """Delete run workspaces whose heartbeat is older than `max_age` seconds. Returns the removed run ids."""
+    if not os.path.isdir(root):
+        return []
+
+    removed = []
+    now = time.time()
+    for run_id in os.listdir(root):
+        workspace = os.path.join(root, run_id)
+        if not os.path.isdir(workspace):
+            continue
+        heartbeat = os.path.join(workspace, _HEARTBEAT_FILE)
+        try:
+            last_seen = os.path.getmtime(heartbeat if os.path.exists(heartbeat) else workspace)
+        except OSError:
+            continue
+        if now - last_seen > max_age:
+            shutil.rmtree(workspace, ignore_errors=True)
+            removed.append(run_id)
+
+    if removed:
+        print(f"🧹 Removed {len(removed)} stale run workspace(s).")
+    return removed
+
+
+def start_workspace_gc(interval: float = 10 * 60, max_age: float = DEFAULT_MAX_WORKSPACE_AGE,
+                       root: str = WORKSPACE_ROOT):
+    """Start (once per process) a daemon thread that periodically removes stale workspaces."""
+    global _gc_thread
+    with _gc_lock:
+        if _gc_thread is not None and _gc_thread.is_alive():
+            return _gc_thread
+
+        def _loop():
+            while True:
+                try:
+                    collect_stale_workspaces(max_age, root)
+                except Exception as e:
+                    print(f"⚠️ Workspace cleanup failed: {e}")
+                time.sleep(interval)
+
+        _gc_thread = threading.Thread(target=_loop, name="workspace-gc", daemon=True)
+        _gc_thread.start()
+        return _gc_thread
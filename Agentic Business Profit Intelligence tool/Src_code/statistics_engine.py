@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+
+from Src_code.column_names import is_ratio
+
+# Values kept per numeric column for quantile estimates (a uniform sample once the data is larger)
+QUANTILE_SAMPLE_SIZE = 20_000
+
+# Category counts kept per column before merging; final summaries report the top-k of these
+CATEGORY_COUNT_CAP = 200
+
+# Categorical columns with at most this many distinct values are used as group-by dimensions
+MAX_GROUP_CARDINALITY = 50
+
+_MEASURE_NAMES = ("profit", "sales", "revenue")
+
+
+def _measure_columns(numeric_cols):
+    """
+    Profit/sales-like numeric columns that group-by totals are computed for. Ratios such as
+    "profit_margin" or "sales_pct" are left out: summing them per group is meaningless.
+    """
+    return [c for c in numeric_cols
+            if any(name in str(c).lower() for name in _MEASURE_NAMES) and not is_ratio(c)]
+
+
+def _sample(values, size, rng):
+    if len(values) <= size:
+        return values
+    return rng.choice(values, size=size, replace=False)
+
+
+def compute_profile(df, seed: int = 0):
+    """
+    Profile a DataFrame (or one chunk of it) in a single vectorized pass.
+    The result is mergeable with `merge_profiles`, so large files can be profiled chunk by chunk.
+    """
+    rng = np.random.default_rng(seed)
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    datetime_cols = df.select_dtypes(include="datetime").columns.tolist()
+    other_cols = [c for c in df.columns if c not in numeric_cols and c not in datetime_cols]
+
+    profile = {"rows": len(df), "numeric": {}, "datetime": {}, "categorical": {}, "groups": {}}
+
+    # Moments for every numeric column at once on a 2-D float array
+    if numeric_cols:
+        values = df[numeric_cols].to_numpy(dtype="float64", na_value=np.nan)
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sums = np.nansum(values, axis=0)
+            means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+            m2 = np.nansum((values - means) ** 2, axis=0)
+        has_values = counts > 0
+        mins = np.full(len(numeric_cols), np.nan)
+        maxs = np.full(len(numeric_cols), np.nan)
+        if has_values.any():
+            mins[has_values] = np.nanmin(values[:, has_values], axis=0)
+            maxs[has_values] = np.nanmax(values[:, has_values], axis=0)
+
+        for i, col in enumerate(numeric_cols):
+            profile["numeric"][col] = {
+                "count": int(counts[i]),
+                "nulls": int(len(df) - counts[i]),
+                "mean": float(means[i]),
+                "m2": float(m2[i]),
+                "min": float(mins[i]),
+                "max": float(maxs[i]),
+                "sample": _sample(values[valid[:, i], i], QUANTILE_SAMPLE_SIZE, rng),
+            }
+
+    for col in datetime_cols:
+        series = df[col]
+        profile["datetime"][col] = {
+            "count": int(series.notna().sum()),
+            "nulls": int(series.isna().sum()),
+            "min": series.min(),
+            "max": series.max(),
+        }
+
+    for col in other_cols:
+        series = df[col]
+        value_counts = series.value_counts(dropna=True)
+        profile["categorical"][col] = {
+            "count": int(series.notna().sum()),
+            "nulls": int(series.isna().sum()),
+            "distinct": int(len(value_counts)),
+            "counts": value_counts.head(CATEGORY_COUNT_CAP).to_dict(),
+        }
+
+    # Group-by aggregates of the measures by every low-cardinality dimension
+    measures = _measure_columns(numeric_cols)
+    if measures:
+        for col in other_cols:
+            if profile["categorical"][col]["distinct"] > MAX_GROUP_CARDINALITY:
+                continue
+            grouped = df.groupby(col, observed=True)[measures].agg(["sum", "count"])
+            profile["groups"][col] = {
+                measure: {
+                    "sum": grouped[(measure, "sum")].to_dict(),
+                    "count": grouped[(measure, "count")].to_dict(),
+                }
+                for measure in measures
+            }
+
+    return profile
+
+
+def _add_counts(a, b):
+    merged = dict(a)
+    for key, value in b.items():
+        merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _merge_numeric(a, b, rng):
+    n_a, n_b = a["count"], b["count"]
+    n = n_a + n_b
+    if n_a == 0:
+        return dict(b, nulls=a["nulls"] + b["nulls"])
+    if n_b == 0:
+        return dict(a, nulls=a["nulls"] + b["nulls"])
+
+    # Chan et al. parallel update of mean and sum of squared deviations
+    delta = b["mean"] - a["mean"]
+    mean = a["mean"] + delta * n_b / n
+    m2 = a["m2"] + b["m2"] + delta ** 2 * n_a * n_b / n
+
+    # Keep the merged sample proportional to each side's row count
+    size = min(QUANTILE_SAMPLE_SIZE, len(a["sample"]) + len(b["sample"]))
+    take_a = min(len(a["sample"]), int(round(size * n_a / n)))
+    take_b = min(len(b["sample"]), size - take_a)
+    sample = np.concatenate([_sample(a["sample"], take_a, rng), _sample(b["sample"], take_b, rng)])
+
+    return {
+        "count": n,
+        "nulls": a["nulls"] + b["nulls"],
+        "mean": mean,
+        "m2": m2,
+        "min": float(np.nanmin([a["min"], b["min"]])),
+        "max": float(np.nanmax([a["max"], b["max"]])),
+        "sample": sample,
+    }
+
+
+def _union(a, b):
+    """Keys of both dicts, in first-seen order."""
+    return list(a) + [key for key in b if key not in a]
+
+
+def merge_profiles(a, b, seed: int = 0):
+    """Combine the profiles of two disjoint chunks of the same dataset."""
+    rng = np.random.default_rng(seed)
+    merged = {"rows": a["rows"] + b["rows"], "numeric": {}, "datetime": {}, "categorical": {}, "groups": {}}
+
+    for col in _union(a["numeric"], b["numeric"]):
+        if col in a["numeric"] and col in b["numeric"]:
+            merged["numeric"][col] = _merge_numeric(a["numeric"][col], b["numeric"][col], rng)
+        else:
+            merged["numeric"][col] = a["numeric"].get(col) or b["numeric"][col]
+
+    for col in _union(a["datetime"], b["datetime"]):
+        parts = [p["datetime"][col] for p in (a, b) if col in p["datetime"]]
+        merged["datetime"][col] = {
+            "count": sum(p["count"] for p in parts),
+            "nulls": sum(p["nulls"] for p in parts),
+            "min": min((p["min"] for p in parts if pd.notna(p["min"])), default=pd.NaT),
+            "max": max((p["max"] for p in parts if pd.notna(p["max"])), default=pd.NaT),
+        }
+
+    for col in _union(a["categorical"], b["categorical"]):
+        parts = [p["categorical"][col] for p in (a, b) if col in p["categorical"]]
+        counts = {}
+        for p in parts:
+            counts = _add_counts(counts, p["counts"])
+        top = dict(sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:CATEGORY_COUNT_CAP])
+        merged["categorical"][col] = {
+            "count": sum(p["count"] for p in parts),
+            "nulls": sum(p["nulls"] for p in parts),
+            # Exact when the column fits in the kept counts, otherwise a lower bound
+            "distinct": max(len(counts), max(p["distinct"] for p in parts)),
+            "counts": top,
+        }
+
+    for col in _union(a["groups"], b["groups"]):
+        if col not in a["groups"] or col not in b["groups"]:
+            # One side did not group by this dimension (too many distinct values there): its totals
+            # would only cover part of the rows, so the dimension is dropped unless that side is empty
+            if not a["rows"] or not b["rows"]:
+                merged["groups"][col] = a["groups"].get(col) or b["groups"][col]
+            continue
+        merged["groups"][col] = {
+            measure: {
+                stat: _add_counts(a["groups"][col][measure][stat], b["groups"][col][measure][stat])
+                for stat in ("sum", "count")
+            }
+            for measure in a["groups"][col] if measure in b["groups"][col]
+        }
+
+    return merged
+
+
+def profile_chunks(chunks):
+    """Profile an iterable of DataFrame chunks without concatenating them."""
+    profile = None
+    for i, chunk in enumerate(chunks):
+        part = compute_profile(chunk, seed=i)
+        profile = part if profile is None else merge_profiles(profile, part, seed=i)
+    return profile
+
+
+def _round(value, digits=4):
+    if value is None or (isinstance(value, float) and not np.isfinite(value)):
+        return None
+    return float(f"{value:.{digits}g}")
+
+
+def summarize_profile(profile, top_k: int = 5, max_groups: int = 10, digits: int = 4):
+    """
+    Compact, JSON-serializable summary of a profile for LLM prompts and caching:
+    moments, quantiles and null rates, top-k categories, and measure totals per group.
+    Values are rounded to `digits` significant digits to keep prompts short.
+    """
+    rows = max(profile["rows"], 1)
+    summary = {"rows": profile["rows"], "numeric": {}, "datetime": {}, "categorical": {}, "groups": {}}
+
+    for col, stats in profile["numeric"].items():
+        std = np.sqrt(stats["m2"] / (stats["count"] - 1)) if stats["count"] > 1 else None
+        quantiles = (np.quantile(stats["sample"], [0.25, 0.5, 0.75]) if len(stats["sample"])
+                     else [None, None, None])
+        summary["numeric"][str(col)] = {
+            "mean": _round(stats["mean"], digits),
+            "std": _round(std, digits),
+            "min": _round(stats["min"], digits),
+            "p25": _round(quantiles[0], digits),
+            "median": _round(quantiles[1], digits),
+            "p75": _round(quantiles[2], digits),
+            "max": _round(stats["max"], digits),
+            "null_rate": _round(stats["nulls"] / rows, 3),
+        }
+
+    for col, stats in profile["datetime"].items():
+        summary["datetime"][str(col)] = {
+            "min": str(stats["min"]),
+            "max": str(stats["max"]),
+            "null_rate": _round(stats["nulls"] / rows, 3),
+        }
+
+    for col, stats in profile["categorical"].items():
+        top = sorted(stats["counts"].items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        summary["categorical"][str(col)] = {
+            "distinct": stats["distinct"],
+            "null_rate": _round(stats["nulls"] / rows, 3),
+            "top": {str(value): _round(count / max(stats["count"], 1), 3) for value, count in top},
+        }
+
+    for col, measures in profile["groups"].items():
+        summary["groups"][str(col)] = {}
+        for measure, stats in measures.items():
+            totals = sorted(stats["sum"].items(), key=lambda kv: kv[1], reverse=True)
+            summary["groups"][str(col)][str(measure)] = {
+                str(value): _round(total, digits) for value, total in totals[:max_groups]
+            }
+
+    return summary
@@ -1,25 +1,32 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd
 import os
 import json
-from langchain_openai import ChatOpenAI
-from sklearn.metrics import confusion_matrix
-import numpy as np
+from Src_code.run_context import DEFAULT_CONTEXT
+from Src_code.llm_gateway import complete
+from Src_code.chart_rendering import render_charts
 
-def generate_visuals(df):
+# Model that plans the charts
+PLAN_MODEL = "gpt-4o-mini"
+
+def generate_visuals(df, ctx=None):
     """
     Professional-grade AI-driven visualization generator.
     Automatically suggests and creates diverse, publication-ready charts.
+    Charts are saved to the run's visualization folder (`ctx`, a RunContext).
     """
+    ctx = ctx or DEFAULT_CONTEXT
 
     print("🎨 Generating AI-powered professional visualizations...")
 
     # Ensure output folder
-    os.makedirs("Results/visualization", exist_ok=True)
+    os.makedirs(ctx.vis_dir, exist_ok=True)
 
-    # Clean column names
-    df.columns = df.columns.str.strip().str.replace("\xa0", "", regex=True).str.lower()
+    # Clean column names (on a new frame, so concurrent stages sharing `df` are unaffected);
+    # frames from clean_data carry their schema and are already normalized
+    if "schema" not in df.attrs:
+        normalized = df.columns.str.strip().str.replace("\xa0", "", regex=True).str.lower()
+        if not normalized.equals(df.columns):
+            df = df.set_axis(normalized, axis=1)
 
     # Identify column types
     numeric_cols = df.select_dtypes(include="number").columns.tolist()
@@ -32,7 +39,6 @@ def generate_visuals(df):
     """
 
     # Ask AI for a visualization plan
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.6)
     prompt = f"""
     You are an expert data visualization analyst.
     Given the following dataset schema:
@@ -51,10 +57,10 @@ def generate_visuals(df):
     Only use columns that exist in the dataset.
     """
 
-    response = llm.invoke(prompt)
+    response = complete(prompt, model=PLAN_MODEL, temperature=0.6)
 
     try:
-        vis_plan = json.loads(response.content)
+        vis_plan = json.loads(response)
     except Exception:
         print("⚠️ AI visualization plan invalid. Using fallback visuals.")
         vis_plan = []
@@ -79,85 +85,8 @@ def generate_visuals(df):
         if len(numeric_cols) > 2:
             vis_plan.append({"type": "heatmap", "title": "Correlation Heatmap"})
 
-    # Universal aesthetic improvements
-    sns.set_theme(style="whitegrid", palette="Set2")
-    plt.rcParams.update({
-        "axes.titlesize": 13,
-        "axes.labelsize": 11,
-        "xtick.labelsize": 9,
-        "ytick.labelsize": 9,
-        "figure.figsize": (8, 5)
-    })
-
-    # Generate visuals
-    for i, vis in enumerate(vis_plan, start=1):
-        try:
-            chart_type = vis["type"].lower()
-            title = vis.get("title", f"AI Chart {i}")
-            x = vis.get("x")
-            y = vis.get("y")
-
-            plt.figure()
-
-            # BAR CHART
-            if chart_type == "bar" and x in df.columns and y in df.columns:
-                top_vals = df[x].value_counts().nlargest(10).index
-                sns.barplot(x=x, y=y, data=df[df[x].isin(top_vals)], ci=None)
-                plt.xticks(rotation=45, ha="right")
-
-            # SCATTER
-            elif chart_type == "scatter" and x in df.columns and y in df.columns:
-                sns.scatterplot(x=x, y=y, data=df, alpha=0.7)
-
-            # LINE CHART
-            elif chart_type == "line" and x in df.columns and y in df.columns:
-                sns.lineplot(x=x, y=y, data=df)
-
-            # HISTOGRAM
-            elif chart_type == "hist" and x in df.columns:
-                sns.histplot(df[x], bins=20, kde=True)
-
-            # BOX PLOT
-            elif chart_type == "box" and x in df.columns and y in df.columns:
-                sns.boxplot(x=x, y=y, data=df)
-
-            # HEATMAP
-            elif chart_type == "heatmap":
-                corr = df.select_dtypes(include="number").corr()
-                sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f")
-
-            # PIE CHART
-            elif chart_type == "pie" and x in df.columns:
-                data_counts = df[x].value_counts().nlargest(6)
-                plt.pie(data_counts, labels=data_counts.index, autopct="%1.1f%%", startangle=90)
-                plt.axis("equal")
-
-            # CONFUSION MATRIX (NEW FEATURE)
-            elif chart_type == "confusion_matrix":
-                # Automatically pick two categorical columns if not specified
-                if len(categorical_cols) >= 2:
-                    cat1, cat2 = categorical_cols[:2]
-                    conf_data = pd.crosstab(df[cat1], df[cat2])
-                    sns.heatmap(conf_data, annot=True, cmap="Blues", fmt="d")
-                    plt.title(f"Confusion Matrix: {cat1} vs {cat2}")
-                else:
-                    print("⚠️ Not enough categorical columns for confusion matrix.")
-                    plt.close()
-                    continue
-
-            else:
-                print(f"⚠️ Unsupported or invalid config: {vis}")
-                plt.close()
-                continue
-
-            plt.title(title)
-            plt.tight_layout()
-            plt.savefig(f"Results/visualization/ai_visual_{i}.png", dpi=300)
-            plt.close()
-            print(f"✅ Saved: ai_visual_{i}.png")
-
-        except Exception as e:
-            print(f"❌ Failed to create {vis.get('title', f'Chart {i}')}: {e}")
+    # Render the plan (in parallel worker processes for large frames)
+    render_charts(df, vis_plan, ctx, categorical_cols)
 
     print("✅ All AI-enhanced professional visualizations saved successfully.")
 
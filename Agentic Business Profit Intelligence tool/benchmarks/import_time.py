@@ -0,0 +1,128 @@
+# benchmarks/import_time.py
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# What starting each entry point imports: a module, or a script whose top-level imports are
+# measured without running it (executing dashboard.py outside Streamlit would build a workspace)
+ENTRY_POINTS = {
+    "dashboard": "dashboard.py",
+    "main": "main.py",
+    "pipeline": "pipeline.perfect_flow",
+    "job queue": "pipeline.job_queue",
+    "run report": "pipeline/run_report.py",
+}
+
+# Seconds each entry point may take to import on top of pandas, which every one of them needs
+IMPORT_BUDGETS = {
+    "dashboard": 1.0,
+    "main": 0.5,
+    "pipeline": 0.5,
+    "job queue": 0.2,
+    "run report": 0.2,
+}
+
+# Heavy dependencies only the features that use them may import (training, charts, LLM calls,
+# profiling reports, PDF export, Prefect flow runs)
+DEFERRED_MODULES = ("prefect", "sklearn", "matplotlib", "seaborn", "scipy", "langchain_openai",
+                    "ydata_profiling", "fpdf", "joblib")
+
+_MEASURE = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))
+"""
+
+
+def script_imports(path: str):
+    """Modules a script imports at top level (imports inside functions are not counted)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def entry_modules(target: str):
+    if target.endswith(".py"):
+        return script_imports(os.path.join(ROOT, target))
+    return [target]
+
+
+def measure_import(modules, repeat: int = 3):
+    """Import `modules` in fresh interpreters; returns the fastest time and the modules then loaded."""
+    best = None
+    for _ in range(repeat):
+        code = _MEASURE.format(root=ROOT, modules=list(modules))
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"Importing {modules} failed:\n{out.stderr[-2000:]}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def check_imports(entries=None, repeat: int = 3, scale: float = 1.0):
+    """
+    Time each entry point's imports against its budget and list deferred modules it loads.
+    Returns one result dict per entry point.
+    """
+    floor = measure_import(["pandas"], repeat)["seconds"]
+    print(f"🐼 pandas alone: {floor:.3f}s")
+
+    results = []
+    for name in entries or ENTRY_POINTS:
+        measured = measure_import(entry_modules(ENTRY_POINTS[name]), repeat)
+        loaded = sorted(m for m in DEFERRED_MODULES if m in measured["modules"])
+        budget = floor + IMPORT_BUDGETS[name] * scale
+        ok = measured["seconds"] <= budget and not loaded
+        results.append({"entry": name, "seconds": round(measured["seconds"], 3), "budget": round(budget, 3),
+                        "deferred_loaded": loaded, "ok": ok})
+        status = "✅" if ok else "❌"
+        extra = f"  loads {', '.join(loaded)}" if loaded else ""
+        print(f"{status} {name:<12} {measured['seconds']:.3f}s (budget {budget:.3f}s){extra}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that entry points import fast and defer heavy dependencies.")
+    parser.add_argument("--entries", default=",".join(ENTRY_POINTS),
+                        help=f"Comma-separated subset of: {', '.join(ENTRY_POINTS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per entry point; the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the budgets (slow machines, CI)")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    entries = [e.strip() for e in args.entries.split(",") if e.strip()]
+    unknown = [e for e in entries if e not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"Unknown entry points: {unknown}")
+
+    results = check_imports(entries, args.repeat, args.scale)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    failed = [r["entry"] for r in results if not r["ok"]]
+    if failed:
+        print(f"❌ Import-time regression in: {', '.join(failed)}")
+        return 1
+    print("✅ All entry points within their import budgets.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+# benchmarks/run_benchmarks.py
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from benchmarks.synthetic_data import generate_dataset
+
+STAGES = ("load", "clean", "train", "visuals", "insights", "pipeline")
+DEFAULT_SIZES = ("10k", "100k", "1m")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# A stage counts as a regression when its wall time grows by more than this fraction over the baseline
+DEFAULT_TOLERANCE = 0.15
+
+# ...and by at least this many seconds, so timer noise on very short stages is not flagged
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def parse_size(text: str):
+    """'10k' -> 10_000, '1m' -> 1_000_000, '2500' -> 2500."""
+    text = text.strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+# ============================
+# Measurement (runs in a fresh subprocess per stage and size)
+# ============================
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux), so the peak covers only the timed stage."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    peak_kb = _status_kb("VmHWM")
+    if peak_kb is None:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_kb = peak / 1024 if sys.platform == "darwin" else peak
+    return peak_kb / 1024
+
+
+def _measure(stage, data_path, rows):
+    """Prepare the stage's inputs (untimed), then time the stage and record its peak memory."""
+    from pipeline.perfect_flow import TRAINING_CONFIG, run_business_pipeline
+    from Src_code.agentic_ai import generate_ai_insights
+    from Src_code.data_cleaning import clean_data
+    from Src_code.data_ingestion import load_data
+    from Src_code.model_training import train_model
+    from Src_code.run_context import create_run_context
+    from Src_code.visualization import generate_visuals
+
+    ctx = create_run_context("bench")
+    ctx.prepare()
+    df = load_data(data_path) if stage != "load" and stage != "pipeline" else None
+    if stage not in ("load", "clean", "pipeline"):
+        df = clean_data(df, ctx=ctx)
+
+    stages = {
+        "load": lambda: load_data(data_path),
+        "clean": lambda: clean_data(df, ctx=ctx),
+        "train": lambda: train_model(df, ctx, **TRAINING_CONFIG),
+        "visuals": lambda: generate_visuals(df, ctx),
+        "insights": lambda: generate_ai_insights(df, ctx),
+        "pipeline": lambda: run_business_pipeline(data_path, ctx=ctx),
+    }
+
+    gc.collect()
+    stage_scoped = _reset_peak_rss()
+    start_rss_kb = _status_kb("VmRSS")
+    start = time.perf_counter()
+    stages[stage]()
+    wall = time.perf_counter() - start
+    return {
+        "wall_seconds": round(wall, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "start_rss_mb": round(start_rss_kb / 1024, 1) if start_rss_kb is not None else None,
+        "rows_per_second": round(rows / wall, 1) if wall > 0 else None,
+        "peak_rss_scope": "stage" if stage_scoped else "process",
+    }
+
+
+def _run_child(args):
+    result = _measure(args.stage, args.data, args.rows)
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def measure_stage(stage, data_path, rows, llm_latency=0.0, verbose=False):
+    """
+    Benchmark one stage in a separate interpreter and an empty scratch working directory, so every
+    measurement starts cold (no dataset, task, chart, model or LLM cache) and memory is not shared.
+    LLM calls go to the local stub backend with `llm_latency` seconds of simulated latency.
+    """
+    workdir = tempfile.mkdtemp(prefix="abpi-bench-")
+    result_path = os.path.join(workdir, "result.json")
+    env = dict(os.environ, ABPI_LLM_BACKEND="stub", ABPI_LLM_STUB_LATENCY=str(llm_latency),
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--stage", stage, "--data", data_path,
+             "--rows", str(rows), "--result", result_path],
+            cwd=workdir, env=env, capture_output=not verbose, text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"{stage} benchmark failed:\n{(completed.stderr or '')[-2000:]}")
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ============================
+# Suite, results and baseline comparison
+# ============================
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(templates=("Superstore",), sizes=DEFAULT_SIZES, stages=STAGES, repeat=1, llm_latency=0.0,
+              seed=0, verbose=False):
+    """Benchmark every stage on synthetic data of every size. Returns the results document."""
+    results = []
+    for template in templates:
+        for size in sizes:
+            rows = parse_size(size) if isinstance(size, str) else size
+            data_path = generate_dataset(template, rows, seed)
+            for stage in stages:
+                runs = [measure_stage(stage, data_path, rows, llm_latency, verbose) for _ in range(repeat)]
+                wall = statistics.median(run["wall_seconds"] for run in runs)
+                result = {
+                    "template": template,
+                    "stage": stage,
+                    "rows": rows,
+                    "repeat": repeat,
+                    "wall_seconds": round(wall, 4),
+                    "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+                    "start_rss_mb": runs[0]["start_rss_mb"],
+                    "rows_per_second": round(rows / wall, 1) if wall > 0 else None,
+                    "peak_rss_scope": runs[0]["peak_rss_scope"],
+                }
+                results.append(result)
+                print(f"⏱️ {template} {stage:<9} {rows:>10,} rows: {wall:8.2f}s, "
+                      f"peak {result['peak_rss_mb']:8.1f} MB, {result['rows_per_second'] or 0:12,.0f} rows/s")
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "llm_latency": llm_latency,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def write_results(document, path=RESULTS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"✅ Benchmark results saved to {path}")
+
+
+def compare(document, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results with a baseline document, matching on template, stage and rows.
+    Returns the comparison rows; a stage whose wall time grew by more than `tolerance` is a regression.
+    """
+    reference = {(r["template"], r["stage"], r["rows"]): r for r in baseline["results"]}
+    rows = []
+    for result in document["results"]:
+        base = reference.get((result["template"], result["stage"], result["rows"]))
+        if base is None:
+            continue
+        ratio = result["wall_seconds"] / base["wall_seconds"] if base["wall_seconds"] else float("inf")
+        rows.append({
+            "template": result["template"],
+            "stage": result["stage"],
+            "rows": result["rows"],
+            "baseline_seconds": base["wall_seconds"],
+            "wall_seconds": result["wall_seconds"],
+            "time_ratio": round(ratio, 3),
+            "rss_ratio": round(result["peak_rss_mb"] / base["peak_rss_mb"], 3) if base["peak_rss_mb"] else None,
+            "regression": (ratio > 1 + tolerance
+                           and result["wall_seconds"] - base["wall_seconds"] > MIN_REGRESSION_SECONDS),
+        })
+    return rows
+
+
+def print_comparison(rows, tolerance=DEFAULT_TOLERANCE):
+    for row in rows:
+        if row["regression"]:
+            mark = "🐢 slower"
+        elif row["time_ratio"] < 1 - tolerance:
+            mark = "🚀 faster"
+        else:
+            mark = "✅ same"
+        print(f"{mark:<9} {row['template']} {row['stage']:<9} {row['rows']:>10,} rows: "
+              f"{row['baseline_seconds']:.2f}s -> {row['wall_seconds']:.2f}s (x{row['time_ratio']:.2f}, "
+              f"memory x{row['rss_ratio'] or 0:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("--templates", default="Superstore",
+                        help="Comma-separated Data/raw files (by stem) the synthetic data is shaped like")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help="Comma-separated row counts, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per measurement; the median wall time is kept")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds of simulated latency per stub LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=RESULTS_PATH, help="Where to write the results JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline results JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative wall-time increase before a stage counts as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own output")
+    # Internal: a single measurement, run by measure_stage in a subprocess
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--stage", help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _run_child(args)
+        return 0
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = sorted(set(stages) - set(STAGES))
+    if unknown:
+        parser.error(f"Unknown stages {unknown}. Choose from {', '.join(STAGES)}.")
+
+    document = run_suite(
+        templates=[t.strip() for t in args.templates.split(",") if t.strip()],
+        sizes=[s for s in args.sizes.split(",") if s.strip()],
+        stages=stages, repeat=args.repeat, llm_latency=args.llm_latency, seed=args.seed, verbose=args.verbose,
+    )
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison = compare(document, json.load(f), args.tolerance)
+        document["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "stages": comparison}
+        print_comparison(comparison, args.tolerance)
+        regressions = [row for row in comparison if row["regression"]]
+
+    write_results(document, args.output)
+    if args.save_baseline:
+        write_results(document, args.baseline)
+
+    if regressions:
+        print(f"❌ {len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# benchmarks/synthetic_data.py
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Src_code.data_ingestion import load_data
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Data", "raw"))
+
+# Generated files are kept here and reused for the same template, size and seed
+SYNTHETIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Rows generated and written per step, so 10M-row files never sit in memory at once
+WRITE_CHUNK_ROWS = 500_000
+
+# Columns with at least this share of distinct values are treated as identifiers and regenerated
+ID_UNIQUE_RATIO = 0.9
+
+# Relative noise added to float columns, so bootstrapped rows are not exact duplicates
+FLOAT_JITTER = 0.01
+
+
+def template_path(name: str):
+    """Path of a bundled Data/raw file, by file name or stem (e.g. "Superstore")."""
+    for entry in sorted(os.listdir(TEMPLATE_DIR)):
+        if entry == name or os.path.splitext(entry)[0] == name:
+            return os.path.join(TEMPLATE_DIR, entry)
+    raise ValueError(f"Unknown template '{name}'. Available: {sorted(os.listdir(TEMPLATE_DIR))}")
+
+
+def _id_columns(template):
+    return [c for c in template.columns if template[c].nunique(dropna=True) >= ID_UNIQUE_RATIO * len(template)]
+
+
+def _synthesize_chunk(template, id_cols, start, rows, rng):
+    """Bootstrap whole template rows (keeping cross-column relationships), then make each row unique."""
+    chunk = template.iloc[rng.integers(0, len(template), size=rows)].reset_index(drop=True)
+    row_ids = np.arange(start + 1, start + rows + 1)
+    for col in id_cols:
+        if pd.api.types.is_numeric_dtype(template[col].dtype):
+            chunk[col] = row_ids
+        else:
+            chunk[col] = pd.Series(row_ids).map(f"{col[:3].upper()}-{{:09d}}".format)
+    for col in chunk.select_dtypes(include="float").columns:
+        chunk[col] = (chunk[col] * rng.normal(1.0, FLOAT_JITTER, size=rows)).round(4)
+    return chunk
+
+
+def generate_dataset(template: str = "Superstore", rows: int = 10_000, seed: int = 0, out_dir: str = SYNTHETIC_DIR):
+    """
+    Write a CSV of `rows` rows shaped like a bundled dataset and return its path.
+    Rows are sampled from the template with replacement; identifier columns are regenerated
+    and float columns jittered, so the file has the template's columns, types and value mix
+    but (almost) no duplicate rows. Existing files for the same template, size and seed are reused.
+    """
+    source = template_path(template)
+    name = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(out_dir, f"{name}_{rows}_{seed}.csv")
+    if os.path.exists(path):
+        return path
+
+    print(f"🧪 Generating {rows:,} synthetic rows shaped like {os.path.basename(source)}...")
+    template = load_data(source)
+    id_cols = _id_columns(template)
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    for start in range(0, rows, WRITE_CHUNK_ROWS):
+        chunk = _synthesize_chunk(template, id_cols, start, min(WRITE_CHUNK_ROWS, rows - start), rng)
+        chunk.to_csv(tmp_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    os.replace(tmp_path, path)
+    print(f"✅ Synthetic dataset saved to {path}")
+    return path
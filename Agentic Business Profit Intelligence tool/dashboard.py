@@ -2,9 +2,13 @@ import streamlit as st
 import pandas as pd
 import os
 import shutil
-from pipeline.perfect_flow import run_business_pipeline
-from ydata_profiling import ProfileReport
-from fpdf import FPDF
+from pipeline.job_queue import FINISHED_STATUSES, cancel_job, get_job, submit_job
+from Src_code.agentic_ai import PARTIAL_INSIGHTS_FILE
+from Src_code.data_ingestion import load_data
+from Src_code.dataset_cache import bytes_fingerprint, read_cached_frame, write_cached_frame
+from Src_code.instrumentation import RUN_LOG_FILE, read_run_log, summarize_run
+from Src_code.run_context import create_run_context, start_workspace_gc
+from Src_code.profiling_report import DEFAULT_SAMPLE_ROWS, TIERS, start_profile_report
 import json
 
 # Streamlit Page Setup
@@ -50,151 +54,294 @@ if "metrics" not in st.session_state:
     st.session_state.metrics = {}
 if "pdf_bytes" not in st.session_state:
     st.session_state.pdf_bytes = None
+if "run_log" not in st.session_state:
+    st.session_state.run_log = []
+
+# --- Per-session workspace (Runs/<run_id>) so concurrent users never share output folders ---
+if "run_ctx" not in st.session_state:
+    st.session_state.run_ctx = create_run_context()
+run_ctx = st.session_state.run_ctx
+run_ctx.touch()
+start_workspace_gc()
+
+
+# --- Parsed datasets, shared across reruns and sessions by content hash (treat as read-only) ---
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_dataset(fingerprint: str, _file_path: str):
+    df = read_cached_frame(fingerprint, "raw")
+    if df is None:
+        df = load_data(_file_path)
+        write_cached_frame(df, fingerprint, "raw")
+    return df
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def dataset_preview(fingerprint: str, _df, rows: int = 5):
+    return _df.head(rows)
+
 
 # --- File Upload ---
 uploaded = st.file_uploader("Upload your dataset (CSV)", type=["csv"])
 
 if uploaded:
-    os.makedirs("Data/raw", exist_ok=True)
-    file_path = os.path.join("Data/raw", uploaded.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded.getbuffer())
+    run_ctx.prepare()
+    file_path = run_ctx.raw_path(uploaded.name)
+
+    # Hash and save each upload once, not on every rerun
+    upload_id = getattr(uploaded, "file_id", None) or (uploaded.name, uploaded.size)
+    if st.session_state.get("upload_id") != upload_id or not os.path.exists(file_path):
+        data = uploaded.getbuffer()
+        st.session_state.fingerprint = bytes_fingerprint(data)
+        with open(file_path, "wb") as f:
+            f.write(data)
+        st.session_state.upload_id = upload_id
+    fingerprint = st.session_state.fingerprint
     st.success(f"✅ File saved to {file_path}")
 
-    # --- Data Preview ---
-    df = pd.read_csv(file_path, encoding="latin1")
+    # --- Data Preview (typed columns from the columnar cache when available) ---
+    df = load_dataset(fingerprint, file_path)
     st.write("### 👀 Data Preview")
-    st.dataframe(df.head(), use_container_width=True)
+    st.dataframe(dataset_preview(fingerprint, df), use_container_width=True)
 
-    # --- Profiling Report ---
+    # --- Profiling Report (sampled, cached by dataset hash, built on a background thread) ---
+    st.write("### 📈 Data Profiling")
+    tier_col, rows_col = st.columns(2)
+    tier = tier_col.selectbox("Report depth", TIERS, index=0,
+                              help="Minimal is fastest; standard adds correlations and interactions; explorative also analyzes text.")
+    sample_rows = rows_col.number_input("Rows to profile (0 = all)", min_value=0, step=10_000,
+                                        value=DEFAULT_SAMPLE_ROWS)
     if st.button("📈 Generate Data Profiling Report"):
-        with st.spinner("Generating advanced profiling report... ⏳"):
-            profile = ProfileReport(df, title="Business Data Profiling Report", explorative=True)
-            os.makedirs("Results", exist_ok=True)
-            profile_path = "Results/data_profile.html"
-            profile.to_file(profile_path)
+        st.session_state.profile_job = start_profile_report(df, fingerprint, tier, int(sample_rows))
+
+    job = st.session_state.get("profile_job")
+    if job is not None:
+        # Only this fragment re-runs while the report is being built, so the rest of the page stays usable
+        @st.fragment(run_every=1.0 if not job.done else None)
+        def profile_status():
+            if not job.done:
+                st.progress(job.progress, text=f"⏳ {job.message}...")
+                return
+            if job.error:
+                st.error(f"❌ Profiling failed: {job.error}")
+                return
+            if st.session_state.get("profile_shown") != job.path:
+                # Finished since the last full run: rerun once to stop polling
+                st.session_state.profile_shown = job.path
+                st.rerun()
+            shutil.copyfile(job.path, run_ctx.results_path("data_profile.html"))
             st.success("✅ Data profiling report generated successfully!")
 
             # Display HTML inline
-            with open(profile_path, "r", encoding="utf-8") as f:
+            with open(job.path, "r", encoding="utf-8") as f:
                 html = f.read()
             st.components.v1.html(html, height=800, scrolling=True)
 
-    # --- Run Full AI Analysis ---
-    if st.button("🚀 Run Full AI Analysis"):
-        with st.spinner("Running Prefect pipeline... Please wait ⏳"):
-            try:
-                # Clean old results
-                if os.path.exists("Results"):
-                    shutil.rmtree("Results")
-                os.makedirs("Results/visualization", exist_ok=True)
-
-                # Run your pipeline
-                run_business_pipeline(file_path)
-                st.success("✅ Pipeline executed successfully!")
+        profile_status()
 
-                # Load metrics
-                metrics_path = "Results/model_metrics.json"
-                if os.path.exists(metrics_path):
-                    with open(metrics_path, "r", encoding="utf-8") as f:
-                        st.session_state.metrics = json.load(f)
-
-                # Load insights
-                insights_path = "Results/insights.txt"
-                if os.path.exists(insights_path):
-                    with open(insights_path, encoding="utf-8") as f:
-                        st.session_state.insights_text = f.read()
-
-                # Load images
-                vis_folder = "Results/visualization"
-                if os.path.exists(vis_folder):
-                    st.session_state.images = [
-                        img for img in os.listdir(vis_folder) if img.endswith(".png")
-                    ]
-
-            except Exception as e:
-                st.error(f"❌ Error while running pipeline: {e}")
-
-    # --- Show Results (Persistent with session_state) ---
-    metrics = st.session_state.metrics
-    insights_text = st.session_state.insights_text
-    images = st.session_state.images
-
-    # Model Metrics
-    if metrics:
-        st.subheader("📈 Model Metrics")
-        target = metrics.get("Target", "Unknown")
-        r2 = metrics.get("R²", "N/A")
-        top_features = metrics.get("Top Features", {})
-
-        st.write(f"**🎯 Target Variable:** `{target}`")
-        st.write(f"**📊 Model R² Score:** `{r2}`")
-
-        if top_features:
-            st.write("**💡 Top Influencing Features:**")
-            feat_df = pd.DataFrame(list(top_features.items()), columns=["Feature", "Importance"])
-            st.dataframe(feat_df, use_container_width=True)
-
-    # 🧠 Show AI Insights only if available
-    if insights_text.strip():
-        st.subheader("🧠 AI-Generated Insights")
-        st.write(insights_text)
-
-    # 📊 Show Visualizations only if available
-    if images:
-        st.subheader("📊 Visualizations")
-        for img in images:
-            st.image(os.path.join("Results/visualization", img), use_container_width=True)
-
-        # --- 📄 Generate AI Business Report (only after analysis is ready) ---
-        st.subheader("📄 Generate AI Business Report")
-        if st.button("📝 Generate PDF Report"):
-            try:
-                pdf = FPDF()
-                pdf.add_page()
-                pdf.set_font("Arial", "B", 16)
-                pdf.cell(0, 10, "Agentic Business Profit Intelligence Report", ln=True, align="C")
-
-                # Dataset info
-                pdf.set_font("Arial", size=12)
-                pdf.ln(10)
-                pdf.multi_cell(0, 10, f"Dataset: {uploaded.name}\n")
-
-                # AI Insights
-                pdf.set_font("Arial", "B", 14)
-                pdf.cell(0, 10, txt="AI Insights", ln=True)
-                pdf.set_font("Arial", size=12)
-                from textwrap import wrap
-                safe_insights = insights_text if insights_text else "No AI insights available."
-                safe_insights_wrapped = "\n".join(wrap(safe_insights, width=110))
-                pdf.multi_cell(0, 8, safe_insights_wrapped)
-
-                # Visualizations
-                pdf.ln(5)
-                pdf.set_font("Arial", "B", 14)
-                pdf.cell(0, 10, txt="Visualizations", ln=True)
-                for img in images[:3]:
-                    img_path = os.path.join("Results/visualization", img)
-                    if os.path.exists(img_path):
-                        pdf.image(img_path, w=160)
-                        pdf.ln(5)
-
-                # ✅ Properly generate bytes for Streamlit download
-                pdf_bytes = bytes(pdf.output(dest="S"))
-                st.session_state.pdf_bytes = pdf_bytes
-                st.success("✅ PDF Report Generated! Scroll down to download it.")
-
-            except Exception as e:
-                st.error(f"❌ Error generating PDF: {e}")
-
-        # --- Download Button ---
-        if st.session_state.pdf_bytes:
-            st.download_button(
-                label="⬇️ Download AI Business Report (PDF)",
-                data=st.session_state.pdf_bytes,
-                file_name=f"AI_Report_{uploaded.name.split('.')[0]}.pdf",
-                mime="application/pdf"
-            )
+    # --- Run Full AI Analysis (queued to a background worker; the page stays responsive) ---
+    optimize_memory = st.checkbox(
+        "🗜️ Optimize memory (categoricals + numeric downcasting)",
+        help="Recommended for large files: shrinks the dataset before cleaning and model training."
+    )
+    incremental = st.checkbox(
+        "➕ Incremental (only process rows appended since an earlier run of this dataset)",
+        help="For growing files: new rows are cleaned and merged into the cached data, and the model is warm-started."
+    )
+    if st.button("🚀 Run Full AI Analysis"):
+        st.session_state.job_id = submit_job(file_path, optimize_memory=optimize_memory, fingerprint=fingerprint,
+                                             incremental=incremental)
+        st.query_params["job"] = st.session_state.job_id
+        st.session_state.loaded_job = None
 
 else:
     st.info("👈 Please upload a CSV file to start your analysis.")
+
+
+def load_job_results(job):
+    """Read a finished job's artifacts into the session."""
+    results_dir = job["results_dir"]
+    st.session_state.dataset_name = os.path.basename(job["file_path"])
+    st.session_state.pdf_bytes = None
+
+    # Load metrics
+    metrics_path = os.path.join(results_dir, "model_metrics.json")
+    st.session_state.metrics = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, "r", encoding="utf-8") as f:
+            st.session_state.metrics = json.load(f)
+
+    # Load insights
+    insights_path = os.path.join(results_dir, "insights.txt")
+    st.session_state.insights_text = ""
+    if os.path.exists(insights_path):
+        with open(insights_path, encoding="utf-8") as f:
+            st.session_state.insights_text = f.read()
+
+    # Load images
+    vis_folder = os.path.join(results_dir, "visualization")
+    st.session_state.images = []
+    if os.path.exists(vis_folder):
+        st.session_state.images = [
+            os.path.join(vis_folder, img) for img in sorted(os.listdir(vis_folder)) if img.endswith(".png")
+        ]
+
+    # Load the run's timing / memory / LLM log
+    st.session_state.run_log = read_run_log(os.path.join(results_dir, RUN_LOG_FILE))
+
+
+# --- Analysis job status (the job id is kept in the URL, so a browser refresh reconnects to the run) ---
+job_id = st.session_state.get("job_id") or st.query_params.get("job")
+job = get_job(job_id) if job_id else None
+if job is not None:
+    st.session_state.job_id = job_id
+    running = job["status"] not in FINISHED_STATUSES
+
+    @st.fragment(run_every=0.5 if running else None)
+    def job_status():
+        job = get_job(job_id)
+        if job["status"] not in FINISHED_STATUSES:
+            st.progress(job["progress"] or 0.0, text=f"⏳ Job {job_id}: {job['stage']} ({job['status']})")
+            if st.button("⛔ Cancel analysis"):
+                cancel_job(job_id)
+
+            # Insights appear as the LLM streams them
+            partial_path = os.path.join(job["results_dir"] or "", PARTIAL_INSIGHTS_FILE)
+            if job["results_dir"] and os.path.exists(partial_path):
+                with open(partial_path, encoding="utf-8") as f:
+                    partial_text = f.read()
+                if partial_text.strip():
+                    st.subheader("🧠 AI-Generated Insights (generating...)")
+                    st.write(partial_text)
+            return
+        if running:
+            # Finished since the last full run: rerun once to stop polling and show the results
+            st.rerun()
+
+        if job["status"] == "succeeded":
+            failures = (job["result"] or {}).get("failures", {})
+            for stage, error in failures.items():
+                st.warning(f"⚠️ {stage} failed: {error}")
+            if not failures:
+                st.success("✅ Pipeline executed successfully!")
+            if st.session_state.get("loaded_job") != job_id:
+                load_job_results(job)
+                st.session_state.loaded_job = job_id
+        elif job["status"] == "cancelled":
+            st.info(f"⛔ Job {job_id} was cancelled.")
+        else:
+            st.error(f"❌ Error while running pipeline: {job['error']}")
+
+    job_status()
+
+# --- Show Results (Persistent with session_state) ---
+metrics = st.session_state.metrics
+insights_text = st.session_state.insights_text
+images = st.session_state.images
+dataset_name = st.session_state.get("dataset_name", "dataset")
+
+# Model Metrics
+if metrics:
+    st.subheader("📈 Model Metrics")
+    target = metrics.get("Target", "Unknown")
+    r2 = metrics.get("R²", "N/A")
+    top_features = metrics.get("Top Features", {})
+
+    st.write(f"**🎯 Target Variable:** `{target}`")
+    st.write(f"**📊 Model R² Score:** `{r2}`")
+
+    if top_features:
+        st.write("**💡 Top Influencing Features:**")
+        feat_df = pd.DataFrame(list(top_features.items()), columns=["Feature", "Importance"])
+        st.dataframe(feat_df, use_container_width=True)
+
+# ⏱️ Run performance (stage timings, memory, LLM usage) of the last analysis
+if st.session_state.run_log:
+    summary = summarize_run(st.session_state.run_log)
+    with st.expander("⏱️ Run performance"):
+        run = summary["run"] or {}
+        total_col, peak_col, llm_col = st.columns(3)
+        total_col.metric("Total time", f"{run.get('seconds', 0):.1f}s")
+        peak_col.metric("Peak memory", f"{run.get('peak_rss_mb') or 0:.0f} MB")
+        llm_col.metric("LLM calls", f"{summary['llm']['calls']} ({summary['llm']['cached']} cached)")
+
+        if summary["stages"]:
+            stages_df = pd.DataFrame([{
+                "Stage": e["name"], "Seconds": e.get("seconds"), "Rows": e.get("rows"),
+                "Rows/s": e.get("rows_per_second"), "Memory Δ (MB)": e.get("rss_delta_mb"),
+                "Peak (MB)": e.get("peak_rss_mb"), "Status": e.get("status"),
+            } for e in summary["stages"]])
+            st.bar_chart(stages_df.set_index("Stage")["Seconds"])
+            st.dataframe(stages_df, use_container_width=True, hide_index=True)
+        if summary["cache_hits"]:
+            st.write(f"**⚡ Served from cache:** {', '.join(summary['cache_hits'])}")
+        if summary["sections"]:
+            st.write("**🔍 Slowest sections**")
+            st.dataframe(pd.DataFrame(summary["sections"][:10]), use_container_width=True, hide_index=True)
+
+        llm = summary["llm"]
+        if llm["calls"]:
+            tokens_note = " (estimated)" if llm["estimated_tokens"] else ""
+            st.write(f"**🤖 LLM:** {llm['seconds']:.1f}s across calls, {llm['input_tokens']:,} input / "
+                     f"{llm['output_tokens']:,} output tokens{tokens_note}, {llm['retries']} retries")
+
+# 🧠 Show AI Insights only if available
+if insights_text.strip():
+    st.subheader("🧠 AI-Generated Insights")
+    st.write(insights_text)
+
+# 📊 Show Visualizations only if available
+if images:
+    st.subheader("📊 Visualizations")
+    for img in images:
+        st.image(img, use_container_width=True)
+
+    # --- 📄 Generate AI Business Report (only after analysis is ready) ---
+    st.subheader("📄 Generate AI Business Report")
+    if st.button("📝 Generate PDF Report"):
+        try:
+            from fpdf import FPDF
+
+            pdf = FPDF()
+            pdf.add_page()
+            pdf.set_font("Arial", "B", 16)
+            pdf.cell(0, 10, "Agentic Business Profit Intelligence Report", ln=True, align="C")
+
+            # Dataset info
+            pdf.set_font("Arial", size=12)
+            pdf.ln(10)
+            pdf.multi_cell(0, 10, f"Dataset: {dataset_name}\n")
+
+            # AI Insights
+            pdf.set_font("Arial", "B", 14)
+            pdf.cell(0, 10, txt="AI Insights", ln=True)
+            pdf.set_font("Arial", size=12)
+            from textwrap import wrap
+            safe_insights = insights_text if insights_text else "No AI insights available."
+            safe_insights_wrapped = "\n".join(wrap(safe_insights, width=110))
+            pdf.multi_cell(0, 8, safe_insights_wrapped)
+
+            # Visualizations
+            pdf.ln(5)
+            pdf.set_font("Arial", "B", 14)
+            pdf.cell(0, 10, txt="Visualizations", ln=True)
+            for img_path in images[:3]:
+                if os.path.exists(img_path):
+                    pdf.image(img_path, w=160)
+                    pdf.ln(5)
+
+            # ✅ Properly generate bytes for Streamlit download
+            pdf_bytes = bytes(pdf.output(dest="S"))
+            st.session_state.pdf_bytes = pdf_bytes
+            st.success("✅ PDF Report Generated! Scroll down to download it.")
+
+        except Exception as e:
+            st.error(f"❌ Error generating PDF: {e}")
+
+    # --- Download Button ---
+    if st.session_state.pdf_bytes:
+        st.download_button(
+            label="⬇️ Download AI Business Report (PDF)",
+            data=st.session_state.pdf_bytes,
+            file_name=f"AI_Report_{dataset_name.split('.')[0]}.pdf",
+            mime="application/pdf"
+        )
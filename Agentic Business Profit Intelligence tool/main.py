@@ -3,9 +3,14 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 from pipeline.perfect_flow import business_pipeline
 
-def main():
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    if args:
+        # Files, directories or globs: analyse them as a batch (see pipeline/batch_runner.py --help)
+        from pipeline.batch_runner import main as batch_main
+        return batch_main(args)
     print("🚀 Launching Agentic Business Intelligence Pipeline via Prefect...")
     business_pipeline()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# pipeline/batch_runner.py
+
+import argparse
+import contextlib
+import csv
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Src_code.dataset_cache import dataset_fingerprint
+from Src_code.instrumentation import RUN_LOG_FILE, read_run_log, summarize_run
+from Src_code.run_context import create_run_context
+
+# Batch outputs live outside Runs/, so the dashboard's workspace cleanup never removes them
+BATCH_ROOT = "Batches"
+
+# Datasets analysed at once; each run already uses several threads (and cores for training)
+MAX_BATCH_WORKERS = 2
+
+INDEX_FILE = "index.json"
+SUMMARY_FILE = "summary.csv"
+LOG_FILE = "pipeline.log"
+
+SUMMARY_COLUMNS = ["dataset", "status", "target", "r2", "top_feature", "seconds", "peak_rss_mb",
+                   "llm_calls", "failed_stages", "error", "results_dir"]
+
+
+# ============================
+# Inputs and the batch index
+# ============================
+
+def resolve_inputs(targets):
+    """CSV files named by paths, directories (their *.csv files) or glob patterns, deduplicated and sorted."""
+    files = []
+    for target in targets:
+        if os.path.isdir(target):
+            files.extend(glob.glob(os.path.join(target, "*.csv")))
+        elif os.path.isfile(target):
+            files.append(target)
+        else:
+            files.extend(p for p in glob.glob(target, recursive=True) if os.path.isfile(p))
+    return sorted({os.path.abspath(f) for f in files if f.lower().endswith(".csv")})
+
+
+def _slug(text: str, limit: int = 48):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:limit] or "batch"
+
+
+def default_batch_id(targets):
+    """The same inputs map to the same batch, so re-running a command resumes it."""
+    return _slug("_".join(t.rstrip("/\\") for t in targets))
+
+
+def dataset_run_id(file_path: str):
+    """Output namespace of one dataset: its file name plus a hash of its path (same-named files never collide)."""
+    digest = hashlib.blake2b(file_path.encode("utf-8"), digest_size=3).hexdigest()
+    return f"{_slug(os.path.splitext(os.path.basename(file_path))[0], 40)}-{digest}"
+
+
+def load_index(batch_dir: str):
+    path = os.path.join(batch_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {"datasets": {}}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"⚠️ Unreadable batch index {path}; starting the batch over.")
+        return {"datasets": {}}
+
+
+def save_index(batch_dir: str, index):
+    """Write index.json (the resume state) and summary.csv (one row per dataset) atomically."""
+    index["updated"] = time.time()
+    path = os.path.join(batch_dir, INDEX_FILE)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
+
+    path = os.path.join(batch_dir, SUMMARY_FILE)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for file_path, entry in sorted(index["datasets"].items()):
+            writer.writerow(dict(entry, dataset=file_path, failed_stages=";".join(entry.get("failures") or {})))
+    os.replace(tmp_path, path)
+
+
+def _is_done(entry, fingerprint, options):
+    return (entry is not None and entry.get("status") == "succeeded"
+            and entry.get("fingerprint") == fingerprint and entry.get("options") == options)
+
+
+# ============================
+# Worker side
+# ============================
+
+def _outcome(ctx):
+    """Headline metrics and resource use of a finished run, read back from its artifacts."""
+    outcome = {}
+    metrics_path = ctx.results_path("model_metrics.json")
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding="utf-8") as f:
+            metrics = json.load(f)
+        outcome["target"] = metrics.get("Target")
+        outcome["r2"] = metrics.get("R²")
+        outcome["top_feature"] = next(iter(metrics.get("Top Features") or {}), None)
+    summary = summarize_run(read_run_log(ctx.results_path(RUN_LOG_FILE)))
+    outcome["peak_rss_mb"] = (summary["run"] or {}).get("peak_rss_mb")
+    outcome["llm_calls"] = summary["llm"]["calls"]
+    return outcome
+
+
+def run_dataset(file_path: str, fingerprint: str, run_id: str, batch_dir: str, options, verbose: bool = False):
+    """
+    Worker entry point: analyse one dataset into its own workspace (<batch_dir>/<run_id>).
+    Pipeline output goes to the workspace's pipeline.log unless `verbose`. Returns the dataset's index entry.
+    """
+    from pipeline.perfect_flow import run_business_pipeline
+
+    ctx = create_run_context(run_id, root=batch_dir)
+    entry = {"run_id": run_id, "fingerprint": fingerprint, "options": options,
+             "results_dir": ctx.results_dir, "started": time.time()}
+    start = time.perf_counter()
+    with open(os.path.join(ctx.workspace, LOG_FILE), "w", encoding="utf-8") as log, \
+            contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(log))
+            stack.enter_context(contextlib.redirect_stderr(log))
+        try:
+            failures = run_business_pipeline(file_path, ctx=ctx, fingerprint=fingerprint, **options)
+            entry["status"] = "succeeded" if not failures else "partial"
+            entry["failures"] = {stage: str(error) for stage, error in failures.items()}
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = f"{type(e).__name__}: {e}"
+    entry["seconds"] = round(time.perf_counter() - start, 2)
+    entry["finished"] = time.time()
+    if entry["status"] != "failed":
+        entry.update(_outcome(ctx))
+    return entry
+
+
+# ============================
+# Batch driver
+# ============================
+
+def run_batch(targets, batch_id: str = None, max_workers: int = MAX_BATCH_WORKERS, optimize_memory: bool = False,
+              incremental: bool = False, rerun: bool = False, verbose: bool = False, root: str = BATCH_ROOT):
+    """
+    Analyse every CSV named by `targets` (files, directories, globs) in a pool of `max_workers` processes.
+    Each dataset gets its own workspace under <root>/<batch_id>/, so runs never share output folders;
+    the columnar, task, LLM-response and model caches are shared on disk, and each worker process keeps
+    its LLM client across the datasets it runs.
+    Progress is recorded in index.json (plus a summary.csv) after every dataset: running the same batch
+    again skips datasets that already succeeded with unchanged content and options (`rerun` to redo all).
+    Returns the batch index.
+    """
+    files = resolve_inputs(targets)
+    if not files:
+        raise ValueError(f"No CSV files found for {targets}")
+
+    batch_id = batch_id or default_batch_id(targets)
+    batch_dir = os.path.join(root, batch_id)
+    os.makedirs(batch_dir, exist_ok=True)
+    options = {"optimize_memory": optimize_memory, "incremental": incremental}
+    index = load_index(batch_dir)
+    index.update(batch_id=batch_id, targets=list(targets), options=options)
+    index.setdefault("created", time.time())
+    datasets = index["datasets"]
+
+    pending = []
+    for file_path in files:
+        fingerprint = dataset_fingerprint(file_path)
+        if not rerun and _is_done(datasets.get(file_path), fingerprint, options):
+            continue
+        pending.append((file_path, fingerprint))
+    skipped = len(files) - len(pending)
+    workers = min(max_workers, len(pending))
+    print(f"📦 Batch {batch_id}: {len(files)} datasets, {len(pending)} to run"
+          + (f", {skipped} already done" if skipped else "") + (f" ({workers} workers)" if pending else ""))
+    for file_path, fingerprint in pending:
+        datasets[file_path] = {"run_id": dataset_run_id(file_path), "fingerprint": fingerprint,
+                               "options": options, "status": "pending"}
+    save_index(batch_dir, index)
+    if not pending:
+        return index
+
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = {
+            pool.submit(run_dataset, file_path, fingerprint, datasets[file_path]["run_id"], batch_dir, options,
+                        verbose): file_path
+            for file_path, fingerprint in pending
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_path = futures[future]
+            try:
+                entry = future.result()
+            except BrokenProcessPool as e:
+                # The worker died (e.g. out of memory); the dataset is retried when the batch is resumed
+                entry = dict(datasets[file_path], status="failed", error=f"Worker process died: {e}")
+            datasets[file_path] = entry
+            save_index(batch_dir, index)
+            icon = {"succeeded": "✅", "partial": "⚠️"}.get(entry["status"], "❌")
+            line = f"{icon} [{done}/{len(pending)}] {os.path.basename(file_path)}: {entry['status']}"
+            if "seconds" in entry:
+                line += f" in {entry['seconds']}s"
+            detail = entry.get("error") or (f"R² {entry['r2']}" if entry.get("r2") is not None else "")
+            print(f"{line} ({detail})" if detail else line)
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        save_index(batch_dir, index)
+        print(f"⛔ Batch interrupted; run the same command again to resume ({os.path.join(batch_dir, INDEX_FILE)}).")
+        raise
+    pool.shutdown()
+
+    counts = {}
+    for entry in datasets.values():
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    print(f"🏁 Batch {batch_id} finished in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    print(f"📄 Summary: {os.path.join(batch_dir, SUMMARY_FILE)}")
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many CSV datasets in parallel.")
+    parser.add_argument("targets", nargs="+", help="CSV files, directories of CSVs or glob patterns")
+    parser.add_argument("--batch-id", help="Name of the batch folder under Batches/ (default: derived from the inputs)")
+    parser.add_argument("--workers", type=int, default=MAX_BATCH_WORKERS, help="Datasets analysed at once")
+    parser.add_argument("--optimize-memory", action="store_true", help="Downcast dtypes before cleaning")
+    parser.add_argument("--incremental", action="store_true", help="Only process rows appended since an earlier run")
+    parser.add_argument("--rerun", action="store_true", help="Run every dataset again, even those already done")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline output instead of writing it to pipeline.log")
+    args = parser.parse_args(argv)
+
+    try:
+        index = run_batch(args.targets, args.batch_id, args.workers, args.optimize_memory, args.incremental,
+                          args.rerun, args.verbose)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    return 0 if all(e["status"] == "succeeded" for e in index["datasets"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# pipeline/job_queue.py
+
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+
+from Src_code.run_context import WORKSPACE_ROOT, create_run_context
+
+# Job table shared by the dashboard (submit/poll/cancel) and the worker processes (progress/results)
+JOB_DB_PATH = os.path.join(WORKSPACE_ROOT, "jobs.sqlite")
+
+# Pipeline runs executing at once, however many browser tabs submit work
+MAX_JOB_WORKERS = 2
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+_executor = None
+_executor_workers = MAX_JOB_WORKERS
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker at the next stage boundary after a job was cancelled."""
+
+
+# ============================
+# Job table (SQLite)
+# ============================
+
+def _connect():
+    os.makedirs(os.path.dirname(JOB_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " id TEXT PRIMARY KEY, status TEXT, file_path TEXT, fingerprint TEXT, options TEXT,"
+        " stage TEXT, progress REAL, results_dir TEXT, result TEXT, error TEXT, cancel_requested INTEGER,"
+        " worker_pid INTEGER, created REAL, started REAL, finished REAL)"
+    )
+    return conn
+
+
+def _update(job_id, **fields):
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with closing(_connect()) as conn, conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def get_job(job_id: str):
+    """The job's row as a dict (status, stage, progress, results_dir, result, error, ...), or None."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["options"] = json.loads(job["options"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def list_jobs(limit: int = 20):
+    with closing(_connect()) as conn:
+        ids = [row["id"] for row in conn.execute("SELECT id FROM jobs ORDER BY created DESC LIMIT ?", (limit,))]
+    return [get_job(job_id) for job_id in ids]
+
+
+# ============================
+# Dashboard side: submit, cancel
+# ============================
+
+def submit_job(file_path: str, optimize_memory: bool = False, fingerprint: str = None,
+               max_workers: int = MAX_JOB_WORKERS, incremental: bool = False):
+    """Queue a pipeline run and return its job id. Results go to the job's own workspace (Runs/<job_id>)."""
+    job_id = uuid.uuid4().hex[:12]
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, file_path, fingerprint, options, stage, progress, cancel_requested, created)"
+            " VALUES (?, 'queued', ?, ?, ?, 'Queued', 0.0, 0, ?)",
+            (job_id, file_path, fingerprint, json.dumps({"optimize_memory": optimize_memory, "incremental": incremental}), time.time()),
+        )
+    executor = _get_executor(max_workers)
+    try:
+        _submit(executor, job_id)
+    except BrokenProcessPool:
+        # The replacement pool picks the job up with the other queued ones
+        _replace_broken_executor(executor)
+    print(f"📮 Queued pipeline job {job_id} for {file_path}")
+    return job_id
+
+
+def cancel_job(job_id: str):
+    """Cancel a job: queued jobs never start, running ones stop at their next stage boundary."""
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', stage = 'Cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+
+def _get_executor(max_workers=None):
+    """
+    One worker pool per server process; jobs left queued or running by a previous process (or by a
+    pool whose worker died) are recovered.
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None:
+            _executor_workers = max_workers or _executor_workers
+            _executor = ProcessPoolExecutor(max_workers=_executor_workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            _recover_jobs(_executor)
+        return _executor
+
+
+def _submit(executor, job_id):
+    future = executor.submit(_run_job, job_id)
+    future.add_done_callback(lambda f: _check_pool(executor, f))
+
+
+def _check_pool(executor, future):
+    """A worker that died (out of memory, segfault) breaks the whole pool: replace it."""
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _replace_broken_executor(executor)
+
+
+def _replace_broken_executor(executor):
+    """
+    Swap a broken pool for a new one. The pool's workers are gone, so its running jobs are marked
+    failed and its queued jobs are resubmitted (by `_recover_jobs`, when the new pool starts).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:  # already replaced (one callback per job of the broken pool)
+            return
+        _executor = None
+    print("⚠️ A job worker process died; restarting the worker pool.")
+    executor.shutdown(wait=False, cancel_futures=True)
+    _get_executor()
+
+
+def _recover_jobs(executor):
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker exited before the job finished', finished = ?"
+            " WHERE status = 'running'",
+            (time.time(),),
+        )
+        queued = [row["id"] for row in conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created")]
+    for job_id in queued:
+        _submit(executor, job_id)
+
+
+# ============================
+# Worker side
+# ============================
+
+def _claim(job_id):
+    with closing(_connect()) as conn, conn:
+        claimed = conn.execute(
+            "UPDATE jobs SET status = 'running', stage = 'Starting', started = ?, worker_pid = ?"
+            " WHERE id = ? AND status = 'queued'",
+            (time.time(), os.getpid(), job_id),
+        ).rowcount
+    return claimed == 1
+
+
+def _run_job(job_id):
+    """Worker entry point: run one queued job, recording per-stage progress and the outcome."""
+    from pipeline.perfect_flow import run_business_pipeline
+
+    if not _claim(job_id):
+        return
+    job = get_job(job_id)
+    ctx = create_run_context(job_id)
+    # Known up front, so the dashboard can show artifacts (e.g. streaming insights) while the job runs
+    _update(job_id, results_dir=ctx.results_dir)
+
+    def progress(stage, fraction):
+        ctx.touch()
+        if get_job(job_id)["cancel_requested"]:
+            raise JobCancelled(f"Job {job_id} was cancelled")
+        _update(job_id, stage=stage, progress=fraction)
+
+    try:
+        failures = run_business_pipeline(job["file_path"], ctx=ctx, fingerprint=job["fingerprint"],
+                                         progress=progress, **job["options"])
+        result = {"failures": {stage: str(error) for stage, error in failures.items()}}
+        _update(job_id, status="succeeded", stage="Done", progress=1.0, results_dir=ctx.results_dir,
+                result=json.dumps(result), finished=time.time())
+    except JobCancelled:
+        _update(job_id, status="cancelled", stage="Cancelled", results_dir=ctx.results_dir, finished=time.time())
+    except Exception as e:
+        _update(job_id, status="failed", error=str(e), results_dir=ctx.results_dir, finished=time.time())
@@ -1,32 +1,141 @@
 # Pipeline/prefect_flow.py
 
 import sys, os, shutil
+import contextvars
+import functools
+import threading
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from prefect import flow, task
 from Src_code.data_ingestion import load_data
 from Src_code.data_cleaning import clean_data
-from Src_code.model_training import train_model
-from Src_code.visualization import generate_visuals
-from Src_code.agentic_ai import generate_ai_insights
+from Src_code.memory_optimization import optimize_dtypes
+from Src_code.model_training import DEFAULT_MAX_TRAIN_ROWS, train_model
+from Src_code.visualization import PLAN_MODEL, generate_visuals
+from Src_code.agentic_ai import INSIGHTS_MODEL, generate_ai_insights
+from Src_code.dataset_cache import (CACHE_DIR, dataset_fingerprint, read_cached_frame, write_cached_frame,
+                                    read_cached_json, write_cached_json, read_cached_object, write_cached_object)
+from Src_code.incremental import find_base_snapshot, record_snapshot, update_clean_store, update_profile_state
+from Src_code.statistics_engine import compute_profile, summarize_profile
+from Src_code import chart_cache, chart_rendering, llm_gateway, model_registry, statistics_engine
+from Src_code.llm_gateway import get_llm_backend
+from Src_code.run_context import DEFAULT_CONTEXT, create_run_context
+from Src_code.instrumentation import instrumented, recording
+from pipeline.task_cache import run_cached, task_cache_key
 
 
 # 🧹 Clean previous runs
-def clear_previous_results():
-    """Remove all old outputs before a new pipeline run."""
-    folders_to_clear = ["Results", "Data/Processed"]
-    for folder in folders_to_clear:
-        if os.path.exists(folder):
-            shutil.rmtree(folder)
-    os.makedirs("Results/visualization", exist_ok=True)
-    os.makedirs("Data/Processed", exist_ok=True)
-    print("🧹 Cleared old Results and Processed folders for a fresh run.")
+def clear_previous_results(ctx=None):
+    """
+    Remove the old outputs of this run's workspace before a new pipeline run.
+    Only the given RunContext's folders are touched; the columnar dataset cache is kept.
+    """
+    ctx = ctx or DEFAULT_CONTEXT
+    if os.path.exists(ctx.results_dir):
+        shutil.rmtree(ctx.results_dir)
+    if os.path.exists(ctx.processed_dir):
+        for entry in os.listdir(ctx.processed_dir):
+            entry_path = os.path.join(ctx.processed_dir, entry)
+            if os.path.normpath(entry_path) == os.path.normpath(CACHE_DIR):
+                continue
+            if os.path.isdir(entry_path):
+                shutil.rmtree(entry_path)
+            else:
+                os.remove(entry_path)
+    ensure_dirs(ctx)
+    print(f"🧹 Cleared old results in {ctx.results_dir} for a fresh run.")
 
 
 # Ensure directory structure exists
-def ensure_dirs():
-    os.makedirs("Data/Processed", exist_ok=True)
-    os.makedirs("Results/visualization", exist_ok=True)
+def ensure_dirs(ctx=None):
+    (ctx or DEFAULT_CONTEXT).prepare()
+
+
+# Task-level memoization: each stage is keyed on the cleaned dataset's key plus its own code version
+def _clean_cache_key(fingerprint: str, optimize_memory: bool):
+    return task_cache_key(
+        "clean_data", fingerprint,
+        funcs=(load_data, optimize_dtypes, clean_data),
+        config={"optimize_memory": optimize_memory},
+    )
+
+
+# Code each stage's cached result depends on: its entry point plus the helper modules it calls into,
+# so editing e.g. the chart renderer or the LLM gateway invalidates the memoized stage results
+STAGE_CODE = {
+    "profile": (compute_profile,),
+    "train_model": (train_model, model_registry, chart_cache),
+    "generate_visuals": (generate_visuals, chart_rendering, chart_cache, llm_gateway),
+    "generate_ai_insights": (generate_ai_insights, statistics_engine, llm_gateway),
+}
+
+
+def _stage_key(stage: str, cache_key: str, config=None):
+    return task_cache_key(stage, cache_key, funcs=STAGE_CODE[stage], config=config) if cache_key else None
+
+
+def _profile_key(cache_key: str):
+    return _stage_key("profile", cache_key)
+
+
+def _llm_config(model: str):
+    """LLM settings a stage's output depends on: results of the offline stub are never served as real ones."""
+    return {"llm_backend": get_llm_backend(), "model": model}
+
+
+# Training engine settings: boosting backend above the row budget, stratified subsample, time cap in seconds
+TRAINING_CONFIG = {
+    "backend": "auto",
+    "max_rows": DEFAULT_MAX_TRAIN_ROWS,
+    "time_budget": 120,
+}
+
+
+# ============================
+# Prefect (imported the first time a task or flow actually runs through it)
+# ============================
+
+_prefect_lock = threading.Lock()
+
+
+class _DeferredPrefect:
+    """
+    Stands in for a Prefect task or flow until it is first called or submitted, so importing
+    this module (the dashboard, the job queue, the CLI) does not pay for importing Prefect.
+    `.fn` is the plain function, which run_business_pipeline calls directly.
+    """
+
+    def __init__(self, kind, fn, options):
+        functools.update_wrapper(self, fn)
+        self.fn = fn
+        self._kind = kind
+        self._options = options
+        self._target = None
+
+    def _resolve(self):
+        with _prefect_lock:
+            if self._target is None:
+                import prefect
+                self._target = getattr(prefect, self._kind)(**self._options)(self.fn)
+            return self._target
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # submit, map, serve, ... of the real Prefect object
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+
+def task(**options):
+    return lambda fn: _DeferredPrefect("task", fn, options)
+
+
+def flow(**options):
+    return lambda fn: _DeferredPrefect("flow", fn, options)
 
 
 # ============================
@@ -34,50 +143,122 @@ def ensure_dirs():
 # ============================
 
 @task(name="Load Data", cache_key_fn=None)
-def task_load_data(path: str):
+@instrumented("Load Data")
+def task_load_data(path: str, fingerprint: Optional[str] = None):
     print(f"📥 Loading dataset from: {path}")
-    df = load_data(path)
+    df = read_cached_frame(fingerprint, "raw") if fingerprint else None
+    if df is None:
+        df = load_data(path)
+        if fingerprint:
+            write_cached_frame(df, fingerprint, "raw")
     print(f"✅ Loaded {df.shape[0]} rows and {df.shape[1]} columns.")
     return df
 
 
+@task(name="Optimize Memory", cache_key_fn=None)
+@instrumented("Optimize Memory")
+def task_optimize_memory(df):
+    print("🗜️ Downcasting numerics and encoding low-cardinality strings as categoricals...")
+    return optimize_dtypes(df)
+
+
 @task(name="Clean Data", cache_key_fn=None)
-def task_clean_data(df):
+@instrumented("Clean Data")
+def task_clean_data(df, fingerprint: Optional[str] = None, ctx=None):
     print("🧹 Cleaning data...")
-    df_cleaned = clean_data(df)
-    df_cleaned.to_csv("Data/Processed/cleaned_dataset.csv", index=False)
-    print("✅ Cleaned data saved to Data/Processed/cleaned_dataset.csv")
+    df_cleaned = clean_data(df, fingerprint=fingerprint, ctx=ctx)
+    print("✅ Cleaned data stored in the columnar cache")
     return df_cleaned
 
 
+@task(name="Update Clean Data", cache_key_fn=None)
+@instrumented("Update Clean Data")
+def task_update_clean_data(file_path: str, clean_key: str, optimize_memory: bool = False):
+    """
+    Incremental mode: if the file has only grown since an earlier processed snapshot, clean just the
+    appended rows, merge them into the cleaned store and update the running profile.
+    Returns the merged frame, or None when the dataset has to be processed in full.
+    """
+    snapshot = find_base_snapshot(file_path, lambda fingerprint: _clean_cache_key(fingerprint, optimize_memory))
+    if snapshot is None:
+        print("ℹ️ No earlier snapshot of this dataset to extend; processing it in full.")
+        return None
+    print(f"🔁 Dataset grew since a snapshot of {snapshot['rows']} cleaned rows; cleaning only the new rows...")
+    updated = update_clean_store(file_path, clean_key, snapshot)
+    if updated is None:
+        return None
+    df_clean, delta = updated
+    update_profile_state(_profile_key(snapshot["clean_key"]), _profile_key(clean_key), delta)
+    return df_clean
+
+
 @task(name="Train Model", cache_key_fn=None)
-def task_train_model(df_cleaned):
+@instrumented("Train Model")
+def task_train_model(df_cleaned, cache_key: Optional[str] = None, ctx=None):
     """Train model only if numeric target exists."""
+    ctx = ctx or DEFAULT_CONTEXT
     numeric_cols = df_cleaned.select_dtypes(include="number").columns.tolist()
     if not numeric_cols:
         print("⚠️ No numeric columns available. Skipping model training.")
         return None
 
-    print("🧠 Training model...")
-    model, metrics = train_model(df_cleaned)
-    with open("Results/metrics.txt", "w", encoding="utf-8") as f:
-        f.write(str(metrics))
+    def _train():
+        print("🧠 Training model...")
+        model, metrics = train_model(df_cleaned, ctx, **TRAINING_CONFIG)
+        with open(ctx.results_path("metrics.txt"), "w", encoding="utf-8") as f:
+            f.write(str(metrics))
+        return metrics
+
+    metrics = run_cached(
+        "Train Model", _stage_key("train_model", cache_key, TRAINING_CONFIG), _train,
+        output_dir=ctx.results_dir,
+        artifacts=["metrics.txt", "model_metrics.json", "visualization/feature_importance.png"],
+    )
     print(f"✅ Model trained successfully: {metrics}")
     return metrics
 
 
 @task(name="Generate Visuals", cache_key_fn=None)
-def task_generate_visuals(df_cleaned):
+@instrumented("Generate Visuals")
+def task_generate_visuals(df_cleaned, cache_key: Optional[str] = None, ctx=None):
+    ctx = ctx or DEFAULT_CONTEXT
     print("🎨 Letting AI decide the best visualizations for this dataset...")
-    generate_visuals(df_cleaned)
-    print("✅ AI-driven visuals saved to Results/visualization/")
+    run_cached(
+        "Generate Visuals", _stage_key("generate_visuals", cache_key, _llm_config(PLAN_MODEL)),
+        generate_visuals, df_cleaned, ctx,
+        output_dir=ctx.results_dir,
+        artifacts=["visualization/ai_visual_*.png"],
+    )
+    print(f"✅ AI-driven visuals saved to {ctx.vis_dir}/")
 
 
 @task(name="Generate AI Insights", cache_key_fn=None)
-def task_generate_ai_insights(df_cleaned):
+@instrumented("Generate AI Insights")
+def task_generate_ai_insights(df_cleaned, cache_key: Optional[str] = None, ctx=None):
+    ctx = ctx or DEFAULT_CONTEXT
     print("🧠 Generating AI-driven insights...")
-    generate_ai_insights(df_cleaned)
-    print("✅ Insights saved to Results/insights.txt")
+
+    # The statistical profile grounding the prompt is cached next to the cleaned dataset, both as
+    # its summary and as mergeable state (extended with appended rows in incremental mode)
+    profile_key = _profile_key(cache_key)
+    profile_summary = read_cached_json(profile_key, "profile") if profile_key else None
+    if profile_summary is None:
+        profile = read_cached_object(profile_key, "profile_state") if profile_key else None
+        if profile is None:
+            profile = compute_profile(df_cleaned)
+            if profile_key:
+                write_cached_object(profile, profile_key, "profile_state")
+        profile_summary = summarize_profile(profile)
+        if profile_key:
+            write_cached_json(profile_summary, profile_key, "profile")
+
+    run_cached(
+        "Generate AI Insights", _stage_key("generate_ai_insights", cache_key, _llm_config(INSIGHTS_MODEL)),
+        generate_ai_insights, df_cleaned, ctx, profile_summary,
+        output_dir=ctx.results_dir,
+        artifacts=["insights.txt"],
+    )
+    print(f"✅ Insights saved to {ctx.results_path('insights.txt')}")
 
 
 # ============================
@@ -85,44 +266,154 @@ def task_generate_ai_insights(df_cleaned):
 # ============================
 
 @flow(name="Agentic Business Profit Intelligence")
-def business_pipeline(file_path: str = "Data/raw/Superstore.csv"):
+def business_pipeline(file_path: str = "Data/raw/Superstore.csv", optimize_memory: bool = False,
+                      concurrent: bool = True, run_id: Optional[str] = None, incremental: bool = False,
+                      profiler: Optional[str] = None):
     """
     Main Prefect flow that orchestrates the entire pipeline.
     You can pass a different dataset path to process other files.
+    Set `optimize_memory` to downcast dtypes and use categoricals between loading and cleaning.
+    With `concurrent`, training, visuals and insights run in parallel once the data is clean.
+    Pass a `run_id` to write into an isolated workspace (Runs/<run_id>) instead of Results/.
+    With `incremental`, a file that only had rows appended since an earlier run has just those rows cleaned.
+    Stage timings, memory and LLM usage are logged to run_log.jsonl in the results folder;
+    `profiler` ("cprofile" or "sampling") also profiles the run.
     """
     print(f"🚀 Starting Prefect pipeline using dataset: {file_path}")
-    clear_previous_results()
-    ensure_dirs()
+    ctx = create_run_context(run_id) if run_id else DEFAULT_CONTEXT
+    clear_previous_results(ctx)
 
-    df = task_load_data(file_path)
-    df_clean = task_clean_data(df)
-    task_train_model(df_clean)
-    task_generate_visuals(df_clean)
-    task_generate_ai_insights(df_clean)
+    with recording(ctx, profiler=profiler, file=file_path, incremental=incremental):
+        fingerprint = dataset_fingerprint(file_path)
+        clean_key = _clean_cache_key(fingerprint, optimize_memory)
+        df_clean = read_cached_frame(clean_key, "clean")
+        if df_clean is None and incremental:
+            df_clean = task_update_clean_data(file_path, clean_key, optimize_memory)
+        if df_clean is None:
+            df = task_load_data(file_path, fingerprint)
+            if optimize_memory:
+                df = task_optimize_memory(df)
+            df_clean = task_clean_data(df, clean_key, ctx)
+        record_snapshot(file_path, fingerprint, clean_key, len(df_clean))
+        branches = {
+            "Train Model": task_train_model,
+            "Generate Visuals": task_generate_visuals,
+            "Generate AI Insights": task_generate_ai_insights,
+        }
+        if concurrent:
+            # Submit all three so the LLM calls overlap with model fitting
+            futures = {name: t.submit(df_clean, clean_key, ctx) for name, t in branches.items()}
+            failures = {}
+            for name, future in futures.items():
+                result = future.result(raise_on_failure=False)
+                if isinstance(result, BaseException):
+                    failures[name] = result
+                    print(f"❌ {name} failed: {result}")
+        else:
+            for t in branches.values():
+                t(df_clean, clean_key, ctx)
+            failures = {}
 
-    print("🎯 Prefect Flow completed successfully!")
+    print("🎯 Prefect Flow completed successfully!" if not failures else
+          f"⚠️ Prefect Flow completed with failed stages: {', '.join(failures)}")
 
 
 # ============================
 # Streamlit / External Entry
 # ============================
 
-def run_business_pipeline(file_path: str):
+def run_analysis_branches(df_clean, clean_key: Optional[str] = None, concurrent: bool = True, ctx=None, progress=None):
+    """
+    Run training, visuals and insights, which all depend only on the cleaned data.
+    With `concurrent` they share a thread pool, so wall-clock time is the slowest branch
+    (the LLM calls block on the network while RandomForest fitting releases the GIL).
+    A failing branch does not stop the others; failures are returned by stage name.
+    `progress(stage, fraction)` is called as each branch finishes.
+    """
+    branches = {
+        "Train Model": task_train_model.fn,
+        "Generate Visuals": task_generate_visuals.fn,
+        "Generate AI Insights": task_generate_ai_insights.fn,
+    }
+    failures = {}
+    progress = progress or (lambda stage, fraction: None)
+
+    if not concurrent:
+        for done, (name, fn) in enumerate(branches.items(), start=1):
+            try:
+                fn(df_clean, clean_key, ctx)
+            except Exception as e:
+                failures[name] = e
+                print(f"❌ {name} failed: {e}")
+            progress(name, done / len(branches))
+        return failures
+
+    with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix="pipeline-branch") as pool:
+        # Each branch runs in a copy of this context, so it records into the same run log
+        futures = {pool.submit(contextvars.copy_context().run, fn, df_clean, clean_key, ctx): name
+                   for name, fn in branches.items()}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures[name] = e
+                print(f"❌ {name} failed: {e}")
+            progress(name, done / len(branches))
+    return failures
+
+
+def run_business_pipeline(file_path: str, optimize_memory: bool = False, concurrent: bool = True, ctx=None,
+                          df=None, fingerprint: Optional[str] = None, progress=None, incremental: bool = False,
+                          profiler: Optional[str] = None):
     """
     Runs the Prefect pipeline directly (for Streamlit or CLI).
-    Ensures a clean, fresh run each time.
+    Ensures a clean, fresh run each time; unchanged stages are served from the task cache.
+    Pass a RunContext (`create_run_context()`) so concurrent sessions each get their own workspace.
+    Callers that already parsed the file (the dashboard) pass the raw frame as `df` and its
+    `fingerprint`, so the file is neither hashed nor parsed again; `df` itself is not modified.
+    `progress(stage, fraction)` is called at each stage boundary (the job queue records it,
+    and may raise from it to cancel the run).
+    With `incremental`, a file that only had rows appended since an earlier run has just those rows
+    cleaned and merged into the cached store; training then warm-starts from the earlier model.
+    Stage timings, memory and LLM usage are logged to run_log.jsonl in the results folder.
+    `profiler` ("cprofile" or "sampling", default from ABPI_PROFILER) also profiles the run;
+    cProfile only sees one thread, so the analysis branches then run one after another.
+    Returns a dict of failed stage name -> exception (empty on success).
     """
     print(f"⚙️ Running Prefect pipeline from Streamlit using: {file_path}")
-    clear_previous_results()
-    ensure_dirs()
+    ctx = ctx or DEFAULT_CONTEXT
+    progress = progress or (lambda stage, fraction: None)
+    clear_previous_results(ctx)
 
-    df = task_load_data.fn(file_path)
-    df_clean = task_clean_data.fn(df)
-    task_train_model.fn(df_clean)
-    task_generate_visuals.fn(df_clean)
-    task_generate_ai_insights.fn(df_clean)
+    with recording(ctx, profiler=profiler, file=file_path, incremental=incremental) as log:
+        progress("Load Data", 0.05)
+        fingerprint = fingerprint or dataset_fingerprint(file_path)
+        clean_key = _clean_cache_key(fingerprint, optimize_memory)
+        df_clean = read_cached_frame(clean_key, "clean")
+        if df_clean is None and incremental:
+            progress("Update Clean Data", 0.1)
+            df_clean = task_update_clean_data.fn(file_path, clean_key, optimize_memory)
+        if df_clean is None:
+            # Cleaning works in place, so a caller's frame is copied first
+            df = df.copy() if df is not None else task_load_data.fn(file_path, fingerprint)
+            if optimize_memory:
+                progress("Optimize Memory", 0.15)
+                df = task_optimize_memory.fn(df)
+            progress("Clean Data", 0.2)
+            df_clean = task_clean_data.fn(df, clean_key, ctx)
+        record_snapshot(file_path, fingerprint, clean_key, len(df_clean))
+        progress("Analysis", 0.3)
+        if log.profiler == "cprofile":
+            concurrent = False
+        failures = run_analysis_branches(df_clean, clean_key, concurrent=concurrent, ctx=ctx,
+                                         progress=lambda stage, fraction: progress(f"{stage} finished", 0.3 + 0.7 * fraction))
 
-    print("✅ Pipeline execution finished successfully via Streamlit.")
+    if failures:
+        print(f"⚠️ Pipeline finished with failed stages: {', '.join(failures)}")
+    else:
+        print("✅ Pipeline execution finished successfully via Streamlit.")
+    return failures
 
 
 # ============================
@@ -0,0 +1,84 @@
+# pipeline/run_report.py
+
+import argparse
+import glob
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Src_code.instrumentation import RUN_LOG_FILE, read_run_log, summarize_run
+from Src_code.run_context import WORKSPACE_ROOT
+
+
+def find_run_log(target: str = None):
+    """
+    Resolve a run id (Runs/<run_id>), a results folder or a run_log.jsonl path to the log file.
+    Without a target, the most recently written log under Runs/ or Results/ is used.
+    """
+    if target is None:
+        logs = glob.glob(os.path.join(WORKSPACE_ROOT, "*", "Results", RUN_LOG_FILE)) + \
+            glob.glob(os.path.join("Results", RUN_LOG_FILE))
+        return max(logs, key=os.path.getmtime) if logs else None
+    for path in (target, os.path.join(target, RUN_LOG_FILE),
+                 os.path.join(WORKSPACE_ROOT, target, "Results", RUN_LOG_FILE)):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _fmt(value, spec=""):
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(events, top: int = 10):
+    """Print stage timings, the slowest sections, LLM usage and profile hot spots of one run."""
+    summary = summarize_run(events)
+    run = summary["run"] or {}
+    print(f"🧾 Run {run.get('run_id') or '-'} ({run.get('file', 'unknown dataset')}): "
+          f"{_fmt(run.get('seconds'), '.2f')}s, peak {_fmt(run.get('peak_rss_mb'), '.0f')} MB, {run.get('status', 'unfinished')}")
+
+    print("\n⏱️ Stages")
+    print(f"  {'Stage':<24}{'Seconds':>10}{'Rows':>12}{'Rows/s':>14}{'ΔMB':>9}{'PeakMB':>9}  Status")
+    for e in summary["stages"]:
+        print(f"  {e['name']:<24}{_fmt(e.get('seconds'), '.3f'):>10}{_fmt(e.get('rows'), ','):>12}"
+              f"{_fmt(e.get('rows_per_second'), ',.0f'):>14}{_fmt(e.get('rss_delta_mb'), '.1f'):>9}"
+              f"{_fmt(e.get('peak_rss_mb'), '.0f'):>9}  {e.get('status')}")
+    if summary["cache_hits"]:
+        print(f"  ⚡ Served from cache: {', '.join(summary['cache_hits'])}")
+
+    if summary["sections"]:
+        print(f"\n🔍 Slowest sections (top {top})")
+        for entry in summary["sections"][:top]:
+            print(f"  {entry['name']:<36}{entry['seconds']:>10.3f}s  x{entry['count']}")
+
+    llm = summary["llm"]
+    if llm["calls"]:
+        note = " (estimated)" if llm["estimated_tokens"] else ""
+        print(f"\n🤖 LLM: {llm['calls']} calls ({llm['cached']} cached, {llm['retries']} retries), "
+              f"{llm['seconds']:.2f}s in calls, {llm['input_tokens']:,} input / {llm['output_tokens']:,} output tokens{note}")
+
+    profile = summary["profile"]
+    if profile:
+        print(f"\n🔬 {profile['name']} profile ({profile['path']}), top {top} by cumulative time")
+        for entry in profile["top"][:top]:
+            print(f"  {entry['cumulative_seconds']:>9.3f}s cum {entry['self_seconds']:>9.3f}s self  {entry['function']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the timing, memory and LLM log of a pipeline run.")
+    parser.add_argument("target", nargs="?",
+                        help="Run id, results folder or run_log.jsonl (default: the most recent run)")
+    parser.add_argument("--top", type=int, default=10, help="Sections and profile entries to show")
+    args = parser.parse_args(argv)
+
+    path = find_run_log(args.target)
+    if path is None:
+        print(f"❌ No run log found{f' for {args.target}' if args.target else ''}.")
+        return 1
+    print_report(read_run_log(path), args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
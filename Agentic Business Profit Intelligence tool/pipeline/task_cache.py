@@ -0,0 +1,139 @@
+# pipeline/task_cache.py
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Src_code.dataset_cache import CACHE_DIR
+from Src_code.instrumentation import log_event
+
+# Persisted task results, kept next to the columnar dataset cache so clear_previous_results leaves them alone
+TASK_CACHE_DIR = os.path.join(CACHE_DIR, "tasks")
+
+# Least recently used entries are evicted once the store grows past this size
+MAX_TASK_CACHE_BYTES = 1024 ** 3
+
+# Bump to invalidate every cached task result at once
+TASK_CACHE_VERSION = "1"
+
+
+def code_version(*funcs):
+    """
+    Hash of the source files that define the given functions (or modules), so editing a stage or a
+    helper module it relies on invalidates its cache.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted({inspect.getsourcefile(fn) for fn in funcs}):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def task_cache_key(stage: str, fingerprint: str, funcs=(), config=None):
+    """
+    Cache key for one pipeline stage: input dataset fingerprint + stage code version + config.
+    """
+    payload = json.dumps({
+        "version": TASK_CACHE_VERSION,
+        "stage": stage,
+        "fingerprint": fingerprint,
+        "code": code_version(*funcs) if funcs else None,
+        "config": config or {},
+    }, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _entry_path(key: str):
+    return os.path.join(TASK_CACHE_DIR, f"{key}.pkl")
+
+
+def _collect_artifacts(output_dir: str, artifacts):
+    """Read the files produced by a stage (glob patterns relative to output_dir)."""
+    files = {}
+    for pattern in artifacts:
+        for path in glob.glob(os.path.join(output_dir, pattern)):
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, output_dir)] = f.read()
+    return files
+
+
+def _restore_artifacts(output_dir: str, files):
+    for rel_path, data in files.items():
+        path = os.path.join(output_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def evict_task_cache(max_bytes: int = MAX_TASK_CACHE_BYTES):
+    """Delete least recently used task results until the store fits in `max_bytes`."""
+    if not os.path.exists(TASK_CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(TASK_CACHE_DIR):
+        if name.endswith(".pkl"):
+            path = os.path.join(TASK_CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:  # removed by a concurrent stage
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def run_cached(stage: str, key: str, fn, *args, output_dir: str = "Results", artifacts=()):
+    """
+    Memoize a pipeline stage.
+    On a hit the stored return value is returned and the stage's output files
+    (`artifacts`, glob patterns under `output_dir`) are restored without running `fn`.
+    On a miss `fn(*args)` runs and its result and artifacts are persisted.
+    Pass key=None to always run the stage.
+    """
+    if key is None:
+        return fn(*args)
+
+    path = _entry_path(key)
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            _restore_artifacts(output_dir, entry["artifacts"])
+            os.utime(path)  # mark as recently used
+            print(f"⚡ {stage}: inputs unchanged, reusing cached result")
+            log_event("cache", stage)
+            return entry["result"]
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable cache entry for {stage}: {e}")
+
+    result = fn(*args)
+
+    entry = {"result": result, "artifacts": _collect_artifacts(output_dir, artifacts)}
+    os.makedirs(TASK_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ Could not cache result of {stage}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    evict_task_cache()
+    return result
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the project the way main.py does: Src_code/pipeline packages from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Src_code import dataset_cache  # noqa: E402
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Point the columnar dataset cache at a temporary folder."""
+    path = str(tmp_path / "cache")
+    monkeypatch.setattr(dataset_cache, "CACHE_DIR", path)
+    return path
@@ -0,0 +1,76 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from Src_code import llm_gateway, model_registry
+from Src_code.dataset_cache import evict_dataset_cache, read_cached_array, write_cached_array
+from Src_code.model_registry import (config_key, data_fingerprint, find_base_model, find_model,
+                                     register_model, row_hashes)
+from pipeline.perfect_flow import INSIGHTS_MODEL, PLAN_MODEL, _llm_config, _stage_key
+
+
+def test_stage_keys_depend_on_the_llm_backend_and_model(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_active_backend", "stub")
+    stub = _stage_key("generate_ai_insights", "k", _llm_config(INSIGHTS_MODEL))
+    assert stub == _stage_key("generate_ai_insights", "k", _llm_config(INSIGHTS_MODEL))
+    assert stub != _stage_key("generate_ai_insights", "k", _llm_config(PLAN_MODEL))
+    assert stub != _stage_key("generate_ai_insights", "other", _llm_config(INSIGHTS_MODEL))
+
+    monkeypatch.setattr(llm_gateway, "_active_backend", "openai")
+    assert stub != _stage_key("generate_ai_insights", "k", _llm_config(INSIGHTS_MODEL))
+
+
+def test_stage_key_is_none_without_a_dataset_key():
+    assert _stage_key("train_model", None) is None
+
+
+def test_model_keys_depend_on_training_settings():
+    columns = ["sales", "quantity"]
+    key = config_key("profit", "random_forest", columns, {"max_rows": 1000, "time_budget": 30})
+    assert key == config_key("profit", "random_forest", columns, {"time_budget": 30, "max_rows": 1000})
+    assert key != config_key("profit", "random_forest", columns, {"max_rows": 1000, "time_budget": 60})
+    assert key != config_key("profit", "random_forest", columns[::-1], {"max_rows": 1000, "time_budget": 30})
+
+    hashes = row_hashes(pd.DataFrame({"sales": [1.0, 2.0], "quantity": [1, 2]}))
+    other = config_key("profit", "random_forest", columns)
+    assert data_fingerprint(hashes, key) != data_fingerprint(hashes, other)
+    assert data_fingerprint(hashes, key) != data_fingerprint(hashes[::-1].copy(), key)
+
+
+def test_dataset_cache_evicts_least_recently_used_keys(cache_dir):
+    old, recent, new = "1" * 32, "2" * 32, "3" * 32
+    for i, key in enumerate((old, recent)):
+        write_cached_array(np.zeros(1000), key, "row_hashes")
+        past = time.time() - 100 + i
+        os.utime(os.path.join(cache_dir, f"{key}.row_hashes.npy"), (past, past))
+    read_cached_array(old, "row_hashes")  # now the most recently used
+
+    write_cached_array(np.zeros(1000), new, "row_hashes")
+    size = os.path.getsize(os.path.join(cache_dir, f"{new}.row_hashes.npy"))
+    evict_dataset_cache(max_bytes=2 * size, keep=new)
+
+    assert read_cached_array(recent, "row_hashes") is None
+    assert read_cached_array(old, "row_hashes") is not None
+    assert read_cached_array(new, "row_hashes") is not None
+
+
+def test_registry_finds_exact_and_prefix_models(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "REGISTRY_DIR", str(tmp_path))
+    monkeypatch.setattr(model_registry, "INDEX_PATH", str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(model_registry, "MAX_MODELS", 2)
+    key = config_key("profit", "random_forest", ["sales"])
+    hashes = row_hashes(pd.DataFrame({"sales": np.arange(10.0)}))
+    base = data_fingerprint(hashes[:6], key)
+    register_model(base, key, 6, "model", {}, {"Target": "profit"}, {}, holdout=hashes[4:6])
+
+    assert find_model(base)["holdout"].tolist() == hashes[4:6].tolist()
+    payload, rows = find_base_model(hashes, key)
+    assert rows == 6 and payload["model"] == "model"
+    assert find_base_model(hashes, config_key("profit", "random_forest", ["sales"], {"max_rows": 5})) == (None, 0)
+
+    # Least recently used models beyond MAX_MODELS are removed
+    for i in range(2):
+        register_model(data_fingerprint(hashes[:i + 1], key), key, i + 1, "model", {}, {}, {})
+    assert find_model(base) is None
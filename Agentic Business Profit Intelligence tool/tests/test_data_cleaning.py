@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Src_code.data_cleaning import (_detect_business_columns, _parse_dates, clean_appended, clean_chunks,
+                                    clean_data)
+from Src_code.memory_optimization import optimize_dtypes
+from Src_code.run_context import RunContext
+
+
+def _sales_frame(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Region": rng.choice(["East", "West", "South"], n),
+        "Quantity": rng.integers(1, 10, n),
+        "Sales": rng.integers(10, 100, n).astype(float),
+        "Profit": rng.integers(-20, 50, n).astype(float),
+    })
+
+
+@pytest.mark.parametrize("columns, expected", [
+    (["Order Date", "Sales", "Profit"], ("profit", "sales", "order date")),
+    (["OrderDate", "ProductKey", "SalesAmount", "Year"], (None, "salesamount", "orderdate")),
+    (["netprofit", "totalsales", "order_date"], ("netprofit", "totalsales", "order_date")),
+    (["wholesale price", "profit margin", "profit"], ("profit", None, None)),
+    (["wholesale", "profitmargin", "holiday"], (None, None, None)),
+])
+def test_detect_business_columns(columns, expected):
+    assert _detect_business_columns([c.lower() for c in columns]) == expected
+
+
+def test_parse_dates_keeps_missing_categorical_dates_missing():
+    dates = pd.Series(["2024-01-05", None, "2024-03-01", "2024-01-05"], dtype="category")
+    parsed = _parse_dates(dates, "%Y-%m-%d")
+    assert parsed.isna().tolist() == [False, True, False, False]
+    assert parsed.iloc[3] == pd.Timestamp("2024-01-05")
+
+
+def test_clean_chunks_drops_duplicates_across_chunks(tmp_path):
+    df = _sales_frame(100)
+    chunks = [df.iloc[:60].copy(), pd.concat([df.iloc[40:100], df.iloc[:10]]).copy()]
+    ctx = RunContext(processed_dir=str(tmp_path))
+
+    assert sum(len(c) for c in clean_chunks(chunks, ctx=ctx)) == len(df.drop_duplicates())
+    per_chunk = clean_chunks([c.copy() for c in chunks], ctx=ctx, dedup_across_chunks=False)
+    assert sum(len(c) for c in per_chunk) == 130
+
+
+def test_one_hot_block_is_folded_into_a_categorical(tmp_path):
+    df = _sales_frame(90)
+    for i, level in enumerate(("a", "b", "c")):
+        df[f"segment__{level}"] = (np.arange(90) % 3 == i).astype(int)
+    cleaned = clean_data(df, ctx=RunContext(processed_dir=str(tmp_path)))
+
+    assert "segment__a" not in cleaned.columns
+    assert cleaned["segment"].tolist()[:3] == ["a", "b", "c"]
+
+
+def test_clean_appended_casts_to_stored_dtypes_and_drops_known_rows(tmp_path):
+    base = clean_data(optimize_dtypes(_sales_frame()), ctx=RunContext(processed_dir=str(tmp_path)))
+    schema = base.attrs["schema"]
+    known = np.sort(pd.util.hash_pandas_object(base[schema["columns"]], index=False).to_numpy())
+
+    raw = base[schema["columns"]].iloc[:2].astype({"quantity": "int64", "sales": "float64"})
+    raw.loc[len(raw)] = ["East", 5, 20.0, 7.0]
+    delta, hashes = clean_appended(raw, schema, known)
+
+    assert len(delta) == len(hashes) == 1
+    assert delta["quantity"].dtype == base["quantity"].dtype
+    assert delta["sales"].tolist() == [20]
+
+
+def test_clean_appended_rejects_values_that_do_not_fit(tmp_path):
+    base = clean_data(optimize_dtypes(_sales_frame()), ctx=RunContext(processed_dir=str(tmp_path)))
+    assert base["quantity"].dtype == np.int8
+    raw = pd.DataFrame({"Region": ["East"], "Quantity": [300], "Sales": [150.75], "Profit": [12.34]})
+
+    with pytest.raises(ValueError, match="quantity"):
+        clean_appended(raw, base.attrs["schema"])
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from Src_code.data_cleaning import clean_data
+from Src_code.dataset_cache import read_cached_array, read_cached_frame
+from Src_code.incremental import update_clean_store
+from Src_code.memory_optimization import optimize_dtypes
+
+
+def _write_base(path, optimize):
+    rng = np.random.default_rng(0)
+    n = 500
+    pd.DataFrame({
+        "region": rng.choice(["East", "West", "South"], n),
+        "quantity": rng.integers(1, 10, n),
+        "sales": rng.integers(10, 100, n).astype(float),
+        "profit": rng.integers(-20, 50, n).astype(float),
+    }).to_csv(path, index=False)
+    df = pd.read_csv(path)
+    cleaned = clean_data(optimize_dtypes(df) if optimize else df, fingerprint="a" * 32)
+    return {"clean_key": "a" * 32, "size": path.stat().st_size, "rows": len(cleaned)}
+
+
+def test_appended_rows_are_merged_into_the_store(tmp_path, cache_dir):
+    path = tmp_path / "data.csv"
+    snapshot = _write_base(path, optimize=True)
+    with open(path, "a") as f:
+        f.write("East,5,20,7\nNorth,2,30,-4\nEast,5,20,7\n")
+
+    merged, delta = update_clean_store(str(path), "b" * 32, snapshot)
+
+    assert len(delta) == 2
+    assert len(merged) == snapshot["rows"] + 2
+    assert merged["region"].tolist()[-1] == "North"
+    assert read_cached_frame("b" * 32, "clean").shape == merged.shape
+    hashes = read_cached_array("b" * 32, "row_hashes")
+    assert len(hashes) == len(merged) and (hashes[:-1] <= hashes[1:]).all()
+
+
+def test_append_that_does_not_fit_the_stored_dtypes_falls_back(tmp_path, cache_dir):
+    path = tmp_path / "data.csv"
+    snapshot = _write_base(path, optimize=True)
+    with open(path, "a") as f:
+        f.write("East,300,150.75,12.34\n")
+
+    assert update_clean_store(str(path), "b" * 32, snapshot) is None
+    assert read_cached_frame("b" * 32, "clean") is None
+
+
+def test_append_with_wide_dtypes_keeps_values(tmp_path, cache_dir):
+    path = tmp_path / "data.csv"
+    snapshot = _write_base(path, optimize=False)
+    with open(path, "a") as f:
+        f.write("East,300,150.75,12.34\n")
+
+    merged, _ = update_clean_store(str(path), "b" * 32, snapshot)
+    assert merged.iloc[-1][["quantity", "sales", "profit"]].tolist() == [300, 150.75, 12.34]
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Src_code.statistics_engine import compute_profile, merge_profiles
+
+
+def _frame(n, seed, regions=("East", "West")):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "region": rng.choice(regions, n),
+        "sales": rng.uniform(10, 100, n),
+        "profit": rng.normal(5, 20, n),
+        "profit_margin": rng.normal(10, 5, n),
+    })
+
+
+def test_merge_matches_profile_of_concatenation():
+    a, b = _frame(300, 0), _frame(200, 1)
+    merged = merge_profiles(compute_profile(a), compute_profile(b))
+    full = compute_profile(pd.concat([a, b], ignore_index=True))
+
+    assert merged["rows"] == 500
+    for col in ("sales", "profit"):
+        assert merged["numeric"][col]["count"] == full["numeric"][col]["count"]
+        assert merged["numeric"][col]["mean"] == pytest.approx(full["numeric"][col]["mean"])
+        assert merged["numeric"][col]["m2"] == pytest.approx(full["numeric"][col]["m2"])
+        assert merged["numeric"][col]["min"] == full["numeric"][col]["min"]
+        assert merged["numeric"][col]["max"] == full["numeric"][col]["max"]
+    assert merged["categorical"]["region"]["counts"] == full["categorical"]["region"]["counts"]
+    sums = merged["groups"]["region"]["sales"]["sum"]
+    for region, total in full["groups"]["region"]["sales"]["sum"].items():
+        assert sums[region] == pytest.approx(total)
+
+
+def test_ratio_columns_are_not_group_measures():
+    profile = compute_profile(_frame(100, 0))
+    assert set(profile["groups"]["region"]) == {"sales", "profit"}
+
+
+def test_merge_drops_group_dimension_missing_on_one_side(monkeypatch):
+    from Src_code import statistics_engine
+
+    a = compute_profile(_frame(100, 0))
+    monkeypatch.setattr(statistics_engine, "MAX_GROUP_CARDINALITY", 1)
+    b = compute_profile(_frame(100, 1))
+    assert "region" in a["groups"] and "region" not in b["groups"]
+
+    # One side's totals alone would cover only part of the rows
+    assert "region" not in merge_profiles(a, b)["groups"]
+    assert "region" not in merge_profiles(b, a)["groups"]
+
+
+def test_merge_with_empty_side_keeps_group_dimension():
+    a = compute_profile(_frame(100, 0))
+    empty = compute_profile(_frame(100, 1).iloc[:0])
+    assert merge_profiles(a, empty)["groups"]["region"] == a["groups"]["region"]